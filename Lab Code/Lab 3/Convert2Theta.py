@@ -56,20 +56,31 @@ def NewtonRaphson(fcn, jacobian, guess, thresh):
 
 def get_theta_values(x_coords, y_coords):
 
-    theta_array = []
+    # Shift every point into the frame used by g, all at once
+    x = np.asarray(x_coords, dtype=float) + l1
+    y = np.asarray(y_coords, dtype=float) - l3
 
-    coords = zip(x_coords, y_coords)
-    
-    for i, (x, y) in enumerate(coords):
-        x = x+l1
-        y = y-l3
-        x_des = np.asarray([x, y])
-        theta_guess = np.asarray([0, math.pi/2])
-        
-        theta = NewtonRaphson(lambda theta: g(x_des, theta), dg_dtheta, theta_guess, 1e-6)
-        
-        theta_array.append(theta)
-    
-    theta_values = np.asarray(theta_array)
+    # Same initial guess as before for every point
+    theta1 = np.zeros(len(x))
+    theta2 = np.full(len(x), math.pi/2)
+
+    # Newton-Raphson on all points together, with the 2x2 jacobian of
+    # dg_dtheta inverted in closed form instead of np.linalg.inv per point
+    for _ in range(50):
+        cos1 = np.cos(theta1)
+        sin1 = np.sin(theta1)
+        cos2 = np.cos(theta2)
+        sin2 = np.sin(theta2)
+
+        g1 = x - (l1 * cos1 - l3 * cos2)
+        g2 = y - (l1 * sin1 - l3 * sin2)
+        if np.max(np.hypot(g1, g2), initial=0) <= 1e-6:
+            break
+
+        det = l1 * l3 * np.sin(theta1 - theta2)
+        theta1 -= l3 * (cos2 * g1 + sin2 * g2) / det
+        theta2 -= l1 * (cos1 * g1 + sin1 * g2) / det
+
+    theta_values = np.column_stack((theta1, theta2))
     
     return theta_values
@@ -33,18 +33,22 @@ def comms():
             tim.callback(adc_interrupt)     # Enable ADC interrupt handler to start data collection
             
             # Loop until ADC array is filled
-            while not queue_adc.full():
+            while not queue_samples.full():
                 yield(0)
             
             state = SERIAL
         
         elif state == SERIAL:
             # Print results of data collection
-            while queue_adc.any():
-                time = queue_time.get()
-                values = queue_adc.get()
-                print("{:}, {:}".format(time, values, end=''))
-                ser.write(str(time)+','+str(values)+'\r\n')
+            # Records are read in place, a contiguous run at a time
+            while queue_samples.any():
+                run = queue_samples.peek_run()
+                for idx in range(0, len(run), 2):
+                    time = run[idx]
+                    values = run[idx + 1]
+                    print("{:}, {:}".format(time, values, end=''))
+                    ser.write(str(time)+','+str(values)+'\r\n')
+                queue_samples.consume(len(run))
             state = BUTTON
 
     
@@ -61,13 +65,15 @@ def adc_interrupt(tim):
     
     counter = share_counter.get()
     
-    queue_time.put(counter)
-    queue_adc.put(reading)
+    # Time and reading go into the queue together as one record
+    sample_in[0] = counter
+    sample_in[1] = reading
+    queue_samples.put_from(sample_in, in_ISR=True)
     
     counter += 1
     share_counter.put(counter)
 
-    if queue_adc.full():          # Disable adc interrupt when finished
+    if queue_samples.full():          # Disable adc interrupt when finished
         tim.callback(None)
 
                         
@@ -104,8 +110,11 @@ if __name__ == '__main__':
     # Define tasks, shares, and queues
     share_btn = task_share.Share('B', thread_protect=False, name='Share 0')
     share_counter = task_share.Share('H', thread_protect=False, name='Share 1')
-    queue_time = task_share.Queue('L', SAMPLES, thread_protect=False, overwrite=False, name='Queue 0')
-    queue_adc = task_share.Queue('L', SAMPLES, thread_protect=False, overwrite=False, name='Queue 1')
+    queue_samples = task_share.RecordQueue('LL', SAMPLES, thread_protect=False, overwrite=False, name='Queue 0')
+
+    # Buffer for records going into the queue, allocated here
+    # because the ADC interrupt can't allocate memory
+    sample_in = array.array('L', [0, 0])
 
     task_comms = cotask.Task(comms, name='Task 1', priority=1, period=5, profile=True, trace=False)
 
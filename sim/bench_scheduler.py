@@ -0,0 +1,99 @@
+'''!@file                   bench_scheduler.py
+    @brief                  Deterministic benchmark of the plotter's tasks
+    @details                Replays a whole drawing through src/main.py on a
+                            virtual clock which only moves by the modelled
+                            cost of each task run, the time spent on the SPI
+                            bus and the time the scheduler sleeps, so the
+                            results are the same on every run and every PC.
+                            Reports the setpoints the stepper task sends to
+                            the drivers and the pen events per virtual
+                            second, and the deadlines each timed task
+                            missed. The costs are rough run times of each
+                            task on the board and can be changed with --cost.
+                            Usage: python bench_scheduler.py drawing.hpgl [--cost "Task 4=5000"]
+    @date                   10/18/26
+'''
+
+import os
+import sys
+import time
+import argparse
+
+import run_plotter
+import pyb
+import utime
+import cotask
+import TMC4210_Class
+
+
+# Modelled run time in microseconds of each task of main.py on the board
+COSTS = {'Task 1': 150,       # Setpoints to both stepper drivers
+         'Task 3': 20,        # Pen lift motor
+         'Task 4': 3000,      # HPGL parsing, interpolation and inverse kinematics
+         'Task 5': 10}        # Start button
+
+
+# Function to count the setpoints the stepper task sends, as calls to
+# set_target_position() for the first stepper. Unlike the X_TARGET writes on
+# the SPI bus, these aren't skipped when the target doesn't change
+# Returns a list holding the count so far
+def count_setpoints():
+    count = [0]
+    set_target = TMC4210_Class.TMC4210.set_target_position
+
+    def counted(stepper, position):
+        if stepper.MOTOR == 1:
+            count[0] += 1
+        set_target(stepper, position)
+
+    TMC4210_Class.TMC4210.set_target_position = counted
+    return count
+
+
+# Function to count the pen moves, which start the pen lift motor's PWM
+def pen_events():
+    return sum(1 for when, timer, channel, percent in pyb.TimerChannel.history
+               if timer == 3 and percent > 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Deterministic benchmark of the plotter tasks')
+    parser.add_argument('hpgl', help='HPGL file to draw')
+    parser.add_argument('--plan', help='compiled motion plan to draw instead of the HPGL file')
+    parser.add_argument('--cost', action='append', default=[],
+                        help='modelled run time of a task, as "name=microseconds"')
+    parser.add_argument('--limit', type=float, default=3600,
+                        help='virtual seconds after which the benchmark stops (default 3600)')
+    args = parser.parse_args()
+
+    costs = dict(COSTS)
+    for cost in args.cost:
+        name, us = cost.rsplit('=', 1)
+        costs[name] = int(us)
+
+    setpoints = count_setpoints()
+    start = time.perf_counter()
+    program, steppers = run_plotter.run(os.path.abspath(args.hpgl),
+                                        args.plan and os.path.abspath(args.plan),
+                                        args.limit, read_cost_us=0, costs=costs)
+    wall = time.perf_counter() - start
+
+    virtual = utime.now() / 1e6
+    points = setpoints[0]
+    events = pen_events()
+    missed = sum(task._missed for pri in cotask.task_list.pri_list for task in pri[2:])
+
+    print()
+    print('{:<24s}{:12.3f}'.format('virtual time (s)', virtual))
+    print('{:<24s}{:12.3f}'.format('host time (s)', wall))
+    print('{:<24s}{:12d}'.format('setpoints', points))
+    print('{:<24s}{:12.2f}'.format('setpoints/s', points / virtual))
+    print('{:<24s}{:12d}'.format('pen events', events))
+    print('{:<24s}{:12.3f}'.format('pen events/s', events / virtual))
+    print('{:<24s}{:12d}'.format('missed deadlines', missed))
+    print()
+    print(cotask.task_list.percentile_report())
+
+
+if __name__ == '__main__':
+    main()
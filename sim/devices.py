@@ -0,0 +1,208 @@
+'''!@file                   devices.py
+    @brief                  Models of the devices wired to the Nucleo
+    @details                TMC4210Model answers SPI datagrams the way a
+                            TMC4210 stepper controller does and moves its
+                            motor toward the target position along the
+                            controller's trapezoidal ramp. DCMotorModel
+                            turns the PWM duty of the pen lift motor into
+                            encoder counts.
+    @date                   10/18/26
+'''
+
+import math
+import utime
+
+
+# Register addresses, as in the first byte of a datagram without the read bit
+X_TARGET = 0x00
+X_ACTUAL = 0x02
+V_MIN = 0x04
+V_MAX = 0x06
+V_TARGET = 0x08
+V_ACTUAL = 0x0A
+A_MAX = 0x0C
+A_ACTUAL = 0x0E
+PMUL_PDIV = 0x12
+REFCONF_RM = 0x14
+PDIV_RDIV = 0x18
+IF_CONF = 0x68
+TYPE_VERSION = 0x72
+GLOBAL_PARAMETERS = 0x7E
+
+# Bits of the status byte sent back in the first byte of every datagram
+XEQT = 0x01
+RS = 0x02
+CDGW = 0x40
+INT = 0x80
+
+
+# Function to turn a 24 bit register value into a signed integer
+def signed24(value):
+    return value - (1 << 24) if value & 0x800000 else value
+
+
+class TMC4210Model:
+    '''!@brief              A TMC4210 stepper controller and its motor
+        @details            Each datagram is four bytes: the register
+                            address with the read bit as bit 0, then 24 bits
+                            of data. The reply carries the status byte and,
+                            for reads, the register's value. The position
+                            moves toward the target at up to the speed set
+                            by V_MAX and the pulse divider, speeding up and
+                            slowing down at the rate set by A_MAX and the
+                            ramp divider so it stops at the target. With
+                            ramp=False it moves at the top speed all the way.
+    '''
+
+    ## Longest time step in microseconds of the motion along a ramp
+    RAMP_STEP_US = 1000
+
+    def __init__(self, clk_freq=20000000, ramp=True):
+        self.clk_freq = clk_freq
+        self.ramp = ramp
+        self.registers = {address: 0 for address in (
+            X_TARGET, X_ACTUAL, V_MIN, V_MAX, V_TARGET, V_ACTUAL, A_MAX, A_ACTUAL,
+            PMUL_PDIV, REFCONF_RM, PDIV_RDIV, IF_CONF, GLOBAL_PARAMETERS)}
+        self.registers[TYPE_VERSION] = 0x429101
+
+        # Number of datagrams which read and wrote each register
+        self.reads = {}
+        self.writes = {}
+
+        # Steps moved but not yet counted in X_ACTUAL, and time of the last update
+        self._fraction = 0.0
+        self._updated = utime.now()
+
+        # Exact position and speed in steps per second along a ramp
+        self._position = 0.0
+        self._speed = 0.0
+
+    # Function to get the motor's speed in steps per second
+    def step_rate(self, register=V_MAX):
+        pulse_div = (self.registers[PDIV_RDIV] >> 12) & 0x0F
+        return self.clk_freq * (self.registers[register] & 0x7FF) / ((1 << pulse_div) * 2048 * 32)
+
+    # Function to get the motor's acceleration in steps per second squared
+    def accel_rate(self):
+        pulse_div = (self.registers[PDIV_RDIV] >> 12) & 0x0F
+        ramp_div = (self.registers[PDIV_RDIV] >> 8) & 0x0F
+        return self.clk_freq ** 2 * (self.registers[A_MAX] & 0x7FF) / 2 ** (pulse_div + ramp_div + 29)
+
+    # Function to get the current position in steps
+    def position(self):
+        self._update()
+        return signed24(self.registers[X_ACTUAL])
+
+    # Function to get the target position in steps
+    def target(self):
+        return signed24(self.registers[X_TARGET])
+
+    # Function to move the position toward the target for the time since the last update
+    def _update(self):
+        now = utime.now()
+        elapsed = now - self._updated
+        self._updated = now
+        if self.ramp:
+            self._ramp(elapsed)
+            return
+
+        position = signed24(self.registers[X_ACTUAL])
+        distance = self.target() - position
+        if not distance:
+            self._fraction = 0.0
+            self.registers[V_ACTUAL] = 0
+            return
+
+        self._fraction += self.step_rate() * elapsed / 1e6
+        steps = min(int(self._fraction), abs(distance))
+        self._fraction -= steps
+        position += steps if distance > 0 else -steps
+        self.registers[X_ACTUAL] = position & 0xFFFFFF
+        self.registers[V_ACTUAL] = self.registers[V_MAX] if position != self.target() else 0
+
+    # Function to move along the ramp for the given number of microseconds
+    def _ramp(self, elapsed):
+        target = self.target()
+        top = self.step_rate()
+        bottom = min(top, self.step_rate(V_MIN))
+        accel = self.accel_rate()
+        while elapsed > 0 and (self._position != target or self._speed):
+            dt = min(elapsed, self.RAMP_STEP_US) / 1e6
+            elapsed -= self.RAMP_STEP_US
+
+            # Aim for the top speed, or the speed from which the motor can
+            # just stop at the target, changing speed no faster than A_MAX
+            # Like the TMC4210, it doesn't slow down below V_MIN on the way
+            distance = target - self._position
+            aim = min(top, max(bottom, (2 * accel * abs(distance)) ** 0.5))
+            aim = aim if distance > 0 else -aim
+            change = max(-accel * dt, min(accel * dt, aim - self._speed))
+            self._speed += change
+            self._position += self._speed * dt
+
+            # Stop at the target rather than going past it
+            if (target - self._position) * distance <= 0:
+                self._position = float(target)
+                self._speed = 0.0
+
+        # X_ACTUAL counts the steps made so far on the way
+        step = math.floor(self._position) if self._speed >= 0 else math.ceil(self._position)
+        self.registers[X_ACTUAL] = int(step) & 0xFFFFFF
+        unit = top / (self.registers[V_MAX] & 0x7FF) if self.registers[V_MAX] & 0x7FF else 1
+        self.registers[V_ACTUAL] = int(self._speed / unit) & 0xFFF
+
+    # Function to get the status byte
+    def status(self):
+        self._update()
+        status = 0
+        if self.registers[X_ACTUAL] == self.registers[X_TARGET]:
+            status |= XEQT
+        return status
+
+    # Function to carry out one datagram and return the reply
+    def transfer(self, data):
+        self._update()
+        address = data[0] & 0xFE
+        read = data[0] & 0x01
+        reply = bytearray(4)
+
+        if read:
+            self.reads[address] = self.reads.get(address, 0) + 1
+            value = self.registers.get(address, 0)
+            reply[1] = (value >> 16) & 0xFF
+            reply[2] = (value >> 8) & 0xFF
+            reply[3] = value & 0xFF
+        else:
+            self.writes[address] = self.writes.get(address, 0) + 1
+            if address != TYPE_VERSION:
+                self.registers[address] = (data[1] << 16) | (data[2] << 8) | data[3]
+            if address == X_TARGET:
+                self._fraction = 0.0
+            if address == X_ACTUAL:
+                self._position = float(signed24(self.registers[X_ACTUAL]))
+
+        reply[0] = self.status()
+        return bytes(reply)
+
+
+class DCMotorModel:
+    '''!@brief              A DC motor driven by two PWM channels with an encoder
+        @details            The motor turns at a speed proportional to the
+                            difference between the duty cycles of its two
+                            channels, and the encoder counts follow it.
+    '''
+
+    def __init__(self, channel_1, channel_2, counts_per_second=4000):
+        self.channel_1 = channel_1
+        self.channel_2 = channel_2
+        self.counts_per_second = counts_per_second
+        self.counts = 0.0
+        self._updated = utime.now()
+
+    # Function to get the encoder count, moving the motor for the time since the last call
+    def count(self):
+        now = utime.now()
+        duty = self.channel_2.pulse_width_percent() - self.channel_1.pulse_width_percent()
+        self.counts += self.counts_per_second * duty / 100 * (now - self._updated) / 1e6
+        self._updated = now
+        return self.counts
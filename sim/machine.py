@@ -0,0 +1,13 @@
+'''!@file                   machine.py
+    @brief                  Stand-in for MicroPython's machine module
+    @details                Only what the plotter uses: idle() waits for the
+                            next interrupt, which is the 1 ms tick on the
+                            board.
+    @date                   10/18/26
+'''
+
+import pyb
+
+
+def idle():
+    pyb.wfi()
@@ -0,0 +1,28 @@
+'''!@file                   micropython.py
+    @brief                  Stand-in for MicroPython's micropython module
+    @details                The code emitters are decorators which leave the
+                            function as it is, since CPython runs it as
+                            ordinary Python either way.
+    @date                   10/18/26
+'''
+
+
+def native(function):
+    return function
+
+
+def viper(function):
+    return function
+
+
+def const(value):
+    return value
+
+
+def alloc_emergency_exception_buf(size):
+    pass
+
+
+# Function to run a callback "soon"; the simulation has no interrupts, so now
+def schedule(function, arg):
+    function(arg)
@@ -0,0 +1,487 @@
+'''!@file                   pyb.py
+    @brief                  Stand-in for MicroPython's pyb module on the PC
+    @details                Models the parts of the Nucleo used by the
+                            plotter: GPIO pins whose levels are kept by name,
+                            timers whose PWM channels remember their duty
+                            cycle, encoder counters, SPI buses which record
+                            every transfer and pass it to the device whose
+                            chip select pin is low, UARTs which collect what
+                            is written, ADCs and external interrupts. Time
+                            comes from the virtual clock in utime.py.
+    @date                   10/18/26
+'''
+
+import utime
+
+
+# Function to forget every pin, timer, bus and interrupt for a new simulation
+def reset():
+    Pin.levels.clear()
+    del Pin.history[:]
+    del TimerChannel.history[:]
+    Timer.timers.clear()
+    SPI.devices.clear()
+    SPI.logs.clear()
+    ADC.values.clear()
+    ExtInt.lines.clear()
+
+
+# Function to sleep until the next interrupt, which is the 1 ms tick at the latest
+def wfi():
+    utime.advance(1000 - utime.now() % 1000)
+
+
+def disable_irq():
+    return True
+
+
+def enable_irq(state=True):
+    pass
+
+
+def delay(ms):
+    utime.sleep_ms(ms)
+
+
+def udelay(us):
+    utime.sleep_us(us)
+
+
+def millis():
+    return utime.ticks_ms()
+
+
+def micros():
+    return utime.ticks_us()
+
+
+def elapsed_millis(start):
+    return utime.ticks_diff(utime.ticks_ms(), start)
+
+
+def elapsed_micros(start):
+    return utime.ticks_diff(utime.ticks_us(), start)
+
+
+class Pin:
+    '''!@brief              A GPIO pin whose level is kept by pin name
+        @details            Pins are named as in Pin.cpu, for example 'A4'.
+                            Levels written to outputs are remembered, with
+                            the time of each change, and levels read from
+                            inputs are set by the simulation with drive().
+    '''
+
+    # Pin names, so Pin.cpu.A4 is 'A4'
+    class _Names:
+        def __getattr__(self, name):
+            return name
+
+    cpu = _Names()
+    board = _Names()
+
+    IN = 0
+    OUT = 1
+    OUT_PP = 1
+    OUT_OD = 2
+    AF_PP = 3
+    AF_OD = 4
+    ANALOG = 5
+    ALT = 6
+    PULL_NONE = 0
+    PULL_UP = 1
+    PULL_DOWN = 2
+
+    # Level of each pin by name
+    levels = {}
+
+    # (time in us, pin name, level) of every change of an output
+    history = []
+
+    def __init__(self, name, mode=IN, pull=PULL_NONE, value=None, af=-1, alt=-1):
+        self.name = name.name if isinstance(name, Pin) else name
+        self.init(mode, pull, value)
+
+    def init(self, mode=IN, pull=PULL_NONE, value=None, af=-1, alt=-1):
+        self.mode = mode
+        self.pull = pull
+        if value is not None:
+            self.value(value)
+        else:
+            Pin.levels.setdefault(self.name, 1 if pull == Pin.PULL_UP else 0)
+
+    # Function to set the level of an input pin, as something outside the board would
+    @staticmethod
+    def drive(name, level):
+        Pin.levels[name] = 1 if level else 0
+
+    def value(self, level=None):
+        if level is None:
+            return Pin.levels.get(self.name, 0)
+        level = 1 if level else 0
+        if Pin.levels.get(self.name) != level:
+            Pin.history.append((utime.now(), self.name, level))
+        Pin.levels[self.name] = level
+
+    def __call__(self, level=None):
+        return self.value(level)
+
+    def high(self):
+        self.value(1)
+
+    def low(self):
+        self.value(0)
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+    def __repr__(self):
+        return 'Pin({:s})'.format(self.name)
+
+
+class TimerChannel:
+    '''!@brief              A timer channel which remembers its output
+        @details            Every change of a channel's duty cycle is kept in
+                            history as (time in us, timer number, channel
+                            number, duty cycle in percent).
+    '''
+
+    history = []
+
+    def __init__(self, timer, channel, mode, pin, pulse_width=0, pulse_width_percent=0):
+        self.timer = timer
+        self.channel_num = channel
+        self.mode = mode
+        self.pin = pin
+        self.width = pulse_width
+        self.percent = pulse_width_percent
+
+    def pulse_width(self, width=None):
+        if width is None:
+            return self.width
+        self._set(100 * width / (self.timer.period() + 1))
+
+    def pulse_width_percent(self, percent=None):
+        if percent is None:
+            return self.percent
+        self._set(percent)
+
+    def _set(self, percent):
+        if percent != self.percent:
+            TimerChannel.history.append((utime.now(), self.timer.num, self.channel_num, percent))
+        self.percent = percent
+        self.width = int(percent * (self.timer.period() + 1) / 100)
+
+    def capture(self, value=None):
+        return self.width
+
+    def compare(self, value=None):
+        return self.pulse_width(value)
+
+    def callback(self, function):
+        self.timer.callback(function)
+
+
+class Timer:
+    '''!@brief              A hardware timer
+        @details            Creating a timer with a number which is already
+                            in use gives the same timer, as on the board. The
+                            count of a timer in encoder mode comes from a
+                            function set by the simulation with
+                            set_counter_source(), and callbacks are called by
+                            the simulation with fire().
+    '''
+
+    PWM = 0
+    PWM_INVERTED = 1
+    OC_TIMING = 2
+    OC_ACTIVE = 3
+    OC_INACTIVE = 4
+    OC_TOGGLE = 5
+    OC_FORCED_ACTIVE = 6
+    OC_FORCED_INACTIVE = 7
+    IC = 8
+    ENC_A = 9
+    ENC_B = 10
+    ENC_AB = 11
+    UP = 0
+    DOWN = 1
+    CENTER = 2
+
+    # Timers by number
+    timers = {}
+
+    def __new__(cls, num, **kwargs):
+        if num not in cls.timers:
+            timer = super().__new__(cls)
+            timer.num = num
+            timer.channels = {}
+            timer._period = 0xFFFF
+            timer._freq = 0
+            timer._callback = None
+            timer._counter = 0
+            timer._counter_source = None
+            cls.timers[num] = timer
+        return cls.timers[num]
+
+    def __init__(self, num, **kwargs):
+        self.init(**kwargs)
+
+    def init(self, freq=None, prescaler=None, period=None, mode=UP, div=1,
+             callback=None, deadtime=0):
+        if period is not None:
+            self._period = period
+        if freq is not None:
+            self._freq = freq
+        if callback is not None:
+            self._callback = callback
+
+    def deinit(self):
+        self._callback = None
+
+    def channel(self, channel, mode=None, pin=None, **kwargs):
+        if mode is None:
+            return self.channels.get(channel)
+        self.channels[channel] = TimerChannel(self, channel, mode, pin,
+                                              kwargs.get('pulse_width', 0),
+                                              kwargs.get('pulse_width_percent', 0))
+        return self.channels[channel]
+
+    def callback(self, function):
+        self._callback = function
+
+    # Function to call the timer's callback, as its interrupt would
+    def fire(self):
+        if self._callback is not None:
+            self._callback(self)
+
+    # Function to have the count of the timer come from a function of no arguments
+    def set_counter_source(self, source):
+        self._counter_source = source
+
+    def counter(self, value=None):
+        if value is not None:
+            self._counter = value
+        elif self._counter_source is not None:
+            self._counter = int(self._counter_source()) % (self._period + 1)
+        return self._counter
+
+    def period(self, value=None):
+        if value is not None:
+            self._period = value
+        return self._period
+
+    def freq(self, value=None):
+        if value is not None:
+            self._freq = value
+        return self._freq
+
+    def source_freq(self):
+        return 80000000
+
+
+class SPI:
+    '''!@brief              An SPI bus which records every transfer
+        @details            Devices are attached to a bus with the name of
+                            their chip select pin; each transfer goes to the
+                            attached device whose chip select pin is low,
+                            which returns the bytes it sends back. Every
+                            transfer is recorded in the bus's log as (time in
+                            us, chip select pin name, bytes sent).
+    '''
+
+    CONTROLLER = 0
+    MASTER = 0
+    PERIPHERAL = 1
+    SLAVE = 1
+    MSB = 0
+    LSB = 1
+
+    # Devices attached to each bus, by bus number and chip select pin name
+    devices = {}
+
+    # Transfers on each bus, by bus number
+    logs = {}
+
+    def __init__(self, bus, mode=CONTROLLER, baudrate=328125, **kwargs):
+        self.bus = bus
+        self.baudrate = baudrate
+        self.log = SPI.logs.setdefault(bus, [])
+
+    def init(self, mode=CONTROLLER, baudrate=328125, **kwargs):
+        self.baudrate = baudrate
+
+    def deinit(self):
+        pass
+
+    # Function to attach a device with a transfer(data) method to a bus
+    @staticmethod
+    def attach(bus, cs_name, device):
+        SPI.devices.setdefault(bus, {})[cs_name] = device
+        SPI.logs.setdefault(bus, [])
+
+    # Function to send bytes to the selected device and get the bytes it sends back
+    def _transfer(self, data):
+        data = bytes(data)
+        selected = None
+        for cs_name, device in SPI.devices.get(self.bus, {}).items():
+            if Pin.levels.get(cs_name, 1) == 0:
+                selected = cs_name
+                break
+        self.log.append((utime.now(), selected, data))
+
+        # Each byte takes 8 clock periods on the bus
+        utime.advance(8000000 * len(data) // self.baudrate)
+
+        if selected is None:
+            return bytes(len(data))
+        return SPI.devices[self.bus][selected].transfer(data)
+
+    def send(self, send, timeout=5000):
+        if isinstance(send, int):
+            send = bytes((send,))
+        self._transfer(send)
+
+    def recv(self, recv, timeout=5000):
+        size = recv if isinstance(recv, int) else len(recv)
+        reply = self._transfer(bytes(size))
+        if isinstance(recv, int):
+            return bytearray(reply)
+        recv[:] = reply
+        return recv
+
+    def send_recv(self, send, recv=None, timeout=5000):
+        if isinstance(send, int):
+            send = bytes((send,))
+        reply = self._transfer(send)
+        if recv is None:
+            return bytearray(reply)
+        recv[:] = reply
+        return recv
+
+    def write(self, buf):
+        self._transfer(buf)
+
+    def read(self, nbytes, write=0x00):
+        return self._transfer(bytes((write,)) * nbytes)
+
+    def readinto(self, buf, write=0x00):
+        buf[:] = self._transfer(bytes((write,)) * len(buf))
+
+    def write_readinto(self, write_buf, read_buf):
+        read_buf[:] = self._transfer(write_buf)
+
+
+class UART:
+    '''!@brief              A UART which collects what is written
+        @details            Everything written is kept in sent; bytes given
+                            to feed() are returned by the read methods.
+    '''
+
+    def __init__(self, bus, baudrate=9600, **kwargs):
+        self.bus = bus
+        self.baudrate = baudrate
+        self.sent = bytearray()
+        self._received = bytearray()
+
+    def init(self, baudrate=9600, **kwargs):
+        self.baudrate = baudrate
+
+    def deinit(self):
+        pass
+
+    # Function to give the UART bytes to be read, as the PC would send them
+    def feed(self, data):
+        self._received += data
+
+    def any(self):
+        return len(self._received)
+
+    def write(self, buf):
+        if isinstance(buf, str):
+            buf = buf.encode()
+        buf = bytes(buf)
+        self.sent += buf
+        return len(buf)
+
+    def writechar(self, char):
+        self.sent.append(char)
+
+    def read(self, nbytes=None):
+        if not self._received:
+            return None
+        nbytes = len(self._received) if nbytes is None else nbytes
+        data = bytes(self._received[:nbytes])
+        del self._received[:nbytes]
+        return data
+
+    def readchar(self):
+        data = self.read(1)
+        return data[0] if data else -1
+
+    def readline(self):
+        end = self._received.find(b'\n')
+        return self.read(end + 1 if end >= 0 else None)
+
+    def readinto(self, buf, nbytes=None):
+        data = self.read(len(buf) if nbytes is None else nbytes)
+        if not data:
+            return None
+        buf[:len(data)] = data
+        return len(data)
+
+
+class ADC:
+    '''!@brief              An ADC reading a value set by the simulation
+    '''
+
+    # Value read from each pin, by pin name
+    values = {}
+
+    def __init__(self, pin):
+        self.name = pin.name if isinstance(pin, Pin) else pin
+
+    def read(self):
+        value = ADC.values.get(self.name, 0)
+        return int(value() if callable(value) else value)
+
+    def read_timed(self, buf, timer):
+        for idx in range(len(buf)):
+            buf[idx] = self.read()
+
+
+class ExtInt:
+    '''!@brief              An external interrupt fired by the simulation
+    '''
+
+    IRQ_RISING = 0
+    IRQ_FALLING = 1
+    IRQ_RISING_FALLING = 2
+    EVT_RISING = 3
+    EVT_FALLING = 4
+    EVT_RISING_FALLING = 5
+
+    # Interrupts by pin name
+    lines = {}
+
+    def __init__(self, pin, mode, pull, callback):
+        self.name = pin.name if isinstance(pin, Pin) else pin
+        self.callback = callback
+        self.enabled = True
+        ExtInt.lines[self.name] = self
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def line(self):
+        return 0
+
+    # Function to call the callback, as the interrupt would
+    def swint(self):
+        if self.enabled:
+            self.callback(self.line())
@@ -0,0 +1,123 @@
+'''!@file                   run_plotter.py
+    @brief                  Runs the plotter's main program on the PC
+    @details                Puts the stand-ins for pyb, utime, micropython,
+                            machine and ulab ahead of the plotter's own
+                            modules, wires models of the two TMC4210 stepper
+                            controllers and the pen lift motor to the
+                            simulated board, presses the start button and runs
+                            src/main.py unchanged on the virtual clock until
+                            the drawing is finished. Then it reports how long
+                            the drawing took in virtual time, how long the
+                            simulation took, what went over the SPI bus and
+                            how the tasks performed.
+                            Usage: python run_plotter.py drawing.hpgl [--plan drawing.plan]
+    @date                   10/18/26
+'''
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(SIM_DIR, '..', 'src')
+sys.path[:0] = [SIM_DIR, SRC_DIR]
+
+import utime
+import pyb
+import vclock
+import cotask
+import task_share
+from devices import TMC4210Model, DCMotorModel, X_TARGET
+
+
+# Function to connect the pen lift motor's encoder timer to a model of the motor,
+# once main.py has set up the motor's PWM timer
+def encoder_counts(state):
+    if 'motor' not in state:
+        channels = pyb.Timer.timers[3].channels
+        state['motor'] = DCMotorModel(channels[1], channels[2])
+    return state['motor'].count()
+
+
+# Function to run main.py on a drawing, returning the main program's globals and
+# the models of the stepper controllers. Each read of the clock costs
+# read_cost_us, and each run of a task named in costs costs the given number of
+# microseconds (or a function of the task's state giving it)
+def run(hpgl_file, plan_file=None, limit_s=3600, read_cost_us=2, costs=None):
+    workdir = tempfile.mkdtemp()
+    shutil.copy(hpgl_file, os.path.join(workdir, 'circle.hpgl'))
+    if plan_file:
+        shutil.copy(plan_file, os.path.join(workdir, 'circle.plan'))
+    cwd = os.getcwd()
+    os.chdir(workdir)
+
+    # Start from a fresh clock, board and task list
+    utime.reset(read_cost_us, int(limit_s * 1e6))
+    pyb.reset()
+    del task_share.share_list[:]
+    cotask.task_list = vclock.costed_task_list(costs or {})
+
+    # The stepper controllers share SPI bus 2, selected by pins C2 and C3
+    steppers = (TMC4210Model(), TMC4210Model())
+    pyb.SPI.attach(2, 'C2', steppers[0])
+    pyb.SPI.attach(2, 'C3', steppers[1])
+
+    state = {}
+    pyb.Timer(8).set_counter_source(lambda: encoder_counts(state))
+
+    # Hold the start button down until the LEDs show the drawing has started,
+    # and stop once they go off again
+    pyb.Pin.drive('A0', 1)
+
+    def idle(wait_us):
+        if pyb.Pin.levels.get('A4', 0):
+            state['started'] = True
+            pyb.Pin.drive('A0', 0)
+        elif state.get('started'):
+            raise utime.SimulationEnd('Drawing finished')
+        utime.advance(1000 if wait_us is None else max(wait_us, 1))
+
+    cotask.task_list.idle = idle
+
+    main_file = os.path.join(SRC_DIR, 'main.py')
+    with open(main_file) as file:
+        code = compile(file.read(), main_file, 'exec')
+    program = {'__name__': '__main__', '__file__': main_file}
+    try:
+        exec(code, program)
+    except utime.SimulationEnd as end:
+        print(end)
+
+    os.chdir(cwd)
+    shutil.rmtree(workdir, ignore_errors=True)
+    return program, steppers
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the plotter program on a simulated board')
+    parser.add_argument('hpgl', help='HPGL file to draw')
+    parser.add_argument('--plan', help='compiled motion plan to draw instead of the HPGL file')
+    parser.add_argument('--limit', type=float, default=3600,
+                        help='virtual seconds after which the simulation stops (default 3600)')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    program, steppers = run(os.path.abspath(args.hpgl),
+                            args.plan and os.path.abspath(args.plan), args.limit)
+    wall = time.perf_counter() - start
+
+    virtual = utime.now() / 1e6
+    print('Virtual time {:.3f} s, simulated in {:.3f} s ({:.0f}x real time)'.format(
+        virtual, wall, virtual / wall if wall else 0))
+    print('SPI transfers: {:d}'.format(len(pyb.SPI.logs.get(2, []))))
+    for num, model in enumerate(steppers, 1):
+        print('Stepper {:d}: position {:d}, target {:d}, {:d} target writes'.format(
+            num, model.position(), model.target(), model.writes.get(X_TARGET, 0)))
+    print(cotask.task_list)
+
+
+if __name__ == '__main__':
+    main()
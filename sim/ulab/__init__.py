@@ -0,0 +1,6 @@
+'''!@file                   __init__.py
+    @brief                  Stand-in for the ulab package on the PC
+    @details                ulab.numpy is a subset of NumPy, so NumPy itself
+                            stands in for it.
+    @date                   10/18/26
+'''
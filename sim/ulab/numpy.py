@@ -0,0 +1,8 @@
+'''!@file                   numpy.py
+    @brief                  Stand-in for ulab.numpy on the PC
+    @details                Re-exports NumPy, whose functions accept the same
+                            arguments as the ulab ones used by the plotter.
+    @date                   10/18/26
+'''
+
+from numpy import *
@@ -0,0 +1,68 @@
+'''!@file                   utime.py
+    @brief                  Stand-in for MicroPython's utime on the PC
+    @details                Reads the virtual clock installed in vclock.py
+                            instead of the PC's clock, so the plotter's tasks
+                            see time pass the way they would on the board no
+                            matter how fast the PC runs them. Tick counts
+                            wrap around at 2**30 as they do on the board.
+    @date                   10/18/26
+'''
+
+import vclock
+from vclock import SimulationEnd, TICKS_PERIOD
+
+
+# Function to move the virtual clock forward
+def advance(us):
+    vclock.current.advance(us)
+
+
+# Function to get the virtual time in microseconds, without wrapping or cost
+def now():
+    return vclock.current.now()
+
+
+# Function to set the virtual time at which the simulation ends
+def set_limit(us):
+    vclock.current.limit_us = us
+
+
+# Function to start a new simulation on a new clock, returning the clock
+def reset(read_cost_us=2, limit_us=None):
+    return vclock.install(vclock.VirtualClock(read_cost_us, limit_us))
+
+
+def ticks_us():
+    return vclock.current.ticks_us()
+
+
+def ticks_ms():
+    return vclock.current.ticks_ms()
+
+
+def ticks_cpu():
+    return vclock.current.ticks_us()
+
+
+def ticks_add(ticks, delta):
+    return vclock.current.ticks_add(ticks, delta)
+
+
+def ticks_diff(ticks1, ticks2):
+    return vclock.current.ticks_diff(ticks1, ticks2)
+
+
+def sleep_us(us):
+    advance(us)
+
+
+def sleep_ms(ms):
+    advance(ms * 1000)
+
+
+def sleep(seconds):
+    advance(seconds * 1000000)
+
+
+def time():
+    return now() // 1000000
@@ -0,0 +1,103 @@
+'''!@file                   vclock.py
+    @brief                  Virtual clock for running the plotter on the PC
+    @details                A VirtualClock has the tick functions of utime
+                            but only moves forward when told to: when the
+                            simulation advances it, by a fixed cost each time
+                            it's read and by the modelled cost of each task
+                            run, charged by costed_task_list(). The stand-in
+                            utime module, cotask and task_share all read the
+                            clock installed with install(), so a whole job
+                            runs as fast as the PC can go and gives the same
+                            timings every time.
+    @date                   10/18/26
+'''
+
+# Tick counts wrap around at this value, as on the board
+TICKS_PERIOD = 1 << 30
+
+
+class SimulationEnd(Exception):
+    '''!@brief              Raised when the virtual clock reaches its limit
+    '''
+
+
+class VirtualClock:
+    '''!@brief              A clock which only moves when it is told to
+    '''
+
+    def __init__(self, read_cost_us=2, limit_us=None):
+        '''!@brief          Creates a clock starting at zero
+            @param read_cost_us Microseconds added each time the clock is
+                            read, standing for the code run between reads.
+                            With 0, only advance() and task costs move it.
+            @param limit_us Virtual time at which SimulationEnd is raised,
+                            or None to run forever
+        '''
+        self.read_cost_us = read_cost_us
+        self.limit_us = limit_us
+        self._now = 0
+
+    # Function to move the clock forward
+    def advance(self, us):
+        self._now += max(int(us), 0)
+        if self.limit_us is not None and self._now >= self.limit_us:
+            raise SimulationEnd('Virtual clock reached {:.3f} s'.format(self.limit_us / 1e6))
+
+    # Function to get the virtual time in microseconds, without wrapping or cost
+    def now(self):
+        return self._now
+
+    def ticks_us(self):
+        self.advance(self.read_cost_us)
+        return self._now % TICKS_PERIOD
+
+    def ticks_ms(self):
+        self.advance(self.read_cost_us)
+        return (self._now // 1000) % TICKS_PERIOD
+
+    def ticks_add(self, ticks, delta):
+        return (ticks + delta) % TICKS_PERIOD
+
+    def ticks_diff(self, ticks1, ticks2):
+        diff = (ticks1 - ticks2) % TICKS_PERIOD
+        if diff >= TICKS_PERIOD // 2:
+            diff -= TICKS_PERIOD
+        return diff
+
+
+## The clock read by the stand-in utime module
+current = VirtualClock()
+
+
+# Function to make a clock the one read by utime, cotask and task_share
+def install(clock):
+    global current
+    current = clock
+    import cotask
+    import task_share
+    cotask.clock = clock
+    task_share.clock = clock
+    return clock
+
+
+# Generator running a task's generator and charging its cost to the clock
+def _costed(run_gen, cost_us, clock):
+    for state in run_gen:
+        clock.advance(cost_us(state) if callable(cost_us) else cost_us)
+        yield state
+
+
+# Function to make a task list which charges each run of its tasks to the
+# clock, with the cost in microseconds given by task name, either as a number
+# or as a function of the state the task yields. It's made on first use so
+# that cotask is imported after the stand-in modules are in place
+def costed_task_list(costs, clock=None):
+    import cotask
+
+    class CostedTaskList(cotask.TaskList):
+        def append(self, task):
+            if task.name in costs:
+                task._run_gen = _costed(task._run_gen, costs[task.name], clock or current)
+            super().append(task)
+
+    return CostedTaskList()
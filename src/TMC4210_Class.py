@@ -23,6 +23,11 @@ class TMC4210:
         self.STEP_LENGTH = STEP_LENGTH
         self.MOTOR = MOTOR
 
+        # Shadow copy of the last value written to each register, by write
+        # address, so bits can be changed without reading the register back
+        # and writes which wouldn't change anything can be skipped
+        self._shadow = {}
+
         # TMC4210 constants
         self.CLK_FREQ = 20000000     # 20 MHz
 
@@ -33,6 +38,22 @@ class TMC4210:
         self.CS1 = Pin(Pin.cpu.C2, mode=Pin.OUT_PP, value=1)
         self.CS2 = Pin(Pin.cpu.C3, mode=Pin.OUT_PP, value=1)
 
+        # Chip select of this motor's TMC4210
+        self.CS = self.CS1 if MOTOR == 1 else self.CS2
+
+        # Datagram buffers reused by every transfer, so sending a setpoint
+        # doesn't allocate memory
+        self._tx = bytearray(4)
+        self._rx = bytearray(4)
+
+        # Status bits, actual position and actual speed from the last poll()
+        self.status = 0
+        self.position = 0
+        self.speed = 0
+
+        # Last target position sent to the motor
+        self.target = 0
+
         # Timer constants
         self.AUTO_RELOAD = 3
         self.COMPARE = 2
@@ -65,7 +86,7 @@ class TMC4210:
 
         self.write_register(IF_CONF_W, en_sd)
 
-        current_reg = self.read_register(GLOBAL_PARAMETERS_R)
+        current_reg = self.shadow_register(GLOBAL_PARAMETERS_W)
         
         current_byte = current_reg[2]
         current_byte &= ~(0x0F)
@@ -75,7 +96,7 @@ class TMC4210:
         self.write_register(GLOBAL_PARAMETERS_W, current_reg)
 
     def enable_right_reference(self):
-        current_reg = self.read_register(GLOBAL_PARAMETERS_R)
+        current_reg = self.shadow_register(GLOBAL_PARAMETERS_W)
         
         current_byte = current_reg[1]
         current_byte |= 1 << 5
@@ -85,7 +106,7 @@ class TMC4210:
 
     def set_ramp_mode(self):
         ramp_mode = ~(0b11) 
-        current_reg = self.read_register(REFCONF_RM_R)
+        current_reg = self.shadow_register(REFCONF_RM_W)
         
         current_byte = current_reg[3]
         current_byte &= ramp_mode
@@ -97,23 +118,10 @@ class TMC4210:
         
         self.set_pmul_pdiv(a_max)
         
-        v_min_val = bytearray([0,0,0,0])
-        v_min_val[3] = v_min & 0xFF
-        v_min_val[2] = (v_min & 0x700) >> 8
-        
-        self.write_register(V_MIN_W, v_min_val)
-                
-        a_max_val = bytearray([0,0,0,0])
-        a_max_val[3] = a_max & 0xFF
-        a_max_val[2] = (a_max & 0x700) >> 8
-                
-        self.write_register(A_MAX_W, a_max_val)
-
-        v_max_val = bytearray([0,0,0,0])
-        v_max_val[3] = v_max & 0xFF
-        v_max_val[2] = (v_max & 0x700) >> 8
-
-        self.set_max_speed(v_max_val)
+        # Velocities and acceleration are 11 bit values
+        self.write_value(V_MIN_W, v_min & 0x7FF)
+        self.write_value(A_MAX_W, a_max & 0x7FF)
+        self.set_max_speed(v_max)
 
     def set_pulseRamp_div(self, v_max, a_max):
         arg = (self.CLK_FREQ * 2047) / (v_max * 2047 * 32)
@@ -145,69 +153,86 @@ class TMC4210:
         P_MUL = pm
         P_DIV = pd
 
-        current_byte = bytearray([0,0,0,0])
-        current_byte[3] |= (int(P_DIV) & 0x0F)
-        current_byte[2] |= (int(P_MUL) & 0x7F)
-        current_byte[2] |= 1 << 7
-    
-        self.write_register(PMUL_PDIV_W, current_byte)
+        # Written as a value, as this runs for every synchronized move
+        self.write_value(PMUL_PDIV_W, (((int(P_MUL) & 0x7F) | 0x80) << 8) | (int(P_DIV) & 0x0F))
 
+    # Function to change the acceleration, along with the multiplier and divider
+    # the TMC4210 needs to match it
+    def set_accel(self, accel):
+        self.set_pmul_pdiv(accel)
+        self.write_value(A_MAX_W, accel & 0x7FF)
+
+    # Positions are 24 bit two's complement values
     def set_current_position(self, position):
-        position_val = bytearray([0,0,0,0])
-        position_val[3] |= position & 0xFF
-        position_val[2] |= (position >> 8) & 0xFF
-        position_val[1] |= (position >> 16) & 0xFF
-        
-        self.write_register(X_ACTUAL_W, position_val)
+        self.write_value(X_ACTUAL_W, position & 0xFFFFFF)
 
     def set_target_position(self, position):
-        position_val = bytearray([0,0,0,0])
-        position_val[3] |= position & 0xFF
-        position_val[2] |= (position >> 8) & 0xFF
-        position_val[1] |= (position >> 16) & 0xFF          
-        
-        self.write_register(X_TARGET_W, position_val)
+        self.target = position
+        self.write_value(X_TARGET_W, position & 0xFFFFFF)
 
+    # Positions are returned as signed steps
     def get_current_position(self):
-        position = self.read_register(X_ACTUAL_R)
-        return position
+        return signed(self.read_value(X_ACTUAL_R), 24)
 
     def get_target_position(self):
-        position = self.read_register(X_TARGET_R)
-        return position
+        return signed(self.read_value(X_TARGET_R), 24)
 
     def set_max_speed(self, speed):
         if type(speed) == bytearray:
             self.write_register(V_MAX_W, speed)
         else:
-            v_max_val = bytearray([0,0,0,0])
-            v_max_val[3] = speed & 0xFF
-            v_max_val[2] = (speed & 0x700) >> 8
-            self.write_register(V_MAX_W, v_max_val)
+            self.write_value(V_MAX_W, speed & 0x7FF)
+
+    # Function to change the speed the motor starts and stops at
+    def set_min_speed(self, speed):
+        self.write_value(V_MIN_W, speed & 0x7FF)
 
     def set_target_speed(self, speed):
-        speed_val = bytearray([0,0,0,0])
-        speed_val[3] = speed & 0xFF
-        speed_val[2] = (speed & 0x700) >> 8
-        self.set_max_speed(speed_val)
-        
-        speed_val = bytearray([0,0,0,0])
-        speed_val[3] = speed & 0xFF
-        speed_val[2] = (speed & 0xF00) >> 8
-        
-        self.write_register(V_TARGET_W, speed_val)
+        self.set_max_speed(speed & 0x7FF)
+        self.write_value(V_TARGET_W, speed & 0xFFF)
+
+    # Function to convert a V_MAX value into steps per second
+    def velocity_to_steps(self, velocity):
+        return self.CLK_FREQ * velocity / ((1 << int(self.p_div)) * 2048 * 32)
+
+    # Function to convert steps per second into the nearest V_MAX value
+    def steps_to_velocity(self, steps):
+        return int(steps * (1 << int(self.p_div)) * 2048 * 32 / self.CLK_FREQ + 0.5)
+
+    # Function to convert an A_MAX value into steps per second squared
+    def accel_to_steps(self, accel):
+        return self.CLK_FREQ * self.CLK_FREQ * accel / 2 ** (int(self.p_div) + int(self.r_div) + 29)
 
+    # Speed and acceleration are returned as signed 12 bit values
     def get_current_speed(self):
-        speed = self.read_register(V_ACTUAL_R)
-        return speed
+        return signed(self.read_value(V_ACTUAL_R), 12)
 
     def get_current_accel(self):
-        accel = self.read_register(A_ACTUAL_R)
-        return accel
+        return signed(self.read_value(A_ACTUAL_R), 12)
+
+    # Function to read the actual position and speed and the status bits,
+    # keeping them in position, speed and status
+    # Returns True if the motor has reached its target position
+    def poll(self):
+        self.position = signed(self.read_value(X_ACTUAL_R), 24)
+        self.speed = signed(self.read_value(V_ACTUAL_R), 12)
+        return bool(self.status & STATUS_XEQT)
+
+    # Function to check if the motor has reached its target position, from the
+    # status bits sent back with the last datagram
+    def target_reached(self):
+        return bool(self.status & STATUS_XEQT)
+
+    # Function to check if the motor is within window steps of its target position
+    # A window of 0 waits for the TMC4210 to report it reached the target
+    def near_target(self, window=0):
+        self.position = signed(self.read_value(X_ACTUAL_R), 24)
+        if self.status & STATUS_XEQT:
+            return True
+        return window > 0 and abs(self.target - self.position) <= window
 
     def stop(self):
-        speed = bytearray([0,0,0,0])
-        self.set_max_speed(speed)
+        self.set_max_speed(0)
 
 
     def spi_init(self):
@@ -218,40 +243,147 @@ class TMC4210:
         tim = Timer(self.tim_num, period=self.AUTO_RELOAD, prescaler=0)
         self.clk = tim.channel(self.ch_num, pin=self.clk_pin , mode=Timer.PWM, pulse_width=self.COMPARE)
 
-    def write_register(self, address, data):        
-        
-        reg_val = bytearray([0,0,0,0])
-        reg_val[0] = address[0]
-        reg_val[1] = data[1]
-        reg_val[2] = data[2]
-        reg_val[3] = data[3]
-        
-        
-        if self.MOTOR == 1:        
-            self.CS1.low()
-            self.spi.send_recv(reg_val)
-            self.CS1.high()
-        elif self.MOTOR == 2:
-            self.CS2.low()
-            self.spi.send_recv(reg_val)
-            self.CS2.high()
-
-    def read_register(self, address):
-        buf = bytearray([0,0,0,0])
-        
-        if self.MOTOR == 1:        
-            self.CS1.low()
-            self.spi.send_recv(address, buf)
-            self.CS1.high()
-        elif self.MOTOR == 2:
-            self.CS2.low()
-            self.spi.send_recv(address, buf)
-            self.CS2.high()
+    # Function to get a copy of a register's value from the shadow copy,
+    # reading the register only the first time
+    def shadow_register(self, address):
+        if address[0] not in self._shadow:
+            current_reg = self.read_register(bytearray([address[0] | 1, 0, 0, 0]))
+            self._shadow[address[0]] = (current_reg[1] << 16) | (current_reg[2] << 8) | current_reg[3]
+        value = self._shadow[address[0]]
+        return bytearray([0, (value >> 16) & 0xFF, (value >> 8) & 0xFF, value & 0xFF])
+
+    # Function to forget the shadow copy, such as after the TMC4210 is reset,
+    # so every register is written and read again
+    def clear_shadow(self):
+        self._shadow = {}
+
+    def write_register(self, address, data, force=False):        
+        self.write_value(address, (data[1] << 16) | (data[2] << 8) | data[3], force)
+
+    # Function to write a 24 bit value to a register without allocating memory
+    def write_value(self, address, value, force=False):
+
+        # Skip writes which wouldn't change the register. The actual position
+        # changes as the motor moves, so writes to it always go out
+        if not force and address[0] != X_ACTUAL_W[0] and self._shadow.get(address[0]) == value:
+            return
+        self._shadow[address[0]] = value
+
+        tx = self._tx
+        tx[0] = address[0]
+        tx[1] = (value >> 16) & 0xFF
+        tx[2] = (value >> 8) & 0xFF
+        tx[3] = value & 0xFF
+
+        self.CS.low()
+        self.spi.write_readinto(tx, self._rx)
+        self.CS.high()
+        self.status = self._rx[0]
+
+    # Function to read the 24 bit value of a register without allocating memory
+    # The status bits sent back with it are kept in status
+    def read_value(self, address):
+        rx = self._rx
+
+        self.CS.low()
+        self.spi.write_readinto(address, rx)
+        self.CS.high()
+
+        self.status = rx[0]
+        return (rx[1] << 16) | (rx[2] << 8) | rx[3]
+
+    # Function to read a register into buf, or into a new buffer if none is given
+    def read_register(self, address, buf=None):
+        if buf is None:
+            buf = bytearray(4)
+
+        self.CS.low()
+        self.spi.write_readinto(address, buf)
+        self.CS.high()
         
         return buf
 
 
 
+# Function to turn the lowest bits of a register value into a signed integer
+def signed(value, bits):
+    if value & (1 << (bits - 1)):
+        return (value & ((1 << bits) - 1)) - (1 << bits)
+    return value & ((1 << bits) - 1)
+
+# Function to scale a speed or acceleration for a motor moving distance steps
+# while the other moves longest steps, so both take the same time
+def scaled(value, distance, longest):
+    if distance >= longest:
+        return value
+    return max(1, (value * distance + longest // 2) // longest)
+
+# Function to find whether a motor has to turn around to reach a new target,
+# as it's still on its way to its last target on the other side of it
+def turning(stepper, target):
+    ahead = stepper.target - stepper.position
+    return ahead != 0 and (target - stepper.position) * ahead <= 0
+
+# Function to move both motors to their targets so they arrive at the same time
+# The motor with further to go moves at speed (by default the lower V_MAX of
+# the two), full acceleration and its own V_MIN, and the other has all three
+# scaled down to match, so both ramps keep the same shape the whole way
+# A motor which has to turn around can't keep in step with the other, so it
+# keeps its own V_MIN and A_MAX and the full speed to stop and come back quickly
+# Distances are measured from where the motors are now, as they may not have
+# reached their last targets yet. Both sets of parameters and targets are
+# worked out first and then sent back to back
+def move_both(stepper1, stepper2, target1, target2, speed=None):
+    stepper1.position = stepper1.get_current_position()
+    stepper2.position = stepper2.get_current_position()
+    distance1 = abs(target1 - stepper1.position)
+    distance2 = abs(target2 - stepper2.position)
+    longest = max(distance1, distance2)
+    if speed is None:
+        speed = min(stepper1.V_MAX, stepper2.V_MAX)
+
+    if longest:
+        if turning(stepper1, target1):
+            distance1 = longest
+        if turning(stepper2, target2):
+            distance2 = longest
+        speed1 = scaled(speed, distance1, longest)
+        speed2 = scaled(speed, distance2, longest)
+        min1 = scaled(stepper1.V_MIN, distance1, longest)
+        min2 = scaled(stepper2.V_MIN, distance2, longest)
+        accel1 = scaled(stepper1.A_MAX, distance1, longest)
+        accel2 = scaled(stepper2.A_MAX, distance2, longest)
+
+        stepper1.set_min_speed(min1)
+        stepper1.set_max_speed(speed1)
+        stepper1.set_accel(accel1)
+        stepper2.set_min_speed(min2)
+        stepper2.set_max_speed(speed2)
+        stepper2.set_accel(accel2)
+
+    stepper1.set_target_position(target1)
+    stepper2.set_target_position(target2)
+
+# Function to poll both motors, returning True once both have reached their
+# target positions
+def poll_both(stepper1, stepper2):
+    reached1 = stepper1.poll()
+    reached2 = stepper2.poll()
+    return reached1 and reached2
+
+
+# --------- Status Bits ----------
+# Sent back in the first byte of every datagram
+
+STATUS_XEQT = 0x01      # Actual position equals target position
+
+STATUS_RS = 0x02        # Reference switch
+
+STATUS_CDGW = 0x40      # Cover datagram waiting
+
+STATUS_INT = 0x80       # Interrupt
+
+
 # --------- Read Registers ----------
 
 TYPE_VERSION = bytearray([0b01110011,0,0,0])
@@ -1,7 +1,8 @@
 '''!@file                   ThetaGenerator.py
     @brief                  Class for Inverse Kinematics
-    @details                Class to compute theta values using
-                            the Newton-Raphson method
+    @details                Classes to compute theta values using
+                            the Newton-Raphson method or the closed-form
+                            solution of the linkage
     @author                 Ethan Nikcevich
     @author                 Andrew Laurin
     @author                 Rodrigo Ronzalez
@@ -9,11 +10,62 @@
 '''
 
 import math
-from ulab import numpy as np
+import array
+import struct
+try:
+    from ulab import numpy as np
+except ImportError:
+    import numpy as np
+
+# Number of buckets of the iteration histogram when the solves have no limit
+HIST_BUCKETS = 32
+
+class SolverStats():
+
+    def __init__(self, max_iter):
+
+        # Histogram of the number of iterations taken by each solve. With no
+        # limit on the iterations the last bucket counts every longer solve
+        self.open_ended = max_iter is None
+        buckets = HIST_BUCKETS if self.open_ended else max_iter + 1
+        self.hist = array.array('H', [0] * buckets)
+        self.reset()
+
+    # Function to clear the statistics
+    def reset(self):
+        for idx in range(len(self.hist)):
+            self.hist[idx] = 0
+        self.solves = 0
+        self.iterations = 0
+        self.max_iterations = 0
+        self.failures = 0
+
+    # Function to record the outcome of one solve
+    def record(self, iterations, converged):
+        self.solves += 1
+        self.iterations += iterations
+        if iterations > self.max_iterations:
+            self.max_iterations = iterations
+        idx = min(iterations, len(self.hist) - 1)
+        if self.hist[idx] < 65535:
+            self.hist[idx] += 1
+        if not converged:
+            self.failures += 1
+
+    def __repr__(self):
+        avg = self.iterations / self.solves if self.solves else 0
+        rst = 'Solves {:d}  Avg iter {:.2f}  Max iter {:d}  Failures {:d}\n'.format(
+            self.solves, avg, self.max_iterations, self.failures)
+        last = len(self.hist) - 1
+        rst += 'Iterations: ' + ' '.join(
+            '{:d}{:s}:{:d}'.format(idx, '+' if self.open_ended and idx == last else '', count)
+            for idx, count in enumerate(self.hist) if count)
+        return rst
+
 
 class ThetaGenerator():
     
-    def __init__(self):
+    def __init__(self, warm_start=False, thresh=1e-4, max_iter=20):
 
         # Length of Linkage 1 in inches
         self.l1 = 4
@@ -22,6 +74,27 @@ class ThetaGenerator():
         # Length of Linkage 3 in inches
         self.l3 = 6
 
+        # Seed each solve with the previous solution instead of the fixed guess
+        self.warm_start = warm_start
+        # Largest allowed error of a solution in inches
+        self.thresh = thresh
+        # Largest number of iterations of one solve
+        self.max_iter = max_iter
+
+        # Iteration counts and failures of the solves
+        self.stats = SolverStats(max_iter)
+
+        # Number of iterations and outcome of the last solve
+        self.iterations = 0
+        self.converged = True
+
+        self.reset()
+
+    # Function to forget the previous solution, such as after a pen up jump
+    def reset(self):
+        self.theta1_prev = math.pi/2
+        self.theta2_prev = 0
+
     # Function representing g
     def g(self, x, theta):
         
@@ -51,19 +124,37 @@ class ThetaGenerator():
         
         return -1 * np.asarray([[dx_dtheta1, dx_dtheta2], [dy_dtheta1, dy_dtheta2]])
 
+    # Function to compute the pen position from theta values
+    def get_xy(self, theta1, theta2):
+        x = self.l1 * math.cos(theta1) + self.l3 * math.cos(theta2 + math.pi)
+        y = self.l1 * math.sin(theta1) + self.l3 * math.sin(theta2 + math.pi)
+        return x, y
+
     # Function to multiply matricies 
     def solve(self, arg1, arg2):
         return np.dot(np.linalg.inv(arg1), arg2)     
 
     # Function to implement Newton-Raphson root finding method
-    def NewtonRaphson(self, fcn, jacobian, guess, thresh):
+    # Gives up after max_iter iterations (no limit if None) or on a singular
+    # jacobian, leaving the outcome in self.iterations and self.converged
+    def NewtonRaphson(self, fcn, jacobian, guess, thresh, max_iter=None):
         
         theta = guess
         error = np.linalg.norm(fcn(theta))
+        iterations = 0
         
         while error > thresh:
-            theta -= self.solve(jacobian(theta), fcn(theta))
+            if max_iter is not None and iterations >= max_iter:
+                break
+            try:
+                theta -= self.solve(jacobian(theta), fcn(theta))
+            except ValueError:
+                break
             error = np.linalg.norm(fcn(theta))
+            iterations += 1
+
+        self.iterations = iterations
+        self.converged = error <= thresh
             
         return theta           
 
@@ -73,12 +164,273 @@ class ThetaGenerator():
         x = x_coord
         y = y_coord
         x_des = np.asarray([x, y])
-        theta_guess = np.asarray([math.pi/2, 0])
+        if self.warm_start:
+            theta_guess = np.asarray([self.theta1_prev, self.theta2_prev])
+        else:
+            theta_guess = np.asarray([math.pi/2, 0])
         
-        theta = self.NewtonRaphson(lambda theta: self.g(x_des, theta), self.dg_dtheta, theta_guess, 1)
+        theta = self.NewtonRaphson(lambda theta: self.g(x_des, theta), self.dg_dtheta, theta_guess,
+                                   self.thresh, self.max_iter)
+        self.stats.record(self.iterations, self.converged)
+
+        # Seed the next solve from this one, unless it failed
+        if self.converged:
+            self.theta1_prev = theta[0]
+            self.theta2_prev = theta[1]
+        else:
+            self.reset()
             
-        return theta[0], theta[1]        
+        return theta[0], theta[1]
 
-    
+    # Function to compute theta values for whole arrays of xy-coords at once
+    # Runs Newton-Raphson on every point together with the 2x2 jacobian
+    # inverted in closed form, and returns an array of theta1 values and an
+    # array of theta2 values. The batch is recorded as a single solve
+    def get_theta_arrays(self, x_coords, y_coords):
+
+        x = np.array(x_coords)
+        y = np.array(y_coords)
+        theta1 = np.zeros(len(x))
+        theta2 = np.zeros(len(x))
+        if self.warm_start:
+            theta1 += self.theta1_prev
+            theta2 += self.theta2_prev
+        else:
+            theta1 += math.pi/2
+
+        iterations = 0
+        while True:
+            cos1 = np.cos(theta1)
+            sin1 = np.sin(theta1)
+            cos2 = np.cos(theta2)
+            sin2 = np.sin(theta2)
+
+            # Error of every point, as in g()
+            g1 = x - (self.l1 * cos1 - self.l3 * cos2)
+            g2 = y - (self.l1 * sin1 - self.l3 * sin2)
+            error = np.max(np.sqrt(g1 * g1 + g2 * g2))
+            if error <= self.thresh or (self.max_iter is not None
+                                        and iterations >= self.max_iter):
+                break
+
+            # Newton step using the inverse of dg_dtheta()
+            det = self.l1 * self.l3 * np.sin(theta1 - theta2)
+            theta1 -= self.l3 * (cos2 * g1 + sin2 * g2) / det
+            theta2 -= self.l1 * (cos1 * g1 + sin1 * g2) / det
+            iterations += 1
+
+        self.iterations = iterations
+        self.converged = error <= self.thresh
+        self.stats.record(iterations, self.converged)
+        if self.converged and len(x):
+            self.theta1_prev = theta1[-1]
+            self.theta2_prev = theta2[-1]
+        else:
+            self.reset()
+
+        return theta1, theta2
+
+
+class AnalyticThetaGenerator(ThetaGenerator):
+
+    def __init__(self, elbow=1):
+        super().__init__()
+
+        # Branch of the solution, 1 for the elbow used by the plotter
+        # (the one Newton-Raphson finds from its initial guess) or -1 for the
+        # mirrored elbow
+        self.elbow = elbow
+
+    # Function to wrap an angle into the half turn on either side of a reference
+    def wrap(self, angle, ref):
+        return angle - 2 * math.pi * math.floor((angle - ref + math.pi) / (2 * math.pi))
+
+    # Main function to compute and return theta values from xy-coords
+    def get_theta_values(self, x_coord, y_coord):
+
+        # The pen sits at the end of linkage 1 plus linkage 3, which points
+        # along theta2 + pi. The law of cosines gives the angle between them
+        r_sq = x_coord * x_coord + y_coord * y_coord
+        cos_elbow = (r_sq - self.l1 * self.l1 - self.l3 * self.l3) / (2 * self.l1 * self.l3)
+
+        # Points out of reach are moved to the edge of the workspace
+        if cos_elbow > 1:
+            cos_elbow = 1
+        elif cos_elbow < -1:
+            cos_elbow = -1
+        elbow = self.elbow * math.acos(cos_elbow)
+
+        theta1 = math.atan2(y_coord, x_coord) - math.atan2(self.l3 * math.sin(elbow),
+                                                           self.l1 + self.l3 * math.cos(elbow))
+        theta2 = theta1 + elbow - math.pi
+
+        # Keep the angles on the same turn as the Newton-Raphson initial guess
+        return self.wrap(theta1, math.pi/2), self.wrap(theta2, 0)
+
+    # Function to compute theta values for whole arrays of xy-coords at once
+    # Returns an array of theta1 values and an array of theta2 values
+    def get_theta_arrays(self, x_coords, y_coords):
+
+        x = np.array(x_coords)
+        y = np.array(y_coords)
+
+        cos_elbow = (x * x + y * y - self.l1 * self.l1 - self.l3 * self.l3) / (2 * self.l1 * self.l3)
+        cos_elbow = np.clip(cos_elbow, -1, 1)
+        # acos written with arctan2, which both ulab and NumPy provide
+        elbow = self.elbow * np.arctan2(np.sqrt(1 - cos_elbow * cos_elbow), cos_elbow)
+
+        theta1 = np.arctan2(y, x) - np.arctan2(self.l3 * np.sin(elbow),
+                                               self.l1 + self.l3 * np.cos(elbow))
+        theta2 = theta1 + elbow - math.pi
+
+        # Same wrapping as wrap(), on whole arrays
+        theta1 -= 2 * math.pi * np.floor((theta1 - math.pi/2 + math.pi) / (2 * math.pi))
+        theta2 -= 2 * math.pi * np.floor((theta2 + math.pi) / (2 * math.pi))
+
+        return theta1, theta2
+
+
+class TableThetaGenerator(ThetaGenerator):
+
+    # Magic bytes at the start of a table file
+    MAGIC = b'IKTB'
+
+    def __init__(self, x0=0, y0=0, width=1, height=1, nx=33, ny=33, solver=None):
+        super().__init__()
+
+        # Exact solver used to build the table and for points outside of it
+        self.solver = solver if solver is not None else AnalyticThetaGenerator()
+
+        # Grid of nx by ny points covering the area starting at (x0, y0)
+        self.x0 = x0
+        self.y0 = y0
+        self.nx = nx
+        self.ny = ny
+        self.dx = width / (nx - 1)
+        self.dy = height / (ny - 1)
+
+        # Theta values of each grid point as [theta1, theta2, theta1, ...],
+        # one row of x values after the other
+        self.table = array.array('f', [0] * (2 * nx * ny))
+
+    # Function to fill the table by solving every grid point
+    def build(self):
+        idx = 0
+        for j in range(self.ny):
+            for i in range(self.nx):
+                theta1, theta2 = self.solver.get_theta_values(self.x0 + i * self.dx,
+                                                              self.y0 + j * self.dy)
+                self.table[idx] = theta1
+                self.table[idx + 1] = theta2
+                idx += 2
+
+    # Function to write the table to a binary file
+    def save(self, filename):
+        with open(filename, 'wb') as file:
+            file.write(self.MAGIC)
+            file.write(struct.pack('<HH4f', self.nx, self.ny, self.x0, self.y0, self.dx, self.dy))
+            file.write(self.table)
+
+    # Function to read a table written by save()
+    def load(self, filename):
+        with open(filename, 'rb') as file:
+            header = file.read(4 + struct.calcsize('<HH4f'))
+            if header[0:4] != self.MAGIC:
+                raise ValueError('Not an IK table file')
+            self.nx, self.ny, self.x0, self.y0, self.dx, self.dy = struct.unpack('<HH4f', header[4:])
+            self.table = array.array('f', [0] * (2 * self.nx * self.ny))
+            file.readinto(self.table)
+
+    # Main function to compute and return theta values from xy-coords
+    def get_theta_values(self, x_coord, y_coord):
+
+        # Position of the point in grid cells
+        fx = (x_coord - self.x0) / self.dx
+        fy = (y_coord - self.y0) / self.dy
+
+        # Points outside of the table are solved exactly
+        if fx < 0 or fy < 0 or fx > self.nx - 1 or fy > self.ny - 1:
+            return self.solver.get_theta_values(x_coord, y_coord)
+
+        # Cell containing the point, the last row and column use the cell before them
+        i = min(int(fx), self.nx - 2)
+        j = min(int(fy), self.ny - 2)
+        tx = fx - i
+        ty = fy - j
+
+        # Bilinear interpolation between the four corners of the cell
+        table = self.table
+        a = 2 * (j * self.nx + i)
+        b = a + 2
+        c = a + 2 * self.nx
+        d = c + 2
+        theta1 = ((table[a] * (1 - tx) + table[b] * tx) * (1 - ty)
+                  + (table[c] * (1 - tx) + table[d] * tx) * ty)
+        theta2 = ((table[a + 1] * (1 - tx) + table[b + 1] * tx) * (1 - ty)
+                  + (table[c + 1] * (1 - tx) + table[d + 1] * tx) * ty)
+
+        return theta1, theta2
+
+    # Function to compute theta values for whole arrays of xy-coords at once
+    # The cells and weights are worked out on whole arrays. The corners are
+    # read from the table one point at a time, as ulab can't index an array
+    # with another array, and points outside of the table are solved exactly
+    def get_theta_arrays(self, x_coords, y_coords):
+        x = np.array(x_coords)
+        y = np.array(y_coords)
+        count = len(x)
+
+        # Position of each point in grid cells, and the cell containing it
+        fx = (x - self.x0) / self.dx
+        fy = (y - self.y0) / self.dy
+        i = np.clip(np.floor(fx), 0, self.nx - 2)
+        j = np.clip(np.floor(fy), 0, self.ny - 2)
+        tx = fx - i
+        ty = fy - j
+
+        # Theta values at the four corners of each cell
+        table = self.table
+        corners = np.zeros((8, count))
+        outside = []
+        for n in range(count):
+            if fx[n] < 0 or fy[n] < 0 or fx[n] > self.nx - 1 or fy[n] > self.ny - 1:
+                outside.append(n)
+                continue
+            a = 2 * (int(j[n]) * self.nx + int(i[n]))
+            c = a + 2 * self.nx
+            corners[0, n] = table[a]
+            corners[1, n] = table[a + 1]
+            corners[2, n] = table[a + 2]
+            corners[3, n] = table[a + 3]
+            corners[4, n] = table[c]
+            corners[5, n] = table[c + 1]
+            corners[6, n] = table[c + 2]
+            corners[7, n] = table[c + 3]
+
+        # Bilinear interpolation between the corners, as in get_theta_values()
+        theta1 = ((corners[0] * (1 - tx) + corners[2] * tx) * (1 - ty)
+                  + (corners[4] * (1 - tx) + corners[6] * tx) * ty)
+        theta2 = ((corners[1] * (1 - tx) + corners[3] * tx) * (1 - ty)
+                  + (corners[5] * (1 - tx) + corners[7] * tx) * ty)
+
+        for n in outside:
+            theta1[n], theta2[n] = self.solver.get_theta_values(x[n], y[n])
 
+        return theta1, theta2
 
+    # Function to measure the error of the table against the exact solver
+    # Checks samples by samples points inside every cell and returns the largest
+    # angle error in radians and the largest pen position error in inches
+    def error_report(self, samples=4):
+        max_theta = 0
+        max_pos = 0
+        for j in range((self.ny - 1) * samples + 1):
+            for i in range((self.nx - 1) * samples + 1):
+                x = self.x0 + i * self.dx / samples
+                y = self.y0 + j * self.dy / samples
+                theta1, theta2 = self.get_theta_values(x, y)
+                exact1, exact2 = self.solver.get_theta_values(x, y)
+                max_theta = max(max_theta, abs(theta1 - exact1), abs(theta2 - exact2))
+                x_pen, y_pen = self.get_xy(theta1, theta2)
+                max_pos = max(max_pos, math.sqrt((x_pen - x) ** 2 + (y_pen - y) ** 2))
+        return max_theta, max_pos
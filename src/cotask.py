@@ -26,8 +26,24 @@ SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 """
 
 import gc                              # Memory allocation garbage collector
+import array                           # Compact storage for histograms
 import utime                           # Micropython version of time library
 import micropython                     # This shuts up incorrect warnings
+try:
+    from pyb import wfi                # Sleep until the next interrupt
+except ImportError:
+    from machine import idle as wfi
+
+
+## The number of buckets in each profiling histogram. Bucket 0 counts times
+#  of 0 us and bucket @c k counts times from 2**(k-1) to 2**k - 1 us; the last
+#  bucket also counts anything longer.
+HIST_BUCKETS = 24
+
+## The clock which tasks are timed by, anything with the @c ticks_us() and
+#  @c ticks_diff() functions of @c utime. A simulation on a PC can replace it
+#  with a virtual clock, along with @c task_share.clock.
+clock = utime
 
 
 class Task:
@@ -80,8 +96,9 @@ class Task:
                The time can be given in a @c float or @c int; it will be 
                converted to microseconds for internal use by the scheduler.
         @param profile Set to @c True to enable run-time profiling 
-        @param trace Set to @c True to generate a list of transitions between
-               states. @b Note: This slows things down and allocates memory.
+        @param trace Set to @c True to record each run of the task, with its
+               state and start and end times, in the trace ring created by
+               @c enable_trace(). Nothing is allocated while the task runs.
         """
         # The function which is run to implement this task's code. Since it 
         # is a generator, we "run" it here, which doesn't actually run it but
@@ -102,30 +119,35 @@ class Task:
         #  @c go() method. 
         if period != None:
             self.period = int (period * 1000)
-            self._next_run = utime.ticks_us () + self.period
+            self._next_run = clock.ticks_us () + self.period
         else:
             self.period = period
             self._next_run = None
 
         # Flag which causes the task to be profiled, in which the execution
         #  time of the @c run() method is measured and basic statistics kept. 
+        #  Histograms of run times and lateness are allocated here so that
+        #  profiling doesn't allocate memory while the task runs
         self._prof = profile
+        self._run_hist = array.array ('H', range (HIST_BUCKETS))
+        self._late_hist = array.array ('H', range (HIST_BUCKETS))
         self.reset_profile ()
 
-        # The previous state in which the task last ran. It is used to watch
-        # for and track state transitions.
-        self._prev_state = 0
-
-        # If transition tracing has been enabled, create an empty list in 
-        # which to store transition (time, to-state) stamps
+        # If tracing has been enabled, register the task with the trace ring,
+        # which records every run of every traced task in one timeline
         self._trace = trace
-        self._tr_data = []
-        self._prev_time = utime.ticks_us ()
+        if trace:
+            self._trace_id = enable_trace ().register (name)
 
         ## Flag which is set true when the task is ready to be run by the
         #  scheduler
         self.go_flag = False
 
+        # The task list this task was appended to, and whether the task is in
+        # that list's deadline heap, so wake_at() can add it
+        self._list = None
+        self._in_heap = False
+
 
     def schedule (self) -> bool:
         """!
@@ -140,41 +162,30 @@ class Task:
             # Reset the go flag for the next run
             self.go_flag = False
 
-            # If profiling, save the start time
-            if self._prof:
-                stime = utime.ticks_us ()
+            # If profiling or tracing, save the start time
+            if self._prof or self._trace:
+                stime = clock.ticks_us ()
 
             # Run the method belonging to the state which should be run next
             curr_state = next (self._run_gen)
 
             # If profiling or tracing, save timing data
             if self._prof or self._trace:
-                etime = utime.ticks_us ()
+                etime = clock.ticks_us ()
 
             # If profiling, save timing data
             if self._prof:
                 self._runs += 1
-                runt = utime.ticks_diff (etime, stime)
+                runt = clock.ticks_diff (etime, stime)
                 if self._runs > 2:
                     self._run_sum += runt
                     if runt > self._slowest:
                         self._slowest = runt
+                    _count (self._run_hist, runt)
 
-            # If transition logic tracing is on, record a transition; if not,
-            # ignore the state. If out of memory, switch tracing off and 
-            # run the memory allocation garbage collector
+            # If tracing, record the run in the trace ring
             if self._trace:
-                try:
-                    if curr_state != self._prev_state:
-                        self._tr_data.append (
-                            (utime.ticks_diff (etime, self._prev_time),
-                             curr_state))
-                except MemoryError:
-                    self._trace = False
-                    gc.collect ()
-
-                self._prev_state = curr_state
-                self._prev_time = etime
+                trace_ring.record (self._trace_id, curr_state, stime, etime)
 
             return True
 
@@ -194,19 +205,30 @@ class Task:
         # If this task uses a timer, check if it's time to run run() again. If
         # so, set go flag and set the timer to go off at the next run time
         if self.period != None:
-            late = utime.ticks_diff (utime.ticks_us (), self._next_run)
-            if late > 0:
+            late = clock.ticks_diff (clock.ticks_us (), self._next_run)
+            if late >= 0:
                 self.go_flag = True
-                self._next_run = utime.ticks_diff (self.period, 
+                self._next_run = clock.ticks_diff (self.period, 
                                                    -self._next_run)
 
-                # If keeping a latency profile, record the data
+                # If keeping a latency profile, record the data. A run which
+                # starts after the next one was due has missed its deadline
                 if self._prof:
                     self._late_sum += late
                     if late > self._latest:
                         self._latest = late
+                    _count (self._late_hist, late)
+                    if late >= self.period:
+                        self._missed += 1
+
+        # If the task doesn't use a timer but wake_at() has given it a time
+        # to run, set the go flag once that time has come
+        elif self._next_run is not None:
+            if clock.ticks_diff (clock.ticks_us (), self._next_run) >= 0:
+                self.go_flag = True
+                self._next_run = None
 
-        # If the task doesn't use a timer, we rely on go_flag to signal ready
+        # Otherwise we rely on go_flag to signal ready
         return self.go_flag
 
 
@@ -214,13 +236,37 @@ class Task:
         """!
         This method sets the period between runs of the task to the given
         number of milliseconds, or @c None if the task is triggered by calls
-        to @c go() rather than time.
+        to @c go() rather than time. The task is next due one period from
+        now.
         @param new_period The new period in milliseconds between task runs
         """
         if new_period is None:
             self.period = None
+            self._next_run = None
         else:
             self.period = int (new_period) * 1000
+            self._next_run = clock.ticks_diff (self.period,
+                                               -clock.ticks_us ())
+
+        # The deadline scheduler must sort its tasks again
+        if self._list is not None:
+            self._list._heap = None
+
+
+    def wake_at (self, ticks):
+        """!
+        Have a task which is run by @c go() run once at the given time, as if
+        @c go() were called then. This lets a task wait for a while without
+        keeping itself ready to run, so the scheduler can sleep in the
+        meantime. Calling it again before that time moves the wake-up.
+        @param ticks The time at which the task is to run, from the
+               @c ticks_us() function of @c clock
+        """
+        if self.period is not None:
+            raise ValueError ('Task ' + self.name + ' runs on a timer')
+        self._next_run = ticks
+        if self._list is not None:
+            self._list._wake (self)
 
 
     def reset_profile (self):
@@ -233,25 +279,33 @@ class Task:
         self._slowest = 0
         self._late_sum = 0
         self._latest = 0
+        self._missed = 0
+        for idx in range (HIST_BUCKETS):
+            self._run_hist[idx] = 0
+            self._late_hist[idx] = 0
 
 
     def get_trace (self):
         """!
         This method returns a string containing the task's transition trace.
-        The trace is a set of tuples, each of which contains a time and the
-        states from and to which the system transitioned. 
+        The trace is taken from the runs of this task which are still in the
+        trace ring; each line shows the time, in seconds since the oldest run
+        in the ring, and the states from and to which the task transitioned. 
         @return A possibly quite large string showing state transitions
         """
         tr_str = 'Task ' + self.name + ':'
         if self._trace:
             tr_str += '\n'
             last_state = 0
-            total_time = 0.0
-            for item in self._tr_data:
-                total_time += item[0] / 1000000.0
-                tr_str += '{: 12.6f}: {: 2d} -> {:d}\n'.format (total_time, 
-                    last_state, item[1])
-                last_state = item[1]
+            first = None
+            for task_id, state, start, end in trace_ring.runs ():
+                if first is None:
+                    first = start
+                if task_id == self._trace_id and state != last_state:
+                    tr_str += '{: 12.6f}: {: 2d} -> {:d}\n'.format (
+                        clock.ticks_diff (start, first) / 1000000.0, 
+                        last_state, state)
+                    last_state = state
         else:
             tr_str += ' not traced'
         return (tr_str)
@@ -266,6 +320,34 @@ class Task:
         self.go_flag = True
 
 
+    def percentiles (self, late = False, points = (50, 90, 99)):
+        """!
+        Estimate percentiles of the task's run time or lateness.
+        The estimates come from the profiling histograms, so each one is the
+        upper end of a bucket: the true value is at most that and more than
+        half of it. 
+        @param late @c True for lateness, @c False for run time
+        @param points The percentiles to be estimated
+        @return A list of estimated times in microseconds, one per percentile,
+                or @c None for each one if nothing has been recorded
+        """
+        hist = self._late_hist if late else self._run_hist
+        total = sum (hist)
+        results = []
+        for point in points:
+            if not total:
+                results.append (None)
+                continue
+            limit = total * point / 100
+            seen = 0
+            for idx in range (HIST_BUCKETS):
+                seen += hist[idx]
+                if seen >= limit:
+                    break
+            results.append ((1 << idx) - 1)
+        return results
+
+
     def __repr__ (self):
         """!
         This method converts the task to a string for diagnostic use.
@@ -290,6 +372,154 @@ class Task:
         return rst
 
 
+# =============================================================================
+
+class TraceRing:
+    """!
+    A fixed-size record of the most recent runs of all traced tasks.
+    Each run of a traced task is stored as the task's ID, the state it
+    yielded and the times at which the run started and ended, in a ring
+    buffer allocated when the ring is created; when the ring is full, the
+    oldest runs are overwritten. Since recording a run allocates no memory,
+    tracing can stay on for as long as the program runs. The ring can be sent
+    to a PC with @c dump() and shown there as a timeline by
+    @c tools/trace_decode.py:
+    @code
+    cotask.enable_trace (1000)
+    task1 = cotask.Task (task1_fun, name = 'Task 1', period = 10, trace = True)
+    # ... run the scheduler, then send the trace to the PC
+    cotask.trace_ring.dump (pyb.UART (2, 115200))
+    @endcode
+    """
+    ## The bytes at the start of a dump of a trace ring
+    MAGIC = b'CTRC'
+
+    ## The number of array elements in each record
+    WIDTH = 3
+
+    def __init__ (self, depth = 512):
+        """!
+        Create a trace ring.
+        @param depth The number of runs which the ring can hold
+        """
+        ## The number of runs which the ring can hold
+        self.depth = depth
+
+        ## The names of the traced tasks, indexed by task ID
+        self.names = []
+
+        # Records of (task ID << 16 | state, start, end) in 32-bit integers
+        self._data = array.array ('i', range (self.WIDTH * depth))
+        self.clear ()
+
+
+    def register (self, name):
+        """!
+        Add a task to the ring's list of task names.
+        @param name The name of the task
+        @return The ID of the task, used to tag its runs
+        """
+        self.names.append (name)
+        return len (self.names) - 1
+
+
+    def clear (self):
+        """!
+        Forget all the runs recorded so far.
+        """
+        self._idx = 0
+        self._count = 0
+
+
+    @micropython.native
+    def record (self, task_id, state, start, end):
+        """!
+        Record one run of a task, overwriting the oldest run if the ring is
+        full. States which aren't integers are recorded as 0; integer states
+        are kept to 16 bits.
+        @param task_id The ID of the task, from @c register()
+        @param state The state yielded by the task
+        @param start The value of @c clock.ticks_us() when the run started
+        @param end The value of @c clock.ticks_us() when the run ended
+        """
+        if not isinstance (state, int):
+            state = 0
+        idx = self._idx
+        self._data[idx] = (task_id << 16) | (state & 0xFFFF)
+        self._data[idx + 1] = start
+        self._data[idx + 2] = end
+        idx += self.WIDTH
+        if idx >= len (self._data):
+            idx = 0
+        self._idx = idx
+        self._count += 1
+
+
+    def runs (self):
+        """!
+        Go through the recorded runs, oldest first.
+        @return A generator which yields (task ID, state, start, end) for each
+                recorded run
+        """
+        data = self._data
+        number = min (self._count, self.depth)
+        idx = self._idx - self.WIDTH * number
+        if idx < 0:
+            idx += len (data)
+        for _ in range (number):
+            yield data[idx] >> 16, data[idx] & 0xFFFF, data[idx + 1], \
+                data[idx + 2]
+            idx += self.WIDTH
+            if idx >= len (data):
+                idx = 0
+
+
+    def dump (self, port):
+        """!
+        Send the recorded runs through a serial port in binary form.
+        The dump starts with @c MAGIC, then the number of task names, the
+        number of runs and the number of runs which have been overwritten,
+        each as a little-endian 32-bit integer. Each task name follows as one
+        byte of length and its characters, then the runs, oldest first, as
+        three little-endian 32-bit integers each, as they are stored. 
+        @param port An object with a @c write() method, such as a
+               @c pyb.UART or a file opened in binary mode
+        """
+        number = min (self._count, self.depth)
+        header = array.array ('i', (len (self.names), number,
+                                    self._count - number))
+        port.write (self.MAGIC)
+        port.write (header)
+        for name in self.names:
+            port.write (bytes ((len (name),)))
+            port.write (name.encode ())
+
+        # Send the part of the ring holding the oldest runs, then the rest
+        view = memoryview (self._data)
+        if self._count > self.depth:
+            port.write (view[self._idx:])
+        port.write (view[:self._idx])
+
+
+## The trace ring in which all traced tasks record their runs, or @c None
+#  until tracing is enabled
+trace_ring = None
+
+
+def enable_trace (depth = 512):
+    """!
+    Create the trace ring in which traced tasks record their runs, if it
+    hasn't already been created. This is done when the first task with
+    @c trace=True is created; calling it before that sets the ring's depth.
+    @param depth The number of runs which the ring can hold
+    @return The trace ring
+    """
+    global trace_ring
+    if trace_ring is None:
+        trace_ring = TraceRing (depth)
+    return trace_ring
+
+
 # =============================================================================
 
 class TaskList:
@@ -317,6 +547,18 @@ class TaskList:
         #  that priority. 
         self.pri_list = []
 
+        ## The function called by @c deadline_sched() with the number of
+        #  microseconds until the next task is due when no task is ready to
+        #  run. By default it sleeps until the next interrupt; on a PC it
+        #  can be replaced by a function which sleeps or advances a clock.
+        self.idle = _idle
+
+        # Heap of the tasks which run on a timer, ordered by the time each is
+        # next due, and list of the tasks run by go(), highest priority
+        # first, used by deadline_sched(). They're built on first use
+        self._heap = None
+        self._event_tasks = None
+
 
     def append (self, task):
         """!
@@ -344,6 +586,10 @@ class TaskList:
         # Make sure the main list (of lists at each priority) is sorted
         self.pri_list.sort (key=lambda pri: pri[0], reverse=True)
 
+        # The deadline scheduler's heap must be rebuilt to include the task
+        task._list = self
+        self._heap = None
+
 
     @micropython.native
     def rr_sched (self):
@@ -388,6 +634,156 @@ class TaskList:
                     return
 
 
+    @micropython.native
+    def deadline_sched (self):
+        """!
+        Run the next task which is due, or sleep until one is.
+        This scheduler keeps the tasks which run on a timer in a heap ordered
+        by the time each one is next due, so it only has to look at the task
+        at the top of the heap rather than asking every task what time it is.
+        Tasks with @c period=None are run, in priority order, when their
+        @c go() method has been called and no task is due on its timer, so a
+        task which keeps calling its own @c go() can't hold up the timed
+        tasks. If no task is ready, @c idle() is called with the number of
+        microseconds until the next task is due; on the board it sleeps until
+        the next interrupt, which may be the one whose handler calls @c go().
+        When several tasks are due at once, the one with the highest priority
+        runs first, as with @c pri_sched(), and of tasks with the same
+        priority the one which has been due the longest. Tasks run by
+        @c go() which are waiting for the time given to their @c wake_at()
+        method are in the heap as well, until that time comes.
+        """
+        if self._heap is None:
+            self._rebuild ()
+
+        # If the task which is due soonest has come due, run the task with
+        # the highest priority of those which are due, then move it down the
+        # heap to its next due time, or out of the heap if it was woken up once
+        heap = self._heap
+        wait = None
+        if heap:
+            now = clock.ticks_us ()
+            wait = clock.ticks_diff (heap[0]._next_run, now)
+            if wait <= 0:
+                task = heap[0]
+                for other in heap:
+                    if clock.ticks_diff (other._next_run, now) <= 0 and (
+                            other.priority > task.priority
+                            or other.priority == task.priority and clock.ticks_diff (
+                                other._next_run, task._next_run) < 0):
+                        task = other
+                task.schedule ()
+                if self._heap is not heap:
+                    return
+                idx = heap.index (task)
+                if task._next_run is None:
+                    self._remove (idx)
+                else:
+                    self._sift_down (idx)
+                return
+
+        # Otherwise run the highest priority task whose go() has been called
+        for task in self._event_tasks:
+            if task.go_flag:
+                task.schedule ()
+                return
+
+        self.idle (wait)
+
+
+    def _rebuild (self):
+        """!
+        Sort the tasks for the deadline scheduler. This is done the first time
+        @c deadline_sched() runs after a task is appended or the period of a
+        task is changed.
+        """
+        self._heap = []
+        self._event_tasks = []
+        for pri in self.pri_list:
+            for task in pri[2:]:
+                if task.period is None:
+                    self._event_tasks.append (task)
+                task._in_heap = task._next_run is not None
+                if task._in_heap:
+                    self._heap.append (task)
+        for idx in range (len (self._heap) // 2 - 1, -1, -1):
+            self._sift_down (idx)
+
+
+    def _wake (self, task):
+        """!
+        Put a task which has been given a time to run by @c wake_at() into the
+        heap, or move it to its new place if it's in the heap already.
+        @param task The task to be woken up
+        """
+        heap = self._heap
+        if heap is None:
+            return
+        if task._in_heap:
+            idx = heap.index (task)
+        else:
+            heap.append (task)
+            task._in_heap = True
+            idx = len (heap) - 1
+        self._sift_down (self._sift_up (idx))
+
+
+    def _remove (self, idx):
+        """!
+        Take a task out of the heap.
+        @param idx The index in the heap of the task to be taken out
+        """
+        heap = self._heap
+        heap[idx]._in_heap = False
+        last = heap.pop ()
+        if idx < len (heap):
+            heap[idx] = last
+            self._sift_down (self._sift_up (idx))
+
+
+    @micropython.native
+    def _sift_up (self, idx):
+        """!
+        Move a task up the heap until no task above it is due later.
+        @param idx The index in the heap of the task to be moved
+        @return The index the task ends up at
+        """
+        heap = self._heap
+        task = heap[idx]
+        while idx > 0:
+            parent = (idx - 1) // 2
+            if clock.ticks_diff (task._next_run, heap[parent]._next_run) >= 0:
+                break
+            heap[idx] = heap[parent]
+            idx = parent
+        heap[idx] = task
+        return idx
+
+
+    @micropython.native
+    def _sift_down (self, idx):
+        """!
+        Move a task down the heap until no task below it is due sooner.
+        Times are compared with @c ticks_diff() so they can wrap around.
+        @param idx The index in the heap of the task to be moved
+        """
+        heap = self._heap
+        length = len (heap)
+        task = heap[idx]
+        while True:
+            child = 2 * idx + 1
+            if child >= length:
+                break
+            if child + 1 < length and clock.ticks_diff (
+                    heap[child + 1]._next_run, heap[child]._next_run) < 0:
+                child += 1
+            if clock.ticks_diff (heap[child]._next_run, task._next_run) >= 0:
+                break
+            heap[idx] = heap[child]
+            idx = child
+        heap[idx] = task
+
+
     def __repr__ (self):
         """!
         Create some diagnostic text showing the tasks in the task list.
@@ -401,6 +797,63 @@ class TaskList:
         return ret_str
 
 
+    def percentile_report (self, points = (50, 90, 99)):
+        """!
+        Create some diagnostic text showing percentiles of each task's run
+        time and lateness in milliseconds, estimated from the profiling
+        histograms of tasks which are profiled, and how many runs of each
+        timed task started after the following run was due. 
+        @param points The percentiles to be shown
+        @return A table with one line per task
+        """
+        ret_str = '{:<16s}{:>6s}{:>8s}'.format ('TASK', 'RUNS', 'MISSED')
+        for kind in ('DUR', 'LATE'):
+            for point in points:
+                ret_str += '{:>9s}'.format (kind + ' P' + str (point))
+        ret_str += '\n'
+        for pri in self.pri_list:
+            for task in pri[2:]:
+                if not task._prof:
+                    continue
+                ret_str += '{:<16s}{: 6d}{: 8d}'.format (task.name, task._runs,
+                                                        task._missed)
+                for late in (False, True):
+                    for value in task.percentiles (late, points):
+                        if value is None:
+                            ret_str += '        -'
+                        else:
+                            ret_str += '{: 9.3f}'.format (value / 1000.0)
+                ret_str += '\n'
+
+        return ret_str
+
+
+def _idle (wait_us):
+    """!
+    Sleep until the next interrupt, which wakes the processor at least once a
+    millisecond on the board. This is the default idle function of a task list.
+    @param wait_us The time in microseconds until the next task is due, or
+           @c None if no task runs on a timer
+    """
+    wfi ()
+
+
+@micropython.native
+def _count (hist, time):
+    """!
+    Count a time in the histogram bucket for its power of two. The count
+    stops at the largest value an unsigned short can hold.
+    @param hist The histogram, an array of unsigned shorts
+    @param time The time in microseconds
+    """
+    idx = 0
+    while time > 0 and idx < HIST_BUCKETS - 1:
+        time >>= 1
+        idx += 1
+    if hist[idx] < 0xFFFF:
+        hist[idx] += 1
+
+
 ## This is @b the main task list which is created for scheduling when 
 #  @c cotask.py is imported into a program. 
 task_list = TaskList ()
@@ -0,0 +1,147 @@
+'''!@file                   hpgl_reader.py
+    @brief                  Streaming tokenizer for HPGL files
+    @details                Reads an HPGL file in fixed-size chunks into a
+                            preallocated buffer and yields one parsed
+                            instruction at a time, without building
+                            strings character by character. Coordinates
+                            with a decimal fraction are rounded to whole
+                            plotter units, and an instruction with more
+                            coordinates than the buffer holds is handed out
+                            as several records.
+    @date                   10/18/26
+'''
+
+import array
+
+
+# Function to pack a two letter HPGL mnemonic into an integer opcode
+def opcode(mnemonic):
+    return (ord(mnemonic[0]) << 8) | ord(mnemonic[1])
+
+# Function to unpack an integer opcode into its two letter mnemonic
+def mnemonic(op):
+    return chr((op >> 8) & 0xFF) + chr(op & 0xFF)
+
+
+# Opcodes of the instructions handled by the plotter
+IN = opcode('IN')
+PU = opcode('PU')
+PD = opcode('PD')
+SP = opcode('SP')
+
+
+class HPGLReader:
+
+    def __init__(self, file, chunk_size=64, max_coords=64):
+
+        # File object opened in binary mode ('rb')
+        self.file = file
+
+        # Buffer the file is read into, one chunk at a time
+        self._chunk = bytearray(chunk_size)
+
+        # Buffer holding the coordinates of the current instruction. The size
+        # is kept even so records are never split in the middle of an xy pair
+        max_coords += max_coords % 2
+        self.coords = array.array('i', range(max_coords))
+        self._coords_view = memoryview(self.coords)
+
+        # True when the last record continues the previous instruction because
+        # the coordinate buffer filled up before the instruction ended
+        self.continued = False
+
+    # Generator yielding (opcode, coordinates) for each instruction in the file
+    # The coordinates are a view into a buffer that is reused by the next record,
+    # so they must be consumed before the generator is resumed
+    def records(self):
+
+        chunk = self._chunk
+        coords = self.coords
+        size = len(coords)
+
+        # State of the instruction currently being parsed
+        op = 0
+        letters = 0
+        count = 0
+        continued = False
+
+        # State of the number currently being parsed. Numbers with a decimal
+        # point are rounded to the nearest whole number by their first
+        # decimal digit, halves away from zero. fraction is 0 before the point,
+        # 1 just after it and 2 once the rounding digit has been seen
+        number = 0
+        sign = 1
+        in_number = False
+        fraction = 0
+
+        while True:
+            n_read = self.file.readinto(chunk)
+            if not n_read:
+                break
+
+            for idx in range(n_read):
+                char = chunk[idx]
+
+                # Digits build up the current number
+                if 48 <= char <= 57:
+                    if not fraction:
+                        number = number * 10 + char - 48
+                    elif fraction == 1:
+                        if char >= 53:
+                            number += 1
+                        fraction = 2
+                    in_number = True
+
+                # A decimal point starts the digits used for rounding
+                elif char == 46:
+                    if not fraction:
+                        fraction = 1
+
+                # A minus sign negates the number that follows
+                elif char == 45:
+                    sign = -1
+
+                # Commas, whitespace and semicolons end the current number
+                elif char == 44 or char <= 32 or char == 59:
+                    if in_number:
+                        # Hand out a full buffer before it overflows
+                        if count == size:
+                            self.continued = continued
+                            yield op, self._coords_view[:count]
+                            count = 0
+                            continued = True
+                        coords[count] = sign * number
+                        count += 1
+                    number = 0
+                    sign = 1
+                    in_number = False
+                    fraction = 0
+
+                    # A semicolon ends the instruction
+                    if char == 59:
+                        if op:
+                            self.continued = continued
+                            yield op, self._coords_view[:count]
+                        op = 0
+                        letters = 0
+                        count = 0
+                        continued = False
+
+                # The first two letters of an instruction are its opcode
+                elif 65 <= char <= 90 or 97 <= char <= 122:
+                    if letters < 2:
+                        op = (op << 8) | (char & 0xDF)
+                        letters += 1
+
+        # Finish an instruction left without a terminating semicolon
+        if in_number:
+            if count == size:
+                self.continued = continued
+                yield op, self._coords_view[:count]
+                count = 0
+                continued = True
+            coords[count] = sign * number
+            count += 1
+        if op:
+            self.continued = continued
+            yield op, self._coords_view[:count]
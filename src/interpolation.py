@@ -0,0 +1,129 @@
+'''!@file                   interpolation.py
+    @brief                  Splitting of straight lines into stepper setpoints
+    @details                The motors move in a straight line in joint space
+                            from one setpoint to the next, which bends away from
+                            the straight line the pen should draw. The adaptive
+                            interpolator only adds setpoints where that bend is
+                            larger than a tolerance: a segment is split in half
+                            while the pen position at its joint-space midpoint
+                            is further than the tolerance from the straight
+                            line. Near the middle of the workspace long lines
+                            need few setpoints, and near the edges of the
+                            workspace they get as many as they need. The
+                            fixed step interpolator steps along a line in
+                            HPGL units with integer arithmetic only, handing
+                            out one point at a time so a long line takes no
+                            more memory than a short one.
+    @date                   10/18/26
+'''
+
+import math
+
+
+# Generator yielding the integer points every step_size HPGL units along the
+# line from prev_coord to coord, ending with coord itself
+# Each point is worked out from the last with a quotient and a running
+# remainder per axis (a DDA), so no floats or lists are needed
+def dda(step_size, prev_coord, coord):
+    x = prev_coord[0]
+    y = prev_coord[1]
+    dx = coord[0] - x
+    dy = coord[1] - y
+
+    # Number of points, set by the axis which moves the furthest
+    steps = max(abs(dx), abs(dy)) // step_size
+    if steps < 1:
+        steps = 1
+
+    # Whole units moved on each step, and the remainders carried between steps
+    step_x, rem_x = divmod(dx, steps)
+    step_y, rem_y = divmod(dy, steps)
+    err_x = 0
+    err_y = 0
+    for _ in range(steps):
+        x += step_x
+        err_x += rem_x
+        if err_x >= steps:
+            x += 1
+            err_x -= steps
+        y += step_y
+        err_y += rem_y
+        if err_y >= steps:
+            y += 1
+            err_y -= steps
+        yield x, y
+
+
+class AdaptiveInterpolator():
+
+    def __init__(self, solver, tolerance=0.01, max_depth=8):
+
+        # Inverse kinematics used for the setpoints and forward kinematics to check them
+        self.solver = solver
+        # Largest distance in inches the pen may stray from the straight line
+        self.tolerance = tolerance
+        # Largest number of times a segment is split in half
+        self.max_depth = max_depth
+
+        # Number of inverse kinematics solves and setpoints so far
+        self.solves = 0
+        self.points_out = 0
+
+        self.reset()
+
+    # Function to forget the last point, so the next one is moved to directly
+    def reset(self):
+        self.x = None
+        self.y = None
+        self.theta1 = 0
+        self.theta2 = 0
+
+    # Function to solve the linkage angles of a point
+    def solve(self, x, y):
+        self.solves += 1
+        return self.solver.get_theta_values(x, y)
+
+    # Function to find how far the pen strays from the line between a and b
+    # when the motors move halfway from a to b in a straight line
+    def midpoint_error(self, ax, ay, a1, a2, bx, by, b1, b2):
+        mx, my = self.solver.get_xy((a1 + b1) / 2, (a2 + b2) / 2)
+        dx = bx - ax
+        dy = by - ay
+        length = math.sqrt(dx * dx + dy * dy)
+        if not length:
+            return math.sqrt((mx - ax) ** 2 + (my - ay) ** 2)
+        return abs(dx * (my - ay) - dy * (mx - ax)) / length
+
+    # Generator yielding the linkage angles of each setpoint from the last
+    # point to (x, y) in inches, ending with (x, y) itself
+    def points(self, x, y):
+        theta1, theta2 = self.solve(x, y)
+
+        # The first point has nothing to interpolate from
+        if self.x is None:
+            self.x, self.y, self.theta1, self.theta2 = x, y, theta1, theta2
+            self.points_out += 1
+            yield theta1, theta2
+            return
+
+        # Ends of the segments still to be checked, the nearest last, each with
+        # the number of splits it took to get to it
+        stack = [(x, y, theta1, theta2, 0)]
+        while stack:
+            bx, by, b1, b2, depth = stack[-1]
+
+            # Split the segment from the last point in half if it strays too far
+            if depth < self.max_depth and self.midpoint_error(
+                    self.x, self.y, self.theta1, self.theta2,
+                    bx, by, b1, b2) > self.tolerance:
+                mx = (self.x + bx) / 2
+                my = (self.y + by) / 2
+                m1, m2 = self.solve(mx, my)
+                stack[-1] = (bx, by, b1, b2, depth + 1)
+                stack.append((mx, my, m1, m2, depth + 1))
+                continue
+
+            stack.pop()
+            self.x, self.y, self.theta1, self.theta2 = bx, by, b1, b2
+            self.points_out += 1
+            yield b1, b2
@@ -15,12 +15,20 @@ from TMC4210_Class import *
 import task_share
 import cotask
 import gc
-import theta_generator
+import array
+import ThetaGenerator as theta_generator
+import hpgl_reader
+import plan
+import planner
+import interpolation
 import math
+import os
 import utime
-from ulab import numpy as np
 import motor
 import encoder
+from plotter_config import theta1_to_steps, theta2_to_steps, setpoint_lead, \
+                           lookahead_depth, junction_deviation, synchronize_axes, \
+                           interpolation_tolerance, hpgl_to_x, hpgl_to_y
 
 
 
@@ -30,55 +38,60 @@ Functions
 ############################
 '''
 
-# Function to interpolate coordinates between two points
-def interpolate(STEP_SIZE, prev_coord, coord):
-
-    # Initialize final arrays
-    x_coords = []
-    y_coords = []
-    x_coords.append(prev_coord[0])
-    y_coords.append(prev_coord[1])
-    
-    # Get start and end coordinates
-    x = coord[0]
-    y = coord[1]
-    x_prev = prev_coord[0]
-    y_prev = prev_coord[1]
-    
-    # Calculate distance between respective x and y coords
-    x_dist = abs(x - x_prev)
-    y_dist = abs(y - y_prev)
-
-    # Return the max of the x dist and the y dist
-    max_dist = max(x_dist, y_dist)
-
-    # Interpolation points will be a function of the greatest distance
-    steps = max_dist//STEP_SIZE
-    
-    # Interpolate if distance between coordinates is great enough
-    if steps:
-        try:
-            # Generate linearly spaced coordinates between x coords
-            x_vals = np.linspace(x_prev, x, steps)
-            x_new = [int(x) for x in x_vals]
-
-            # Add new x coords to list
-            for x_ in x_new:
-                x_coords.append(x_)
-
-            # Generate linearly spaced coordinates between y coords
-            y_vals = np.linspace(y_prev, y, steps)
-            y_new = [int(x) for x in y_vals]
-
-            # Add new x coords to list
-            for y_ in y_new:
-                y_coords.append(y_)
-
-        except ValueError:
-            return x_coords, y_coords
-        
-
-    return x_coords, y_coords
+# Number of points along a line whose angles are solved at once
+IK_BATCH = 32
+
+# Generator yielding the linkage angles of the points every step_size HPGL units
+# along the line from prev_coord to coord, or of coord alone if it's the first
+# The points are solved IK_BATCH at a time with the array solver, so a long
+# line takes no more memory than one batch
+def fixed_thetas(step_size, prev_coord, coord):
+    if prev_coord is None:
+        yield IK.get_theta_values(hpgl_to_x(coord[0]), hpgl_to_y(coord[1]))
+        return
+    x_plot = []
+    y_plot = []
+    points = interpolation.dda(step_size, prev_coord, coord)
+    while True:
+        for x, y in points:
+            x_plot.append(hpgl_to_x(x))
+            y_plot.append(hpgl_to_y(y))
+            if len(x_plot) == IK_BATCH:
+                break
+        if not x_plot:
+            return
+        theta1s, theta2s = IK.get_theta_arrays(x_plot, y_plot)
+        for thetas in zip(theta1s, theta2s):
+            yield thetas
+        x_plot.clear()
+        y_plot.clear()
+
+
+# Function to carry out a pen event from the HPGL file or the motion plan
+# Returns the time at which the plotter is ready for the next move
+def pen_event(event):
+
+    # Turn on LEDs when program starts
+    if event == plan.INIT:
+        PA4.value(True)
+        print("Initializing")
+        return utime.ticks_ms()
+
+    # Add command to share to be processed in motor3 task and
+    # resume the task after 1500ms
+    elif event == plan.PEN_UP:
+        print("Setting Pen Up")
+        dc_share.put(0)
+        return utime.ticks_add(utime.ticks_ms(), 1500)
+
+    # Same for pen down, which also starts playing the audio file
+    elif event == plan.PEN_DOWN:
+        print("Setting Pen Down")
+        dc_share.put(1)
+        PA1.value(True)
+        return utime.ticks_add(utime.ticks_ms(), 1500)
+
+    return utime.ticks_ms()
 
 
 '''
@@ -86,23 +99,63 @@ def interpolate(STEP_SIZE, prev_coord, coord):
 Tasks
 ################
 '''
-# Task 1: Move motor 1: bottom linkage stepper motor
-def motor1():
-    while True:
-        angle1 = theta1_share.get()
-        steps1 = int(angle1*FULL_ROTATION/(2*math.pi))
-        stepper1.set_target_position(int((steps1+52.5)/1.5))
-        yield(0)
-
-# Task 2: Move motor 2: top linkage stepper motor
-def motor2():
+# Task 1: Move both stepper motors to the next setpoint
+# Motor 1 drives the bottom linkage and motor 2 the top linkage
+# The next setpoint is sent once both motors are within setpoint_lead steps of
+# the last one, and in_motion is cleared once they have reached it
+# With a look-ahead planner, setpoints are buffered in it first and each is sent
+# with the top speed planned for it and the lead needed to keep moving
+# With synchronize_axes, the speeds of the motors are scaled so both arrive together
+def steppers():
+    # Buffer the setpoints are read into, so no tuple is allocated per point
+    target = array.array('i', [0, 0])
+    # Whether a setpoint has been read which hasn't been sent yet
+    waiting = False
+    # Whether the motors are still moving to the last setpoint sent
+    moving = False
+    # Distance from the last setpoint at which the next one is sent
+    lead = setpoint_lead
     while True:
-        angle2 = theta2_share.get()
-        steps2 = int(angle2*FULL_ROTATION/(2*math.pi))
-        stepper2.set_target_position(int(steps2/-1.5))
+        if look_ahead:
+            while not look_ahead.full() and setpoints.try_get_into(target):
+                look_ahead.add(target[0], target[1])
+            waiting = look_ahead.any()
+        elif not waiting:
+            waiting = setpoints.try_get_into(target)
+
+        # Send the setpoint once the motors are close enough to the last one
+        if waiting and (lead is None or not moving or
+                        (stepper1.near_target(lead) and stepper2.near_target(lead))):
+            speed = None
+            if look_ahead:
+                look_ahead.next(target)
+                speed = stepper1.steps_to_velocity(look_ahead.segment_speed)
+                if setpoint_lead is not None:
+                    lead = max(setpoint_lead, look_ahead.lead)
+            if synchronize_axes:
+                move_both(stepper1, stepper2, target[0], target[1], speed)
+            else:
+                if speed is not None:
+                    stepper1.set_max_speed(speed)
+                    stepper2.set_max_speed(speed)
+                stepper1.set_target_position(target[0])
+                stepper2.set_target_position(target[1])
+            waiting = False
+            moving = setpoint_lead is not None
+
+        # Otherwise check if the motors have reached the last setpoint
+        elif moving and not waiting:
+            moving = not (stepper1.near_target() and stepper2.near_target())
+            if look_ahead and not moving:
+                look_ahead.stop(target[0], target[1])
+
+        state = 1 if waiting or moving else 0
+        if in_motion.get() != state:
+            in_motion.put(state)
         yield(0)
 
 # Task 3: Move motor 3: dc motor
+# Runs when a command is written to dc_share rather than on a timer
 def motor3():
     UP = 0
     DOWN = 1
@@ -132,9 +185,13 @@ def motor3():
         else:
             delay = utime.ticks_add(utime.ticks_ms(), 0)
 
-        # Wait for timer to finish before stopping motor
-        while utime.ticks_diff(delay, utime.ticks_ms()) > 0:
-            pass    
+        # Wait for timer to finish before stopping motor, having the
+        # scheduler wake this task up then so it can sleep in the meantime
+        remaining = utime.ticks_diff(delay, utime.ticks_ms())
+        while remaining > 0:
+            motor3_task.wake_at(utime.ticks_add(utime.ticks_us(), 1000 * remaining))
+            yield(0)
+            remaining = utime.ticks_diff(delay, utime.ticks_ms())
         dcmotor.set_duty(0)        
 
         yield(0)
@@ -143,12 +200,6 @@ def motor3():
 
 # Task 4: Generate theta values from HPGL file
 def theta_gen():
-    # Boolean variable to state whether the HPGL file is finished or not
-    processing = True
-
-    # Define empty string for processing the characters of the HPGL file
-    buffer = ""
-
     # Variable for a non-blocking timer
     delay = utime.ticks_ms()
     
@@ -162,192 +213,155 @@ def theta_gen():
         while active:
 
             # Open the HPGL file
-            with open('circle.hpgl', 'r') as file:
+            with open(HPGL_FILE, 'rb') as file:
+
+                # Tokenizer handing out one instruction at a time
+                reader = hpgl_reader.HPGLReader(file)
+
+                # Last coordinate sent to the motors, None until the first one
+                prev_coord = None
+                if interpolator:
+                    interpolator.reset()
                 
+                # Whether the instruction being read is one the plotter carries out
+                accepted = False
+
                 # Loop to process the HPGL file
-                while processing:
-                    # Boolean variable that will allow one full instruction to be processed at a time
-                    instruction_flag = True
-                    
-                    # Populate the buffer with the instruction
-                    while instruction_flag:
-                        
-                        # If the next character is number or letter, continue appending the instruction
-                        # If ; end the instruction. If empty, file is done being processed
-                        char = file.read(1)
-                        if char == "":
-                            processing = False
-                            instruction_flag = False
-                        elif char == ";":
-                            instruction_flag = False
+                for op, coords in reader.records():
+
+                    # A long instruction is split over several records, only
+                    # the first one carries the pen command
+                    if not reader.continued:
+
+                        # Any other command (such as SP) is skipped
+                        accepted = op == hpgl_reader.IN or op == hpgl_reader.PU or op == hpgl_reader.PD
+                        if not accepted:
+                            continue
+
+                        # Let the motors reach every queued setpoint before the pen moves
+                        while setpoints.any() or in_motion.get():
+                            yield(0)
+
+                        # Carry out the pen command of the instruction
+                        if op == hpgl_reader.IN:
+                            delay = pen_event(plan.INIT)
+                        elif op == hpgl_reader.PU:
+                            delay = pen_event(plan.PEN_UP)
+                            # The pen jumps away from the last line, so don't
+                            # seed the solver with its end
+                            IK.reset()
                         else:
-                            buffer += char
-                                    
-                    
-                    # Read the command of each string
-                    if buffer[0:2] == "IN":
-                        # Turn on LEDs when program starts
-                        PA4.value(True)
-                        # Clear the command from the string
-                        buffer = buffer.replace('IN', "")
-                        print("Initializing")
-                    
-                    # Read the command of each string
-                    elif buffer[0:2] == "PU":
-                        # Clear the command from the string
-                        buffer = buffer.replace('PU', "")
-                        print("Setting Pen Up")
-
-                        # Add command to share to be processed in motor3 task
-                        dc_share.put(0)
-
-                        # Set the delay to resume the task after 1500ms
-                        delay = utime.ticks_add(utime.ticks_ms(), 1500)
-                        
-                    # Read the command of each string
-                    elif buffer[0:2] == "PD":
-                        # Clear the command from the string
-                        buffer = buffer.replace('PD', "")
-                        print("Setting Pen Down")
-
-                        # Add command to share to be processed in motor3 task
-                        dc_share.put(1)
-
-                        # Start playing audio file on PD command
-                        PA1.value(True)
-
-                        # Set the delay to resume the FSM after 1500ms
-                        delay = utime.ticks_add(utime.ticks_ms(), 1500)
-                        
-                    # Read the command of each string
-                    elif buffer[0:2] == "SP":
-                        # If command is SP, clear buffer and restart
-                        buffer = ""
+                            delay = pen_event(plan.PEN_DOWN)
+
+                    # The rest of a skipped command is skipped too
+                    elif not accepted:
                         continue
                     
                     # Wait for non-blocking timer to complete
                     while utime.ticks_diff(delay, utime.ticks_ms()) > 0:
-                        pass
                         yield(0)
                     # When timer is up, stop playing audio file
                     PA1.value(False)
-                        
-                    # If buffer is small enough, there is only one point so no need for interpolate
-                    # Process HPGL code with a simpler method instead
-                    if len(buffer) <= 8:
-                        # Split points by the comma
-                        coord = buffer[:].split(',')                    
-                        # Run if there is still a pair of coordinates
-                        if len(coord) >= 2:
-                            x = 0
-                            y = 1
-                            for _ in range(len(coord)//2):
-                                x_plot = (x / max_hpgl * draw_width) + draw_zero_x
-                                y_plot = (y / max_hpgl * draw_height) + draw_zero_y
-                                
-                                # Solve for theta values with Newton-Raphson
-                                thetas = NR.get_theta_values(x_plot, y_plot)
-                                
-                                # Add pair of theta values to share
-                                theta1_share.put(thetas[0])
-                                theta2_share.put(thetas[1])
-                                x += 2
-                                y += 2
-                                
-                                yield(0)                 
-                            
-                    # Initialize flags 
-                    coord_flag = False
-                    first_flag = True
-                    last_flag = False
 
                     # Define interpolate step size
                     STEP_SIZE = 10
-                    
-                    coord = []
-                    number = ""
-                    # Iterate through each character in current buffer
-                    for letter in buffer:
-                        # If character is a comma, append current coord to list
-                        if letter == ',':
-                            coord.append(int(number))
-                            number = ""                        
-                            
-                            # If there are two coordinates (xy pair), interpolate
-                            if coord_flag:                                
-                                
-                                # If it is the first coordinate, define initial coord and continue
-                                if first_flag:
-                                    prev_coord = coord[:]
-                                    first_flag = False
-                                    coord_flag = False
-                                    last_flag = True
-                                    coord.clear()
-                                    continue                                                     
-                                
-                                # Interpolate between current and previous coordinates
-                                x_coords, y_coords = interpolate(STEP_SIZE, prev_coord, coord)
-                                                            
-                                # Iterate through interpolated list                                                        
-                                for x, y in zip(x_coords, y_coords):      
-                                    # Get xy values to plot                          
-                                    x_plot = (x / max_hpgl * draw_width) + draw_zero_x
-                                    y_plot = (y / max_hpgl * draw_height) + draw_zero_y
-
-                                    # Solve for motor angles with Newton-Raphson method
-                                    thetas = NR.get_theta_values(x_plot, y_plot)
-
-                                    # Add angles to shares
-                                    theta1_share.put(thetas[0])
-                                    theta2_share.put(thetas[1])
-        
-                                    yield(0)
 
-                                # Copy the current coord to new variable at end of every iteration
-                                prev_coord = coord[:]                                             
-                                # Clear current coord   
-                                coord.clear()
-                                coord_flag = False
-                                continue
-
-                            # Flag to build up two points for x and y before processing
-                            coord_flag = True
-                                            
-                        # If character if a number, append to string                                        
+                    # Iterate through each xy pair of the instruction
+                    for idx in range(0, len(coords) - 1, 2):
+                        coord = [coords[idx], coords[idx + 1]]
+
+                        # Split the line only where the motors would stray from it
+                        if interpolator:
+                            thetas = interpolator.points(hpgl_to_x(coord[0]), hpgl_to_y(coord[1]))
+
+                        # Otherwise step along it, one point at a time
                         else:
-                            number += letter
-                            
-                    # Interpolate code to run for the last coordinate                        
-                    if last_flag:
-                        coord.append(int(number))
-                        
-                        x_coords, y_coords = interpolate(STEP_SIZE, prev_coord, coord)
-                                                                
-                        for x, y in zip(x_coords, y_coords):                                
-                            x_plot = (x / max_hpgl * draw_width) + draw_zero_x
-                            y_plot = (y / max_hpgl * draw_height) + draw_zero_y
-
-                            thetas = NR.get_theta_values(x_plot, y_plot)
-        
-                            theta1_share.put(thetas[0])
-                            theta2_share.put(thetas[1])
+                            thetas = fixed_thetas(STEP_SIZE, prev_coord, coord)
 
-                            yield(0)
+                        # Iterate through the solved angles
+                        for theta1, theta2 in thetas:
 
-                        last_flag = False
+                            # Wait for room in the queue, then add the pair of stepper targets
+                            yield from setpoints.wait_room()
+                            setpoints.put(theta1_to_steps(theta1), theta2_to_steps(theta2))
 
-                    
-                    # Once instruction is done processing, reset buffer for next instruction
-                    buffer = ""
-                    instruction_flag = True
+                        # Copy the current coord to new variable at end of every iteration
+                        prev_coord = coord
                     
                     yield(0)
                     
-            # When HPGL file is finished, turn off LEDs
+            # Let the motors reach the last setpoints before finishing
+            while setpoints.any() or in_motion.get():
+                yield(0)
+
+            # When HPGL file is finished, turn off LEDs and wait for the button again
             PA4.value(False)
+            print(cotask.task_list.percentile_report())
+            start_btn.put(0)
+            active = False
                 
         yield(0)
 
+# Task 4 (alternative): Stream stepper targets from a compiled motion plan
+def plan_gen():
+    # Variable for a non-blocking timer
+    delay = utime.ticks_ms()
+
+    while True:
+
+        # Wait for button to start plotting
+        active = False
+        if start_btn.get():
+            active = True
+
+        while active:
+
+            # Open the motion plan
+            with open(PLAN_FILE, 'rb') as file:
+                reader = plan.PlanReader(file)
+                buf = reader.buf
+                view = memoryview(buf)
+
+                # Each chunk of records is read straight into the reader's buffer
+                for count in reader.chunks():
+                    idx = 0
+                    end = 2 * count
+                    while idx < end:
+
+                        # Carry out pen events once the motors reach every
+                        # queued setpoint and wait for them to complete
+                        if buf[idx] == plan.EVENT:
+                            while setpoints.any() or in_motion.get():
+                                yield(0)
+                            delay = pen_event(buf[idx + 1])
+                            while utime.ticks_diff(delay, utime.ticks_ms()) > 0:
+                                yield(0)
+                            PA1.value(False)
+                            idx += 2
+
+                        # Runs of moves are copied to the motor task in blocks,
+                        # as many as there is room for in the queue at a time
+                        else:
+                            run_end = idx + 2
+                            while run_end < end and buf[run_end] != plan.EVENT:
+                                run_end += 2
+                            while idx < run_end:
+                                idx += 2 * setpoints.put_many(view[idx:run_end])
+                                if idx < run_end:
+                                    yield(0)
+
+            # Let the motors reach the last setpoints before finishing
+            while setpoints.any() or in_motion.get():
+                yield(0)
+
+            # When the plan is finished, turn off LEDs and wait for the button again
+            PA4.value(False)
+            print(cotask.task_list.percentile_report())
+            start_btn.put(0)
+            active = False
+
+        yield(0)
+
 # Task 5: button input to start plotting
 def button():
     while True:
@@ -364,7 +378,15 @@ if __name__ == '__main__':
     # Initialize both stepper motor drivers
     stepper1 = TMC4210(V_MIN=50, V_MAX=300, A_MAX=1000, STEP_LENGTH=1.6, MOTOR=1)
     stepper2 = TMC4210(V_MIN=50, V_MAX=300, A_MAX=1000, STEP_LENGTH=1.6, MOTOR=2)
-    FULL_ROTATION = 390
+
+    # Plan the speed of the steppers a few setpoints ahead, in steps of motor 1
+    if lookahead_depth:
+        look_ahead = planner.LookaheadPlanner(stepper1.velocity_to_steps(stepper1.V_MAX),
+                                              stepper1.accel_to_steps(stepper1.A_MAX),
+                                              junction_deviation, lookahead_depth,
+                                              stepper1.velocity_to_steps(stepper1.V_MIN))
+    else:
+        look_ahead = None
 
     # Define pins and driver for DC motor
     pinB4 = Pin(Pin.cpu.B4)
@@ -373,8 +395,20 @@ if __name__ == '__main__':
     motor_encoder = encoder.Encoder()
     motor_encoder.zero()
 
-    # Create instance of Newton-Raphson
-    NR = theta_generator.ThetaGenerator()
+    # Create instance of the inverse kinematics, using the lookup table
+    # if one was uploaded and the closed-form solution otherwise
+    IK_TABLE = 'ik_table.bin'
+    try:
+        IK = theta_generator.TableThetaGenerator()
+        IK.load(IK_TABLE)
+    except OSError:
+        IK = theta_generator.AnalyticThetaGenerator()
+
+    # Interpolate lines adaptively, or in fixed steps if no tolerance is set
+    if interpolation_tolerance:
+        interpolator = interpolation.AdaptiveInterpolator(IK, interpolation_tolerance)
+    else:
+        interpolator = None
     
     # Define all other GPIO
     PA4 = Pin(Pin.cpu.A4, mode=Pin.OUT_PP, value=0)  # Configure Pin A4 as output for LEDs
@@ -384,44 +418,43 @@ if __name__ == '__main__':
     # Define all shares 
     start_btn = task_share.Share('f', thread_protect=False, name='Share 0')
     stop_btn = task_share.Share('f', thread_protect=False, name='Share 1')
-    theta1_share = task_share.Share('f', thread_protect=False, name='Share 2')
-    theta2_share = task_share.Share('f', thread_protect=False, name='Share 3')
     dc_share = task_share.Share('f', thread_protect=False, name='Share 4')
+    # Set while the steppers have setpoints left to reach
+    in_motion = task_share.Share('B', thread_protect=False, name='Share 5')
+
+    # Queue of stepper target pairs, filled ahead of the motors by theta_gen or
+    # plan_gen. Its type matches the plan buffer so runs of moves copy as blocks
+    setpoints = task_share.PairQueue('i', 32, thread_protect=False, name='Queue 0')
 
     start_btn.put(0)
 
     # Define all tasks
-    motor1_task = cotask.Task(motor1, name='Task 1', priority=1, period=5, profile=True, trace=False)
-    motor2_task = cotask.Task(motor2, name='Task 2', priority=1, period=5, profile=True, trace=False)
-    motor3_task = cotask.Task(motor3, name='Task 3', priority=1, period=5, profile=True, trace=False)
-    theta_task = cotask.Task(theta_gen, name='Task 4', priority=0, period=100, profile=True, trace=False)
+    steppers_task = cotask.Task(steppers, name='Task 1', priority=1, period=5, profile=True, trace=False)
+    motor3_task = cotask.Task(motor3, name='Task 3', priority=1, period=None, profile=True, trace=False)
+    dc_share.subscribe(motor3_task)
+
+    # Plot the compiled motion plan if one was uploaded, otherwise the HPGL file
+    HPGL_FILE = 'circle.hpgl'
+    PLAN_FILE = 'circle.plan'
+    try:
+        os.stat(PLAN_FILE)
+        theta_task = cotask.Task(plan_gen, name='Task 4', priority=0, period=100, profile=True, trace=False)
+    except OSError:
+        theta_task = cotask.Task(theta_gen, name='Task 4', priority=0, period=100, profile=True, trace=False)
+
     button_task = cotask.Task(button, name='Task 5', priority=1, period=5, profile=True, trace=False)
 
     # Append all tasks to cotask
     cotask.task_list.append(theta_task)
-    cotask.task_list.append(motor1_task)
-    cotask.task_list.append(motor2_task)
+    cotask.task_list.append(steppers_task)
     cotask.task_list.append(motor3_task)
     cotask.task_list.append(button_task)
     
     gc.collect ()
 
-    
-    # Value to represent the width of the drawing in inches
-    draw_width = 82 / 25.4                    
-    # Value to represent the height of the drawing in inches
-    draw_height = 80 / 25.4                
-
-    # Location fo the x-axis relative to the center of the linkage in inches
-    draw_zero_x = -6                
-    # Location fo the y-axis relative to the center of the linkage in inches
-    draw_zero_y = 4                 
-    
-    # Value for the largest value in the HPGL file used to scale the drawing
-    max_hpgl = 2039
 
     # Run cotask schedule
     while True:
-        cotask.task_list.pri_sched()
+        cotask.task_list.deadline_sched()
         
 
@@ -0,0 +1,55 @@
+'''!@file                   plan.py
+    @brief                  Reader for compiled motion plans
+    @details                A motion plan is an HPGL drawing compiled on the PC
+                            by tools/hpgl_compile.py into stepper targets, so
+                            the board only has to read them back. The file is
+                            an 8 byte header (the magic bytes and the number
+                            of records as a little endian int32) followed by
+                            records of two little endian int32 values. A move
+                            record holds the targets of stepper 1 and stepper
+                            2. An event record holds EVENT followed by an
+                            event code.
+    @date                   10/18/26
+'''
+
+import array
+
+
+# Magic bytes at the start of every plan file
+MAGIC = b'HPLN'
+
+# First value of an event record, outside the 24 bit range of the TMC4210
+EVENT = -0x80000000
+
+# Event codes stored in the second value of an event record
+INIT = 0
+PEN_UP = 1
+PEN_DOWN = 2
+
+
+class PlanReader:
+
+    def __init__(self, file, chunk_records=32):
+
+        # File object opened in binary mode ('rb')
+        self.file = file
+
+        # Buffer of records as [target1, target2, target1, target2, ...]
+        self.buf = array.array('i', range(2 * chunk_records))
+
+        # Read and check the header
+        header = bytearray(8)
+        if self.file.readinto(header) != 8 or header[0:4] != MAGIC:
+            raise ValueError('Not a motion plan file')
+
+        ## Number of records in the plan
+        self.count = header[4] | (header[5] << 8) | (header[6] << 16) | (header[7] << 24)
+
+    # Generator filling the buffer with the next records of the plan and
+    # yielding how many records were read each time
+    def chunks(self):
+        while True:
+            n_read = self.file.readinto(self.buf)
+            if not n_read:
+                break
+            yield n_read // 8
@@ -0,0 +1,165 @@
+'''!@file                   planner.py
+    @brief                  Look-ahead velocity planner for the stepper setpoints
+    @details                Buffers the next few stepper setpoints and works out
+                            how fast the motors can go on the way to each one.
+                            The speed through each corner is limited by its
+                            angle in joint space (junction deviation), and a
+                            backward pass over the buffered setpoints makes sure
+                            the motors can always slow down in time to stop at
+                            the last one. Each setpoint handed out comes with
+                            the top speed of its segment, for the drivers'
+                            V_MAX, and the distance from its end at which the
+                            next setpoint should be sent so the motors carry on
+                            through the corner instead of stopping. Speeds are
+                            in steps per second of the faster motor and
+                            distances in steps.
+    @date                   10/18/26
+'''
+
+import math
+import array
+
+
+class LookaheadPlanner():
+
+    def __init__(self, v_max, a_max, deviation=1.0, depth=8, v_min=0.0):
+
+        # Top speed in steps per second and acceleration in steps per second squared
+        self.v_max = v_max
+        self.a_max = a_max
+        # Largest distance in steps the path may cut a corner by at speed
+        self.deviation = deviation
+        # Lowest speed handed out, so a segment never gets a speed of zero
+        self.v_min = v_min
+        # Number of setpoints looked ahead at
+        self.depth = depth
+
+        # Ring buffer of setpoints as [target1, target2, target1, target2, ...]
+        self.points = array.array('i', [0] * (2 * depth))
+        self.head = 0
+        self.count = 0
+
+        # Length and speed limit at the start of each buffered segment, worked
+        # out again for each setpoint handed out
+        self.lengths = array.array('f', [0] * depth)
+        self.entry = array.array('f', [0] * depth)
+
+        # Top speed of the segment to the last setpoint handed out and distance
+        # from its end at which the next setpoint should be sent
+        self.segment_speed = v_min
+        self.lead = 0
+
+        self.stop(0, 0)
+
+    # Function to start again from rest at the given setpoint
+    def stop(self, target1, target2):
+        self.last1 = target1
+        self.last2 = target2
+        # Direction of the last segment as a unit vector, zero when at rest
+        self.dir1 = 0.0
+        self.dir2 = 0.0
+        # Planned speed at the last setpoint handed out
+        self.speed = 0.0
+
+    def any(self):
+        return self.count > 0
+
+    def full(self):
+        return self.count == self.depth
+
+    # Function to buffer the next setpoint
+    def add(self, target1, target2):
+        idx = 2 * ((self.head + self.count) % self.depth)
+        self.points[idx] = target1
+        self.points[idx + 1] = target2
+        self.count += 1
+
+    # Function to find the largest speed through the corner between a segment
+    # in direction (prev1, prev2) and one along (step1, step2) of length norm
+    def junction_speed(self, prev1, prev2, step1, step2, norm):
+        cos_theta = (prev1 * step1 + prev2 * step2) / norm
+
+        # Sine of half the angle between the two segments as drawn
+        sin_half = math.sqrt(max(0.0, 0.5 * (1.0 + cos_theta)))
+        if sin_half > 0.999:
+            return self.v_max
+        return min(self.v_max, math.sqrt(self.a_max * self.deviation * sin_half / (1.0 - sin_half)))
+
+    # Function to hand out the next setpoint into target, with its top speed in
+    # segment_speed and the distance at which to send the one after in lead
+    # Returns False if there is no setpoint buffered
+    def next(self, target):
+        count = self.count
+        if not count:
+            return False
+
+        points = self.points
+        lengths = self.lengths
+        entry = self.entry
+        depth = self.depth
+        a2 = 2 * self.a_max
+
+        # Forward pass: the length of each segment and the speed limit of the
+        # corner at its start
+        prev1 = self.dir1
+        prev2 = self.dir2
+        from1 = self.last1
+        from2 = self.last2
+        for k in range(count):
+            idx = 2 * ((self.head + k) % depth)
+            step1 = points[idx] - from1
+            step2 = points[idx + 1] - from2
+            from1 = points[idx]
+            from2 = points[idx + 1]
+
+            # Segments which go nowhere don't limit the speed
+            if not step1 and not step2:
+                lengths[k] = 0
+                entry[k] = self.v_max
+                continue
+
+            # Time is set by the motor which moves the furthest
+            lengths[k] = max(abs(step1), abs(step2))
+            norm = math.sqrt(step1 * step1 + step2 * step2)
+            if prev1 or prev2:
+                entry[k] = self.junction_speed(prev1, prev2, step1, step2, norm)
+            else:
+                entry[k] = 0.0
+            prev1 = step1 / norm
+            prev2 = step2 / norm
+
+        # Backward pass: the motors must be able to stop at the last buffered
+        # setpoint, since nothing is known past it yet
+        speed = 0.0
+        for k in range(count - 1, -1, -1):
+            speed = min(entry[k], math.sqrt(speed * speed + a2 * lengths[k]))
+            entry[k] = speed
+
+        # Speeds at both ends of the segment being handed out
+        v_in = min(self.speed, entry[0])
+        v_out = entry[1] if count > 1 else 0.0
+
+        # Highest speed which can be reached from v_in and still slowed down
+        # to v_out over the segment
+        peak = math.sqrt(0.5 * (a2 * lengths[0] + v_in * v_in + v_out * v_out))
+        self.segment_speed = max(self.v_min, min(self.v_max, peak))
+
+        # The drivers ramp down to stop at their target, passing v_out this far from it
+        self.lead = int(v_out * v_out / a2)
+
+        # Hand out the setpoint
+        idx = 2 * self.head
+        target[0] = points[idx]
+        target[1] = points[idx + 1]
+        step1 = target[0] - self.last1
+        step2 = target[1] - self.last2
+        if step1 or step2:
+            norm = math.sqrt(step1 * step1 + step2 * step2)
+            self.dir1 = step1 / norm
+            self.dir2 = step2 / norm
+        self.last1 = target[0]
+        self.last2 = target[1]
+        self.speed = v_out
+        self.head = (self.head + 1) % depth
+        self.count -= 1
+        return True
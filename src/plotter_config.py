@@ -0,0 +1,74 @@
+'''!@file                   plotter_config.py
+    @brief                  Geometry and calibration of the pen plotter
+    @details                Constants describing the drawing area and the
+                            stepper motors, and the conversions from HPGL
+                            units to linkage angles to stepper targets. Shared
+                            by the tasks on the board and the tools on the PC
+                            so both produce the same motor targets.
+    @author                 Ethan Nikcevich
+    @author                 Andrew Laurin
+    @author                 Rodrigo Gonzalez
+    @date                   6/02/22 Written as constants in main.py
+    @date                   10/18/26 Moved here to be shared with the tools
+'''
+
+import math
+
+
+# Value to represent the width of the drawing in inches
+draw_width = 82 / 25.4
+# Value to represent the height of the drawing in inches
+draw_height = 80 / 25.4
+
+# Location of the x-axis relative to the center of the linkage in inches
+draw_zero_x = -6
+# Location of the y-axis relative to the center of the linkage in inches
+draw_zero_y = 4
+
+# Value for the largest value in the HPGL file used to scale the drawing
+max_hpgl = 2039
+
+# Number of steps for one full rotation of the stepper motors
+FULL_ROTATION = 390
+
+# Distance in steps from their targets at which the steppers are sent their next
+# setpoint, so the drivers can start on it before coming to a stop. With 0 each
+# setpoint waits for both drivers to reach the last one, and with None a
+# setpoint is sent every period of the stepper task without checking. With the
+# look-ahead planner this is the least lead, and the planner lengthens it where
+# the corner ahead can be taken at speed, so 0 leaves sharp corners to it
+setpoint_lead = 0
+
+# Number of setpoints the stepper task looks ahead at to plan the speed of each
+# move, or 0 to move at the drivers' V_MAX all the time
+lookahead_depth = 8
+
+# Largest distance in steps the motors may cut a corner by without slowing down
+junction_deviation = 1.0
+
+# Slow the motor with less distance to go on each move so both motors arrive
+# together and the pen moves in a straight line between setpoints
+synchronize_axes = True
+
+# Largest distance in inches the pen may stray from a line between setpoints,
+# which are added only where needed, or None to add one every 10 HPGL units
+interpolation_tolerance = 0.01
+
+
+# Function to convert an HPGL x coordinate into inches from the linkage center
+def hpgl_to_x(x):
+    return (x / max_hpgl * draw_width) + draw_zero_x
+
+# Function to convert an HPGL y coordinate into inches from the linkage center
+def hpgl_to_y(y):
+    return (y / max_hpgl * draw_height) + draw_zero_y
+
+# Function to convert the bottom linkage angle into a target for stepper 1
+def theta1_to_steps(theta1):
+    steps1 = int(theta1*FULL_ROTATION/(2*math.pi))
+    return int((steps1+52.5)/1.5)
+
+# Function to convert the top linkage angle into a target for stepper 2
+def theta2_to_steps(theta2):
+    steps2 = int(theta2*FULL_ROTATION/(2*math.pi))
+    return int(steps2/-1.5)
@@ -23,9 +23,15 @@ SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 import array
 import gc
 import pyb
+import utime
 import micropython
 
 
+## The clock which timeouts are measured by, anything with the @c ticks_us()
+#  and @c ticks_diff() functions of @c utime. A simulation on a PC can replace
+#  it with a virtual clock, along with @c cotask.clock.
+clock = utime
+
 ## This is a system-wide list of all the queues and shared variables. It is
 #  used to create diagnostic printouts. 
 share_list = []
@@ -49,6 +55,60 @@ def show_all ():
     return '\n'.join (gen)
 
 
+@micropython.native
+def _copy (dest, dest_idx, source, source_idx, count):
+    """!
+    Copy a run of items from one buffer to another. Views of arrays whose
+    item format is known to be the same are copied with a single slice
+    assignment; anything else one item at a time, converting each item.
+    MicroPython's memoryviews don't tell their format, so there the items
+    are always copied one at a time, as a slice assignment between views of
+    the same item size would reinterpret the bits of each item.
+    @param dest The buffer to copy into
+    @param dest_idx The index in @c dest of the first item to be written
+    @param source The buffer to copy from
+    @param source_idx The index in @c source of the first item to be read
+    @param count The number of items to copy
+    """
+    if count <= 0:
+        return
+    dest_format = getattr (dest, 'format', None)
+    if (dest_format is not None and isinstance (dest, memoryview)
+            and isinstance (source, memoryview)
+            and dest_format == getattr (source, 'format', None)
+            and dest.itemsize == source.itemsize):
+        dest[dest_idx:dest_idx + count] = source[source_idx:source_idx + count]
+    else:
+        for idx in range (count):
+            dest[dest_idx + idx] = source[source_idx + idx]
+
+
+def _storage_code (fields):
+    """!
+    Choose the array type code in which records with the given fields are
+    stored. Records whose fields all have the same type are stored as that
+    type. Mixed integer records are stored as 32-bit signed integers, or as
+    64-bit integers if any field needs them; records mixing integers and
+    floats are stored as double-precision floats.
+    @param fields A string with the type code of each field of a record
+    @return The type code of the array used to store the records
+    """
+    if not fields:
+        raise ValueError ('A record needs at least one field')
+    for code in fields:
+        if code not in type_code_strings:
+            raise ValueError ('Unknown type code ' + code)
+    if fields.count (fields[0]) == len (fields):
+        return fields[0]
+    for code in fields:
+        if code in 'fd':
+            return 'd'
+    for code in fields:
+        if code in 'IlLqQ':
+            return 'q'
+    return 'l'
+
+
 # ============================================================================
 
 class BaseShare:
@@ -68,10 +128,46 @@ class BaseShare:
         self._type_code = type_code
         self._thread_protect = thread_protect
 
+        # Tasks which are told to run when data is written
+        self._subscribers = []
+
         # Add this queue to the global share and queue list
         share_list.append (self)
 
 
+    def subscribe (self, task):
+        """!
+        Make a task run whenever data is written into this queue or share.
+        Each write calls the task's @c go() method, including writes made in
+        an interrupt service routine, so a task which only has work to do
+        when new data arrives can be created with @c period=None instead of
+        checking for data on a timer:
+        @code
+        def consumer_fun ():
+            while True:
+                while my_queue.any ():
+                    do_something_with (my_queue.get ())
+                yield 0
+        consumer = cotask.Task (consumer_fun, name="Consumer", priority=1,
+                                period=None)
+        my_queue.subscribe (consumer)
+        @endcode
+        @param task The task (a @c cotask.Task or anything else with a
+               @c go() method) to be run when data arrives
+        """
+        self._subscribers.append (task)
+
+
+    @micropython.native
+    def _notify (self):
+        """!
+        Tell every subscribed task that data has arrived. Nothing is
+        allocated, so this may be called from an ISR.
+        """
+        for task in self._subscribers:
+            task.go ()
+
+
 # ============================================================================
 
 class Queue (BaseShare):
@@ -95,6 +191,9 @@ class Queue (BaseShare):
     ## A counter used to give serial numbers to queues for diagnostic use.
     ser_num = 0
 
+    ## The number of array elements in each item; more than one for records
+    _width = 1
+
     def __init__ (self, type_code, size, thread_protect = False, 
                   overwrite = False, name = None):
         """!
@@ -140,6 +239,9 @@ class Queue (BaseShare):
             self._buffer = None
             raise
 
+        # A view of the buffer through which runs of items are copied
+        self._view = memoryview (self._buffer)
+
         # Initialize pointers to be used for reading and writing data
         self.clear ()
 
@@ -157,7 +259,8 @@ class Queue (BaseShare):
         parameter was set to @c True to allow old data to be clobbered. If
         non-blocking behavior without overwriting is needed, one should call
         @c full() to ensure that the queue is not full before putting data
-        into it:
+        into it, or use @c try_put() or @c wait_room(), which don't stop the
+        scheduler while waiting:
         @code
         |   def some_task ():
         |       # Setup
@@ -199,6 +302,8 @@ class Queue (BaseShare):
         if self._thread_protect and not in_ISR:
             pyb.enable_irq (_irq_state)
 
+        self._notify ()
+
 
     @micropython.native
     def get (self, in_ISR = False):
@@ -207,7 +312,9 @@ class Queue (BaseShare):
         If there isn't anything in there, wait (blocking the calling process)
         until something becomes available. If non-blocking reads are needed,
         one should call @c any() to check for items before attempting to read
-        from the queue. This is usually done in a low priority task:
+        from the queue, or use @c try_get() or @c wait_data(), which don't stop
+        the scheduler while waiting. This is usually done in a low priority
+        task:
         @code
         |   def some_task ():
         |       # Setup
@@ -246,6 +353,288 @@ class Queue (BaseShare):
         return (to_return)
 
 
+    @micropython.native
+    def try_put (self, item, in_ISR = False):
+        """!
+        Put an item into the queue if there is room for it, without waiting.
+        If the queue is full, the item is only put in (clobbering the oldest
+        data) if the @c overwrite constructor parameter was set to @c True and
+        this method isn't called from an ISR.
+        @param item The item to be placed into the queue
+        @param in_ISR Set this to @c True if calling from within an ISR
+        @return @c True if the item was put into the queue, @c False if not
+        """
+        if self.full () and (in_ISR or not self._overwrite):
+            return False
+        self.put (item, in_ISR)
+        return True
+
+
+    @micropython.native
+    def try_get (self, default = None, in_ISR = False):
+        """!
+        Read an item from the queue if there is one, without waiting.
+        @param default The value returned if the queue is empty
+        @param in_ISR Set this to @c True if calling from within an ISR
+        @return The oldest item in the queue, or @c default if it's empty
+        """
+        if self.empty ():
+            return default
+        return self.get (in_ISR)
+
+
+    @micropython.native
+    def put_timeout (self, item, timeout_us):
+        """!
+        Put an item into the queue, waiting at most the given time for room.
+        This method blocks the calling process while it waits, so in a task
+        the timeout should be shorter than the time the other tasks can be
+        kept waiting; @c wait_room() waits without blocking them.
+        @param item The item to be placed into the queue
+        @param timeout_us The longest time to wait, in microseconds
+        @return @c True if the item was put into the queue, @c False if the
+                queue stayed full
+        """
+        if not self._overwrite:
+            self._spin (True, timeout_us)
+        return self.try_put (item)
+
+
+    @micropython.native
+    def get_timeout (self, timeout_us, default = None):
+        """!
+        Read an item from the queue, waiting at most the given time for one.
+        This method blocks the calling process while it waits; @c wait_data()
+        waits without blocking the other tasks.
+        @param timeout_us The longest time to wait, in microseconds
+        @param default The value returned if the queue stays empty
+        @return The oldest item in the queue, or @c default if it's empty
+        """
+        self._spin (False, timeout_us)
+        return self.try_get (default)
+
+
+    @micropython.native
+    def _spin (self, room, timeout_us):
+        """!
+        Wait until the queue has room or data or until the time runs out.
+        @param room @c True to wait for room, @c False to wait for data
+        @param timeout_us The longest time to wait, in microseconds
+        @return @c True if the queue is ready, @c False if the time ran out
+        """
+        start = clock.ticks_us ()
+        while self.full () if room else self.empty ():
+            if clock.ticks_diff (clock.ticks_us (), start) >= timeout_us:
+                return False
+        return True
+
+
+    def wait_room (self, timeout_us = None, state = 0):
+        """!
+        Wait for room in the queue, yielding to the scheduler while waiting.
+        This generator is used from within a task's generator with
+        @c yield @c from; each time the queue is found full it yields
+        @c state to the scheduler, which can then run the other tasks
+        (including the one which empties the queue), instead of spinning:
+        @code
+        |   def some_task ():
+        |       while True:
+        |           yield from my_queue.wait_room ()
+        |           my_queue.put (create_something_to_put ())
+        |           yield 0
+        @endcode
+        @param timeout_us The longest time to wait, in microseconds, or
+               @c None to wait as long as it takes
+        @param state The state yielded to the scheduler while waiting
+        @return @c True if there is room in the queue, @c False if the time
+                ran out first
+        """
+        start = clock.ticks_us ()
+        while self.full ():
+            if timeout_us is not None \
+                    and clock.ticks_diff (clock.ticks_us (), start) >= timeout_us:
+                return False
+            yield state
+        return True
+
+
+    def wait_data (self, timeout_us = None, state = 0):
+        """!
+        Wait for data in the queue, yielding to the scheduler while waiting.
+        This generator is used with @c yield @c from in the same way as
+        @c wait_room():
+        @code
+        |   def some_task ():
+        |       while True:
+        |           if (yield from my_queue.wait_data (10000)):
+        |               do_something_with (my_queue.get ())
+        |           yield 0
+        @endcode
+        @param timeout_us The longest time to wait, in microseconds, or
+               @c None to wait as long as it takes
+        @param state The state yielded to the scheduler while waiting
+        @return @c True if there is data in the queue, @c False if the time
+                ran out first
+        """
+        start = clock.ticks_us ()
+        while self.empty ():
+            if timeout_us is not None \
+                    and clock.ticks_diff (clock.ticks_us (), start) >= timeout_us:
+                return False
+            yield state
+        return True
+
+
+    @micropython.native
+    def put_many (self, items, in_ISR = False):
+        """!
+        Put a batch of items into the queue.
+        As many items as there is room for are copied into the queue, at most
+        two contiguous copies (before and after the end of the ring buffer)
+        with interrupts disabled only once for the whole batch. This method
+        never waits for room and never overwrites old data; it returns the
+        number of items which were put in, and the caller can try again later
+        with the rest. For a @c RecordQueue the items are whole records, given
+        as their fields one after the other, and the count is of records, so
+        the buffer is sliced by the record width:
+        @code
+        |   def some_task ():
+        |       # A PairQueue, whose records are two fields wide
+        |       done = 0
+        |       while 2 * done < len (batch):
+        |           done += my_queue.put_many (batch_view[2 * done:])
+        |           yield 0
+        @endcode
+        Items given as an @c array.array or @c memoryview with the queue's
+        type code are copied as blocks where the format of a view is known
+        (not on MicroPython); other items are copied one at a time.
+        @param items The items to be placed into the queue
+        @param in_ISR Set this to @c True if calling from within an ISR
+        @return The number of items (or records) put into the queue
+        """
+        try:
+            source = memoryview (items)
+        except TypeError:
+            source = items
+
+        # Prevent data corruption by blocking interrupts during data transfer
+        if self._thread_protect and not in_ISR:
+            irq_state = pyb.disable_irq ()
+
+        # Copy the run up to the end of the buffer, then the rest from the start
+        count = min (len (source), self._size - self._num_items)
+        count -= count % self._width
+        first = min (count, self._size - self._wr_idx)
+        _copy (self._view, self._wr_idx, source, 0, first)
+        _copy (self._view, 0, source, first, count - first)
+
+        # Advance the counts and pointers
+        self._wr_idx += count
+        if self._wr_idx >= self._size:
+            self._wr_idx -= self._size
+        self._num_items += count
+        if self._num_items > self._max_full:     # Record maximum fillage
+            self._max_full = self._num_items
+
+        # Re-enable interrupts
+        if self._thread_protect and not in_ISR:
+            pyb.enable_irq (irq_state)
+
+        if count:
+            self._notify ()
+        return count // self._width
+
+
+    @micropython.native
+    def get_many (self, buf, in_ISR = False):
+        """!
+        Read a batch of items from the queue into a buffer.
+        As many items as are in the queue and fit in the buffer are copied,
+        with interrupts disabled only once for the whole batch. This method
+        never waits for data. For a @c RecordQueue the fields of each record
+        are copied one after the other, and only whole records are copied.
+        @param buf A writable buffer, preferably an @c array.array with the
+               queue's type code so the items can be copied as blocks
+        @param in_ISR Set this to @c True if calling from within an ISR
+        @return The number of items (or records) copied into the buffer
+        """
+        try:
+            dest = memoryview (buf)
+        except TypeError:
+            dest = buf
+
+        # Prevent data corruption by blocking interrupts during data transfer
+        if self._thread_protect and not in_ISR:
+            irq_state = pyb.disable_irq ()
+
+        # Copy the run up to the end of the buffer, then the rest from the start
+        count = min (len (dest), self._num_items)
+        count -= count % self._width
+        first = min (count, self._size - self._rd_idx)
+        _copy (dest, 0, self._view, self._rd_idx, first)
+        _copy (dest, first, self._view, 0, count - first)
+        self._consume (count)
+
+        # Re-enable interrupts
+        if self._thread_protect and not in_ISR:
+            pyb.enable_irq (irq_state)
+
+        return count // self._width
+
+
+    @micropython.native
+    def peek_run (self):
+        """!
+        Look at the oldest items in the queue without copying them.
+        This method returns a @c memoryview of the longest run of items which
+        are stored contiguously, starting with the oldest one; if the data
+        wraps around the end of the ring buffer, the rest will be in the next
+        run. The items stay in the queue until @c consume() is called, so a
+        writer won't overwrite them (unless overwriting was enabled):
+        @code
+        |   while my_queue.any ():
+        |       run = my_queue.peek_run ()
+        |       for item in run:
+        |           print (item)
+        |       my_queue.consume (len (run))
+        @endcode
+        For a @c RecordQueue the view holds whole records, their fields one
+        after the other, so it holds @c len(run) divided by the record width
+        records, and that is the count to give @c consume().
+        @return A @c memoryview of the oldest contiguous items in the queue
+        """
+        return self._view[self._rd_idx:self._rd_idx 
+                          + min (self._num_items, self._size - self._rd_idx)]
+
+
+    @micropython.native
+    def consume (self, count, in_ISR = False):
+        """!
+        Remove items which have been looked at with @c peek_run().
+        @param count The number of items (or, for a @c RecordQueue, records)
+               to remove from the queue
+        @param in_ISR Set this to @c True if calling from within an ISR
+        """
+        if self._thread_protect and not in_ISR:
+            irq_state = pyb.disable_irq ()
+
+        self._consume (min (count * self._width, self._num_items))
+
+        if self._thread_protect and not in_ISR:
+            pyb.enable_irq (irq_state)
+
+
+    @micropython.native
+    def _consume (self, count):
+        """!
+        Move the read pointer past the given number of array elements.
+        """
+        self._rd_idx += count
+        if self._rd_idx >= self._size:
+            self._rd_idx -= self._size
+        self._num_items -= count
+
+
     @micropython.native
     def any (self):
         """!
@@ -310,6 +699,417 @@ class Queue (BaseShare):
                 type_code_strings[self._type_code], self._max_full, self._size))
 
 
+# ============================================================================
+
+class RecordQueue (Queue):
+    """!
+    A queue which carries fixed-width records from one task to another.
+    Each record is a group of fields, such as a time stamp and a reading,
+    which are written and read together so they can't drift apart the way
+    items in parallel queues can. All records are stored one after the other
+    in a single array which is allocated when the queue is created. The
+    format of a record is a string holding one type code per field, as for
+    @c Queue. If all fields have the same type code, the array uses that
+    type; otherwise it uses a type wide enough for every field (32 or 64 bit
+    integers, or double-precision floats if any field is a float).
+    @code
+    import array
+    import task_share
+    # This queue holds up to 100 records of an unsigned time and a signed value
+    samples = task_share.RecordQueue ('Hh', 100, name="Samples")
+    # In a task, put a record into the queue
+    samples.put (time, value)
+    # In an interrupt service routine, put a record held in a buffer which was
+    # allocated beforehand, as ISRs can't allocate memory
+    isr_record = array.array ('l', [0, 0])
+    samples.put_from (isr_record, in_ISR = True)
+    # In another task, read a record into a buffer without allocating memory
+    record = array.array ('l', [0, 0])
+    if samples.any ():
+        samples.get_into (record)
+    @endcode
+    """
+
+    def __init__ (self, fields, size, thread_protect = False, 
+                  overwrite = False, name = None):
+        """!
+        Initialize a queue object to carry and buffer records of data.
+        @param fields A string with the type code of each field of a record,
+               for example @c 'ff' or @c 'Hh'
+        @param size The maximum number of records which the queue can hold
+        @param thread_protect @c True if mutual exclusion protection is used
+        @param overwrite If @c True, oldest data will be overwritten with new
+               data if the queue becomes full 
+        @param name A short name for the queue, default @c QueueN where @c N
+               is a serial number for the queue
+        """
+        ## The number of fields in each record
+        self._width = len (fields)
+        self._fields = fields
+
+        # The buffer holds the fields of every record one after the other, so
+        # the underlying queue counts fields rather than records
+        super ().__init__ (_storage_code (fields), self._width * size,
+                           thread_protect, overwrite, name)
+
+
+    @micropython.native
+    def _wait_room (self, in_ISR):
+        """!
+        Make sure there is room for a record, waiting if the queue is full.
+        @param in_ISR Set this to @c True if calling from within an ISR
+        @return @c True if there is room (or old data may be overwritten) or
+                @c False if the record must be dropped
+        """
+        # If we're in an ISR and the queue is full and we're not allowed to
+        # overwrite data, we have to give up and exit
+        if self.full ():
+            if in_ISR:
+                return False
+
+            # Wait (if needed) until there's room in the buffer for the data
+            if not self._overwrite:
+                while self.full ():
+                    pass
+        return True
+
+
+    @micropython.native
+    def _advance_write (self):
+        """!
+        Advance the write pointer and the counts past the record just written.
+        """
+        self._wr_idx += self._width
+        if self._wr_idx >= self._size:
+            self._wr_idx = 0
+        self._num_items += self._width
+        if self._num_items >= self._size:        # Can't be fuller than full
+            self._num_items = self._size
+        if self._num_items > self._max_full:     # Record maximum fillage
+            self._max_full = self._num_items
+
+
+    @micropython.native
+    def _advance_read (self):
+        """!
+        Advance the read pointer and the counts past the record just read.
+        """
+        self._rd_idx += self._width
+        if self._rd_idx >= self._size:
+            self._rd_idx = 0
+        self._num_items -= self._width
+        if self._num_items < 0:
+            self._num_items = 0
+
+
+    def put (self, *fields, in_ISR = False):
+        """!
+        Put a record into the queue.
+        If there isn't room for the record, wait (blocking the calling process)
+        until room becomes available, unless the @c overwrite constructor
+        parameter was set to @c True to allow old data to be clobbered.
+        @b Note: Passing the fields as arguments allocates a tuple, so this 
+        method can't be used in an ISR; use @c put_from() there.
+        @param fields The fields of the record, one argument per field
+        @param in_ISR Set this to @c True if calling from within an ISR
+        """
+        if len (fields) != self._width:
+            raise ValueError ('Record needs {:d} fields'.format (self._width))
+        self.put_from (fields, in_ISR)
+
+
+    @micropython.native
+    def put_from (self, record, in_ISR = False):
+        """!
+        Put a record whose fields are held in a buffer into the queue.
+        The buffer can be any indexable object such as a list or an array;
+        using an array allocated beforehand makes this method safe to call
+        from an ISR.
+        @param record A buffer holding at least one item per field
+        @param in_ISR Set this to @c True if calling from within an ISR
+        """
+        if not self._wait_room (in_ISR):
+            return
+
+        # Prevent data corruption by blocking interrupts during data transfer
+        if self._thread_protect and not in_ISR:
+            _irq_state = pyb.disable_irq ()
+
+        # Write every field and advance the counts and pointers
+        wr_idx = self._wr_idx
+        for field in range (self._width):
+            self._buffer[wr_idx + field] = record[field]
+        self._advance_write ()
+
+        # Re-enable interrupts
+        if self._thread_protect and not in_ISR:
+            pyb.enable_irq (_irq_state)
+
+        self._notify ()
+
+
+    @micropython.native
+    def get_into (self, record, in_ISR = False):
+        """!
+        Read a record from the queue into a buffer.
+        If there isn't anything in there, wait (blocking the calling process)
+        until something becomes available. Nothing is allocated, so this
+        method may be used in an ISR or in code which must not trigger the
+        garbage collector.
+        @param record A writable buffer, such as an array, with room for at
+               least one item per field
+        @param in_ISR Set this to @c True if calling from within an ISR
+        @return The buffer which was passed in
+        """
+        # Wait until there's something in the queue to be returned
+        while self.empty ():
+            pass
+
+        # Prevent data corruption by blocking interrupts during data transfer
+        if self._thread_protect and not in_ISR:
+            irq_state = pyb.disable_irq ()
+
+        # Copy every field out of the queue and move the read pointer
+        rd_idx = self._rd_idx
+        for field in range (self._width):
+            record[field] = self._buffer[rd_idx + field]
+        self._advance_read ()
+
+        # Re-enable interrupts
+        if self._thread_protect and not in_ISR:
+            pyb.enable_irq (irq_state)
+
+        return record
+
+
+    def try_put (self, *fields, in_ISR = False):
+        """!
+        Put a record into the queue if there is room for it, without waiting.
+        @param fields The fields of the record, one argument per field
+        @param in_ISR Set this to @c True if calling from within an ISR
+        @return @c True if the record was put into the queue, @c False if not
+        """
+        if len (fields) != self._width:
+            raise ValueError ('Record needs {:d} fields'.format (self._width))
+        return self.try_put_from (fields, in_ISR)
+
+
+    @micropython.native
+    def try_put_from (self, record, in_ISR = False):
+        """!
+        Put a record held in a buffer into the queue if there is room for it,
+        without waiting.
+        @param record A buffer holding at least one item per field
+        @param in_ISR Set this to @c True if calling from within an ISR
+        @return @c True if the record was put into the queue, @c False if not
+        """
+        if self.full () and (in_ISR or not self._overwrite):
+            return False
+        self.put_from (record, in_ISR)
+        return True
+
+
+    @micropython.native
+    def try_get_into (self, record, in_ISR = False):
+        """!
+        Read a record from the queue into a buffer if there is one, without
+        waiting. Nothing is allocated.
+        @param record A writable buffer with room for at least one item per
+               field
+        @param in_ISR Set this to @c True if calling from within an ISR
+        @return @c True if a record was read, @c False if the queue is empty
+        """
+        if self.empty ():
+            return False
+        self.get_into (record, in_ISR)
+        return True
+
+
+    @micropython.native
+    def put_from_timeout (self, record, timeout_us):
+        """!
+        Put a record held in a buffer into the queue, waiting at most the
+        given time for room. This method blocks the calling process while it
+        waits; @c wait_room() waits without blocking the other tasks.
+        @param record A buffer holding at least one item per field
+        @param timeout_us The longest time to wait, in microseconds
+        @return @c True if the record was put into the queue, @c False if the
+                queue stayed full
+        """
+        if not self._overwrite:
+            self._spin (True, timeout_us)
+        return self.try_put_from (record)
+
+
+    @micropython.native
+    def get_into_timeout (self, record, timeout_us):
+        """!
+        Read a record from the queue into a buffer, waiting at most the given
+        time for one. Nothing is allocated. This method blocks the calling
+        process while it waits; @c wait_data() waits without blocking the
+        other tasks.
+        @param record A writable buffer with room for at least one item per
+               field
+        @param timeout_us The longest time to wait, in microseconds
+        @return @c True if a record was read, @c False if the queue stayed
+                empty
+        """
+        self._spin (False, timeout_us)
+        return self.try_get_into (record)
+
+
+    def get (self, in_ISR = False):
+        """!
+        Read a record from the queue.
+        If there isn't anything in there, wait (blocking the calling process)
+        until something becomes available. This method allocates the tuple
+        which it returns; use @c get_into() to avoid that.
+        @param in_ISR Set this to @c True if calling from within an ISR
+        @return A tuple holding the fields of the record
+        """
+        return tuple (self.get_into ([0] * self._width, in_ISR))
+
+
+    @micropython.native
+    def num_in (self):
+        """!
+        Check how many records are in the queue.
+        @return The number of records in the queue
+        """
+        return (self._num_items // self._width)
+
+
+    def __repr__ (self):
+        """!
+        This method puts diagnostic information about the queue into a string.
+        It shows the queue's name and the types of the fields of a record as
+        well as the maximum number of records and queue size in records. 
+        """
+        return ('{:<12s} RecordQueue<{:s}> Max Full {:d}/{:d}'.format (
+                self._name, 
+                ','.join (type_code_strings[code] for code in self._fields),
+                self._max_full // self._width, self._size // self._width))
+
+
+# ============================================================================
+
+class PairQueue (RecordQueue):
+    """!
+    A record queue which carries pairs of values from one task to another.
+    Both values of a pair are written and read together, so the reader always
+    gets two values which were put in by the same call. This is needed when
+    two quantities such as the targets of two motors must stay matched; two
+    separate queues or shares can drift apart when one is read and the other
+    is not. When the queue is full, the writer waits (or, in a cooperative
+    task, yields with @c wait_room()) until the reader has made room, so no
+    pairs are dropped or duplicated.
+    @code
+    import task_share
+    # This queue holds up to 32 pairs of signed 32-bit integers
+    targets = task_share.PairQueue ('l', 32, name="Targets")
+    # In the producing task, wait for room and put a pair into the queue
+    yield from targets.wait_room ()
+    targets.put (target_1, target_2)
+    # In the consuming task, read both values of a pair
+    if targets.any ():
+        target_1, target_2 = targets.get ()
+    @endcode
+    """
+
+    def __init__ (self, type_code, size, thread_protect = False, 
+                  overwrite = False, name = None):
+        """!
+        Initialize a queue object to carry and buffer pairs of data items.
+        The data type is chosen with a type code in the same way as for a
+        @c Queue; both values of each pair have that type. 
+        @param type_code The type of both data items in each pair
+        @param size The maximum number of pairs which the queue can hold
+        @param thread_protect @c True if mutual exclusion protection is used
+        @param overwrite If @c True, oldest data will be overwritten with new
+               data if the queue becomes full 
+        @param name A short name for the queue, default @c QueueN where @c N
+               is a serial number for the queue
+        """
+        super ().__init__ (type_code + type_code, size, thread_protect,
+                           overwrite, name)
+
+
+    @micropython.native
+    def put (self, first, second, in_ISR = False):
+        """!
+        Put a pair of items into the queue.
+        If there isn't room for the pair, wait (blocking the calling process)
+        until room becomes available, unless the @c overwrite constructor
+        parameter was set to @c True to allow old data to be clobbered. 
+        @param first The first item of the pair
+        @param second The second item of the pair
+        @param in_ISR Set this to @c True if calling from within an ISR
+        """
+        if not self._wait_room (in_ISR):
+            return
+
+        # Prevent data corruption by blocking interrupts during data transfer
+        if self._thread_protect and not in_ISR:
+            _irq_state = pyb.disable_irq ()
+
+        # Write both items and advance the counts and pointers
+        self._buffer[self._wr_idx] = first
+        self._buffer[self._wr_idx + 1] = second
+        self._advance_write ()
+
+        # Re-enable interrupts
+        if self._thread_protect and not in_ISR:
+            pyb.enable_irq (_irq_state)
+
+        self._notify ()
+
+
+    @micropython.native
+    def try_put (self, first, second, in_ISR = False):
+        """!
+        Put a pair of items into the queue if there is room, without waiting.
+        @param first The first item of the pair
+        @param second The second item of the pair
+        @param in_ISR Set this to @c True if calling from within an ISR
+        @return @c True if the pair was put into the queue, @c False if not
+        """
+        if self.full () and (in_ISR or not self._overwrite):
+            return False
+        self.put (first, second, in_ISR)
+        return True
+
+
+    @micropython.native
+    def get (self, in_ISR = False):
+        """!
+        Read a pair of items from the queue.
+        If there isn't anything in there, wait (blocking the calling process)
+        until something becomes available. If non-blocking reads are needed,
+        one should call @c any() to check for items before attempting to read
+        from the queue. Use @c get_into() to read without allocating a tuple.
+        @param in_ISR Set this to @c True if calling from within an ISR
+        @return A tuple holding the two items of the pair
+        """
+        # Wait until there's something in the queue to be returned
+        while self.empty ():
+            pass
+
+        # Prevent data corruption by blocking interrupts during data transfer
+        if self._thread_protect and not in_ISR:
+            irq_state = pyb.disable_irq ()
+
+        # Get both items to be returned from the queue and move the read pointer
+        first = self._buffer[self._rd_idx]
+        second = self._buffer[self._rd_idx + 1]
+        self._advance_read ()
+
+        # Re-enable interrupts
+        if self._thread_protect and not in_ISR:
+            pyb.enable_irq (irq_state)
+
+        return (first, second)
+
+
 # ============================================================================
 
 class Share (BaseShare):
@@ -389,6 +1189,8 @@ class Share (BaseShare):
         if self._thread_protect and not in_ISR:
             pyb.enable_irq (irq_state)
 
+        self._notify ()
+
 
     @micropython.native
     def get (self, in_ISR = False):
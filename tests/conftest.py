@@ -0,0 +1,25 @@
+'''!@file                   conftest.py
+    @brief                  Test setup shared by the host tests
+    @details                Puts the stand-ins for the MicroPython modules in
+                            sim/ ahead of the plotter's modules in src/, so
+                            the board's code can be imported and run with
+                            pytest on a PC.
+'''
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path[:0] = [os.path.join(ROOT, 'sim'), os.path.join(ROOT, 'src')]
+
+
+# Fixture giving each test a fresh virtual clock which only moves when it is
+# advanced, and an empty list of queues and shares
+@pytest.fixture
+def clock():
+    import utime
+    import task_share
+    del task_share.share_list[:]
+    return utime.reset(read_cost_us=0)
@@ -0,0 +1,110 @@
+'''!@file                   test_cotask.py
+    @brief                  Tests of the deadline scheduler in cotask
+    @details                Runs tasks on the virtual clock and checks the
+                            order the deadline scheduler runs them in, that
+                            tasks woken with wake_at() run once at their time,
+                            and that the scheduler only idles when no task is
+                            due.
+'''
+
+import pytest
+
+import utime
+import cotask
+
+
+# Function to make the body of a task which logs the time of each of its runs
+def logger(log, name):
+    def run():
+        while True:
+            log.append((utime.now(), name))
+            yield 0
+    return run
+
+
+# Function to make a task list whose idle function moves the clock on to the
+# next task's time, or by 1 ms if no task runs on a timer, and logs the waits
+def task_list(waits):
+    tasks = cotask.TaskList()
+
+    def idle(wait_us):
+        waits.append(wait_us)
+        utime.advance(wait_us if wait_us is not None else 1000)
+
+    tasks.idle = idle
+    return tasks
+
+
+# Function to run the scheduler until the clock reaches the given time
+def run_until(tasks, end_us):
+    while utime.now() < end_us:
+        tasks.deadline_sched()
+
+
+def test_timed_tasks_run_when_due(clock):
+    log = []
+    waits = []
+    tasks = task_list(waits)
+    tasks.append(cotask.Task(logger(log, 'fast'), 'fast', priority=1, period=1))
+    tasks.append(cotask.Task(logger(log, 'slow'), 'slow', priority=2, period=3))
+    run_until(tasks, 6000)
+
+    # When both are due, the one with the higher priority goes first
+    assert log == [(1000, 'fast'), (2000, 'fast'), (3000, 'slow'), (3000, 'fast'),
+                   (4000, 'fast'), (5000, 'fast')]
+    assert all(wait > 0 for wait in waits)
+
+
+@pytest.mark.parametrize('priority, first', [(1, 'early'), (2, 'late')])
+def test_due_tasks_by_priority_then_age(clock, priority, first):
+    log = []
+    tasks = task_list([])
+    tasks.append(cotask.Task(logger(log, 'early'), 'early', priority=1, period=1))
+    utime.advance(500)
+    tasks.append(cotask.Task(logger(log, 'late'), 'late', priority=priority, period=1))
+
+    # Both are overdue; of equal priorities the one due longest runs first
+    utime.advance(2000)
+    tasks.deadline_sched()
+    assert log == [(2500, first)]
+
+
+def test_timed_tasks_go_before_event_tasks(clock):
+    log = []
+    tasks = task_list([])
+    event = cotask.Task(logger(log, 'event'), 'event', priority=5)
+    tasks.append(event)
+    tasks.append(cotask.Task(logger(log, 'timed'), 'timed', priority=1, period=1))
+
+    utime.advance(1000)
+    event.go()
+    tasks.deadline_sched()
+    tasks.deadline_sched()
+    assert log == [(1000, 'timed'), (1000, 'event')]
+
+
+def test_wake_at_runs_once(clock):
+    log = []
+    waits = []
+    tasks = task_list(waits)
+    task = cotask.Task(logger(log, 'event'), 'event')
+    tasks.append(task)
+
+    run_until(tasks, 1000)
+    task.wake_at(utime.ticks_add(utime.ticks_us(), 5000))
+    run_until(tasks, 10000)
+    assert log == [(6000, 'event')]
+    assert waits[0] is None
+    assert all(wait is None or wait > 0 for wait in waits)
+
+    # Waking it again moves the wake-up
+    task.wake_at(utime.ticks_add(utime.ticks_us(), 3000))
+    task.wake_at(utime.ticks_add(utime.ticks_us(), 1000))
+    run_until(tasks, 15000)
+    assert log == [(6000, 'event'), (11000, 'event')]
+
+
+def test_wake_at_needs_an_event_task(clock):
+    task = cotask.Task(logger([], 'timed'), 'timed', period=1)
+    with pytest.raises(ValueError):
+        task.wake_at(0)
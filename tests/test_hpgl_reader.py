@@ -0,0 +1,71 @@
+'''!@file                   test_hpgl_reader.py
+    @brief                  Tests of the streaming HPGL tokenizer
+    @details                Checks that instructions come out the same no
+                            matter where the file's chunks end, that long
+                            instructions are split into continued records,
+                            and that decimal and negative coordinates are
+                            read correctly.
+'''
+
+import io
+
+import pytest
+
+import hpgl_reader
+
+
+# Function to read every record of an HPGL string, as (mnemonic, coordinates,
+# continued) tuples
+def read(text, **kwargs):
+    reader = hpgl_reader.HPGLReader(io.BytesIO(text), **kwargs)
+    return [(hpgl_reader.mnemonic(op), list(coords), reader.continued)
+            for op, coords in reader.records()]
+
+
+DRAWING = b'IN;SP1;PU1016,2032;PD1100,2032,1100,2200,1016,2200;PU;SP0;'
+
+
+def test_reads_instructions():
+    assert read(DRAWING) == [('IN', [], False),
+                             ('SP', [1], False),
+                             ('PU', [1016, 2032], False),
+                             ('PD', [1100, 2032, 1100, 2200, 1016, 2200], False),
+                             ('PU', [], False),
+                             ('SP', [0], False)]
+
+
+@pytest.mark.parametrize('chunk_size', range(1, 12))
+def test_chunk_boundaries_dont_matter(chunk_size):
+    assert read(DRAWING, chunk_size=chunk_size) == read(DRAWING)
+
+
+def test_long_instructions_are_continued():
+    coords = list(range(1, 11))
+    text = b'PD' + ','.join(str(c) for c in coords).encode() + b';PU;'
+    assert read(text, max_coords=4) == [('PD', [1, 2, 3, 4], False),
+                                        ('PD', [5, 6, 7, 8], True),
+                                        ('PD', [9, 10], True),
+                                        ('PU', [], False)]
+
+    # An odd buffer size is rounded up so xy pairs aren't split
+    assert [len(coords) for _, coords, _ in read(text, max_coords=3)] == [4, 4, 2, 0]
+
+
+def test_full_buffer_at_the_end_of_an_instruction():
+    assert read(b'PD1,2,3,4;PU;', max_coords=4) == [('PD', [1, 2, 3, 4], False),
+                                                   ('PU', [], False)]
+
+
+def test_decimals_are_rounded():
+    assert read(b'PU100.5,-20.4,7.49,3.,0.5,-2.5;') == [
+        ('PU', [101, -20, 7, 3, 1, -3], False)]
+
+
+def test_separators_and_case():
+    assert read(b'pd 1, -2 ;\nPU\n') == [('PD', [1, -2], False), ('PU', [], False)]
+
+
+def test_last_instruction_without_semicolon():
+    assert read(b'PU1,2;PD3,4') == [('PU', [1, 2], False), ('PD', [3, 4], False)]
+    assert read(b'PD1,2,3,4,5', max_coords=4) == [('PD', [1, 2, 3, 4], False),
+                                                  ('PD', [5], True)]
@@ -0,0 +1,94 @@
+'''!@file                   test_planner.py
+    @brief                  Tests of the look-ahead velocity planner
+    @details                Checks the speeds and leads the planner hands out
+                            for straight runs, corners and reversals, and that
+                            it shortens a drawing run in the simulator.
+'''
+
+import io
+import os
+import math
+import array
+import contextlib
+
+import pytest
+
+import planner
+
+
+# Top speed and acceleration of the steppers with V_MAX=300 and A_MAX=1000
+V_MAX = 44.7
+A_MAX = 710.5
+
+
+# Function to hand out every setpoint of a path, returning the segment speeds
+# and leads
+def plan_path(points, depth=8, deviation=1.0):
+    look_ahead = planner.LookaheadPlanner(V_MAX, A_MAX, deviation, depth, 7.45)
+    target = array.array('i', [0, 0])
+    speeds = []
+    leads = []
+    pending = list(points)
+    while pending or look_ahead.any():
+        while pending and not look_ahead.full():
+            look_ahead.add(*pending.pop(0))
+        look_ahead.next(target)
+        speeds.append(look_ahead.segment_speed)
+        leads.append(look_ahead.lead)
+    return speeds, leads
+
+
+def test_straight_run_keeps_moving():
+    speeds, leads = plan_path([(10 * k, 0) for k in range(1, 11)])
+    assert speeds[0] == pytest.approx(V_MAX)
+    assert all(lead > 0 for lead in leads[:-1])
+    assert leads[-1] == 0
+
+
+def test_reversal_stops():
+    speeds, leads = plan_path([(10, 0), (0, 0), (10, 0)])
+    assert leads[0] == 0
+    assert leads[1] == 0
+
+
+def test_corner_speed_depends_on_angle():
+    look_ahead = planner.LookaheadPlanner(V_MAX, A_MAX, 0.1, 8)
+    gentle = look_ahead.junction_speed(1.0, 0.0, 10.0, 1.0, math.hypot(10, 1))
+    sharp = look_ahead.junction_speed(1.0, 0.0, 1.0, 10.0, math.hypot(1, 10))
+    assert gentle > sharp
+    assert look_ahead.junction_speed(1.0, 0.0, -10.0, 0.0, 10.0) == 0
+
+
+def test_short_segments_start_and_stop_slowly():
+    speeds, leads = plan_path([(1, 0), (2, 0), (3, 0)], depth=3)
+    assert speeds[0] < V_MAX
+    assert speeds[-1] < V_MAX
+
+
+def test_sharp_corner_gets_a_shorter_lead():
+    _, gentle = plan_path([(20, 0), (40, 2)], deviation=0.1)
+    _, sharp = plan_path([(20, 0), (22, 20)], deviation=0.1)
+    assert sharp[0] < gentle[0]
+
+
+def test_planner_shortens_a_drawing(tmp_path, monkeypatch):
+    import run_plotter
+    import utime
+    import plotter_config
+
+    # A circle of 40 segments, drawn with the pen down after a pen up move
+    points = ['{:d},{:d}'.format(int(1000 + 800 * math.cos(2 * math.pi * k / 40)),
+                                 int(1000 + 800 * math.sin(2 * math.pi * k / 40)))
+              for k in range(41)]
+    drawing = tmp_path / 'circle.hpgl'
+    drawing.write_text('IN;SP1;PU' + points[0] + ';PD' + ','.join(points[1:]) + ';PU;SP0;')
+
+    times = []
+    for depth in (0, 8):
+        monkeypatch.setattr(plotter_config, 'setpoint_lead', 0)
+        monkeypatch.setattr(plotter_config, 'lookahead_depth', depth)
+        with contextlib.redirect_stdout(io.StringIO()):
+            run_plotter.run(str(drawing), None, 60, 0, {'Task 1': 150, 'Task 3': 20,
+                                                        'Task 4': 3000, 'Task 5': 10})
+        times.append(utime.now())
+    assert times[1] < 0.9 * times[0]
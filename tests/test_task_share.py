@@ -0,0 +1,144 @@
+'''!@file                   test_task_share.py
+    @brief                  Tests of the queues in task_share
+    @details                Checks that items and records come out of the ring
+                            buffer in order when it wraps around, that the
+                            batch methods count records rather than array
+                            elements, and that the timed methods give up once
+                            their time runs out.
+'''
+
+import array
+
+import task_share
+
+
+# Task stand-in counting the calls of its go() method
+class Waker:
+    def __init__(self):
+        self.calls = 0
+
+    def go(self):
+        self.calls += 1
+
+
+def test_queue_wraps_around(clock):
+    queue = task_share.Queue('i', 5)
+    for item in range(3):
+        queue.put(item)
+    assert [queue.get() for _ in range(3)] == [0, 1, 2]
+
+    # These run past the end of the buffer and back to its start
+    for item in range(10, 15):
+        queue.put(item)
+    assert queue.full()
+    assert [queue.get() for _ in range(5)] == [10, 11, 12, 13, 14]
+    assert queue.empty()
+
+
+def test_put_many_and_get_many_wrap_around(clock):
+    queue = task_share.Queue('i', 5)
+    for item in range(3):
+        queue.put(item)
+    for _ in range(3):
+        queue.get()
+
+    # Only as many items as there is room for go in
+    assert queue.put_many(array.array('i', range(7))) == 5
+    assert queue.put_many([99]) == 0
+
+    buf = array.array('i', [0] * 8)
+    assert queue.get_many(buf) == 5
+    assert list(buf[:5]) == [0, 1, 2, 3, 4]
+    assert queue.get_many(buf) == 0
+
+
+def test_record_batches_count_records(clock):
+    queue = task_share.RecordQueue('ii', 3)
+
+    # A partial record at the end of a batch is left out
+    assert queue.put_many([1, 2, 3, 4, 5]) == 2
+    assert queue.num_in() == 2
+
+    # Only whole records fit in the buffer
+    buf = array.array('i', [0] * 3)
+    assert queue.get_many(buf) == 1
+    assert list(buf[:2]) == [1, 2]
+    assert queue.get() == (3, 4)
+
+
+def test_peek_run_and_consume_records(clock):
+    queue = task_share.RecordQueue('ii', 3)
+    queue.put(1, 2)
+    queue.put(3, 4)
+    queue.get()
+    queue.put(5, 6)
+    queue.put(7, 8)
+
+    # The run stops at the end of the buffer, and the last record wraps around
+    run = queue.peek_run()
+    assert list(run) == [3, 4, 5, 6]
+    queue.consume(len(run) // 2)
+    assert queue.num_in() == 1
+    assert list(queue.peek_run()) == [7, 8]
+    queue.consume(1)
+    assert queue.empty()
+
+
+def test_pair_queue_batches(clock):
+    queue = task_share.PairQueue('f', 4)
+    assert queue.put_many(array.array('f', [1.5, -1.5, 2.5, -2.5])) == 2
+    assert queue.get() == (1.5, -1.5)
+    assert queue.get() == (2.5, -2.5)
+
+
+def test_batches_convert_other_formats(clock):
+    # Integers of the same size as the queue's floats are converted, not
+    # copied bit for bit
+    queue = task_share.Queue('f', 4)
+    assert queue.put_many(array.array('i', [1, 2])) == 2
+    assert queue.get() == 1.0
+
+    buf = array.array('d', [0.0])
+    assert queue.get_many(buf) == 1
+    assert buf[0] == 2.0
+
+
+def test_timeouts_give_up(clock):
+    clock.read_cost_us = 1
+    queue = task_share.RecordQueue('hh', 1)
+    record = array.array('h', [3, 4])
+
+    assert queue.put_from_timeout(record, 100)
+    start = clock.now()
+    assert not queue.put_from_timeout(array.array('h', [5, 6]), 100)
+    assert clock.now() - start >= 100
+
+    out = array.array('h', [0, 0])
+    assert queue.get_into_timeout(out, 100)
+    assert list(out) == [3, 4]
+    start = clock.now()
+    assert not queue.get_into_timeout(out, 100)
+    assert clock.now() - start >= 100
+
+    # Queues of single items keep their own timed methods
+    items = task_share.Queue('h', 1)
+    assert items.put_timeout(7, 100)
+    assert not items.put_timeout(8, 100)
+    assert items.get_timeout(100) == 7
+    assert items.get_timeout(100, default=-1) == -1
+
+
+def test_writes_wake_subscribers(clock):
+    queue = task_share.RecordQueue('ii', 4)
+    waker = Waker()
+    queue.subscribe(waker)
+
+    queue.put(1, 2)
+    assert waker.calls == 1
+
+    # A batch wakes the task once, and an empty one not at all
+    queue.put_many([3, 4, 5, 6])
+    assert waker.calls == 2
+    queue.get_many(array.array('i', [0] * 8))
+    queue.put_many([])
+    assert waker.calls == 2
@@ -0,0 +1,91 @@
+'''!@file                   test_tmc4210.py
+    @brief                  Tests of the synchronized moves of the steppers
+    @details                Drives two models of the TMC4210 over the stand-in
+                            SPI bus and checks that move_both() scales the
+                            speeds and acceleration of the motor with less
+                            distance to go, so both motors arrive together,
+                            and that a motor which has to turn around keeps
+                            its full parameters.
+'''
+
+import pytest
+
+import pyb
+import utime
+import devices
+from TMC4210_Class import TMC4210, move_both, scaled
+
+
+V_MIN = 50
+V_MAX = 300
+A_MAX = 1000
+
+
+# Fixture giving two driven steppers and the models of their controllers
+@pytest.fixture
+def steppers(clock):
+    pyb.reset()
+    models = (devices.TMC4210Model(), devices.TMC4210Model())
+    pyb.SPI.attach(2, 'C2', models[0])
+    pyb.SPI.attach(2, 'C3', models[1])
+    drivers = tuple(TMC4210(V_MIN=V_MIN, V_MAX=V_MAX, A_MAX=A_MAX, STEP_LENGTH=1.6, MOTOR=motor)
+                    for motor in (1, 2))
+    return drivers, models
+
+
+# Function to move the clock on until both models reach their targets,
+# returning the time each one got there in microseconds
+def arrivals(models, limit_us=30000000):
+    start = utime.now()
+    times = [None, None]
+    while None in times:
+        utime.advance(1000)
+        assert utime.now() - start < limit_us
+        for idx, model in enumerate(models):
+            if times[idx] is None and model.position() == model.target():
+                times[idx] = utime.now() - start
+    return times
+
+
+def test_shorter_move_is_scaled(steppers):
+    (stepper1, stepper2), (model1, model2) = steppers
+    move_both(stepper1, stepper2, 4000, 1000)
+
+    # The longer move keeps the full parameters
+    assert model1.registers[devices.V_MAX] == V_MAX
+    assert model1.registers[devices.V_MIN] == V_MIN
+    assert model1.registers[devices.A_MAX] == A_MAX
+
+    # The shorter one has all three scaled by the ratio of the distances
+    assert model2.registers[devices.V_MAX] == scaled(V_MAX, 1000, 4000) == 75
+    assert model2.registers[devices.V_MIN] == scaled(V_MIN, 1000, 4000) == 13
+    assert model2.registers[devices.A_MAX] == scaled(A_MAX, 1000, 4000) == 250
+
+
+def test_both_motors_arrive_together(steppers):
+    (stepper1, stepper2), models = steppers
+    move_both(stepper1, stepper2, 60, -180)
+    first, second = arrivals(models)
+    assert first == pytest.approx(second, rel=0.02)
+
+
+def test_scaling_never_stops_a_motor(steppers):
+    (stepper1, stepper2), (model1, model2) = steppers
+    move_both(stepper1, stepper2, 100000, 1)
+    assert model2.registers[devices.V_MAX] >= 1
+    assert model2.registers[devices.A_MAX] >= 1
+
+
+def test_turning_motor_keeps_full_parameters(steppers):
+    (stepper1, stepper2), (model1, model2) = steppers
+    move_both(stepper1, stepper2, 200, 200)
+    utime.advance(1000000)
+    assert 0 < model1.position() < 200
+
+    # The first motor has to turn around to go back a little way, while the
+    # second carries on a long way
+    move_both(stepper1, stepper2, stepper1.position - 10, 400)
+    assert model1.registers[devices.V_MAX] == V_MAX
+    assert model1.registers[devices.V_MIN] == V_MIN
+    assert model1.registers[devices.A_MAX] == A_MAX
+    arrivals((model1, model2))
@@ -0,0 +1,143 @@
+'''!@file                   bench_hpgl_reader.py
+    @brief                  Benchmark of the HPGL tokenizer
+    @details                Compares the chunked tokenizer in hpgl_reader.py
+                            against the character by character loop that
+                            theta_gen used to run. Reports bytes per second
+                            and memory allocated per instruction. Runs on the
+                            PC with CPython or on the board with MicroPython.
+                            Usage: python bench_hpgl_reader.py [file.hpgl]
+    @date                   10/18/26
+'''
+
+import sys
+import gc
+
+try:
+    import os
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+except (ImportError, AttributeError):
+    pass
+
+try:
+    from time import perf_counter
+    def now():
+        return perf_counter()
+except ImportError:
+    import utime
+    def now():
+        return utime.ticks_us() / 1000000
+
+import hpgl_reader
+
+
+# Function to write a synthetic drawing made of many short PD polylines
+def make_test_file(filename, instructions=2000, points=8):
+    with open(filename, 'w') as file:
+        file.write('IN;SP1;')
+        for i in range(instructions):
+            x = (i * 37) % 2000
+            y = (i * 53) % 2000
+            file.write('PU{:d},{:d};PD'.format(x, y))
+            file.write(','.join('{:d},{:d}'.format(x + 10 * j, y + 7 * j) for j in range(points)))
+            file.write(';')
+        file.write('SP0;PU0,0;IN;')
+
+
+# The loop theta_gen used before the tokenizer, reduced to parsing only
+def legacy_parse(filename):
+    instructions = 0
+    total = 0
+    processing = True
+    buffer = ""
+    with open(filename, 'r') as file:
+        while processing:
+            instruction_flag = True
+            while instruction_flag:
+                char = file.read(1)
+                if char == "":
+                    processing = False
+                    instruction_flag = False
+                elif char == ";":
+                    instruction_flag = False
+                else:
+                    buffer += char
+            buffer = buffer.strip()
+            if buffer[0:2] in ("IN", "PU", "PD", "SP"):
+                buffer = buffer[2:]
+            coord = []
+            number = ""
+            for letter in buffer:
+                if letter == ',':
+                    coord.append(int(number))
+                    number = ""
+                else:
+                    number += letter
+            if number:
+                coord.append(int(number))
+            total += sum(coord)
+            instructions += 1
+            buffer = ""
+    return instructions, total
+
+
+# The chunked tokenizer
+def reader_parse(filename):
+    instructions = 0
+    total = 0
+    with open(filename, 'rb') as file:
+        reader = hpgl_reader.HPGLReader(file)
+        for op, coords in reader.records():
+            for value in coords:
+                total += value
+            if not reader.continued:
+                instructions += 1
+    return instructions, total
+
+
+# Function to time one parser and measure the memory it allocates
+def run(name, parse, filename, size):
+    gc.collect()
+
+    # MicroPython can count every byte allocated while the GC is held off
+    if hasattr(gc, 'mem_alloc'):
+        gc.disable()
+        before = gc.mem_alloc()
+        start = now()
+        instructions, total = parse(filename)
+        elapsed = now() - start
+        allocated = gc.mem_alloc() - before
+        gc.enable()
+        label = 'bytes allocated/instr'
+
+    # CPython only exposes the peak of live allocations
+    else:
+        import tracemalloc
+        start = now()
+        instructions, total = parse(filename)
+        elapsed = now() - start
+        tracemalloc.start()
+        parse(filename)
+        allocated = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        label = 'peak traced bytes/instr'
+
+    print('{:<10s} {:6d} instr {:12.0f} bytes/s {:10.1f} {:s}   (checksum {:d})'.format(
+        name, instructions, size / elapsed, allocated / instructions, label, total))
+
+
+def main():
+    if len(sys.argv) > 1:
+        filename = sys.argv[1]
+    else:
+        filename = 'bench.hpgl'
+        make_test_file(filename)
+
+    with open(filename, 'rb') as file:
+        size = len(file.read())
+
+    run('legacy', legacy_parse, filename, size)
+    run('chunked', reader_parse, filename, size)
+
+
+if __name__ == '__main__':
+    main()
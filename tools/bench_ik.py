@@ -0,0 +1,88 @@
+'''!@file                   bench_ik.py
+    @brief                  Equivalence check and benchmark of the IK solvers
+    @details                Solves a grid of points covering the drawing area
+                            with the Newton-Raphson solver and the closed-form
+                            solver, checks that both reach the same pose and
+                            reports the time per point of each, one point at a
+                            time and batched. Runs on the PC with CPython and
+                            NumPy.
+                            Usage: python bench_ik.py [points per side]
+    @date                   10/18/26
+'''
+
+import os
+import sys
+import math
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import plotter_config
+from ThetaGenerator import ThetaGenerator, AnalyticThetaGenerator
+
+
+# Function to compute the pen position of a pair of angles
+def forward(solver, theta1, theta2):
+    x = solver.l1 * math.cos(theta1) + solver.l3 * math.cos(theta2 + math.pi)
+    y = solver.l1 * math.sin(theta1) + solver.l3 * math.sin(theta2 + math.pi)
+    return x, y
+
+
+# Newton-Raphson solver run to a tight threshold, used as the reference
+class ReferenceThetaGenerator(ThetaGenerator):
+    def get_theta_values(self, x_coord, y_coord):
+        x_des = np.asarray([x_coord, y_coord])
+        theta = self.NewtonRaphson(lambda theta: self.g(x_des, theta), self.dg_dtheta,
+                                   np.asarray([math.pi/2, 0]), 1e-9)
+        return theta[0], theta[1]
+
+
+# Function to solve every point with a solver, returning the angles and time per point
+def solve_all(solver, points):
+    start = time.perf_counter()
+    thetas = [solver.get_theta_values(x, y) for x, y in points]
+    return thetas, (time.perf_counter() - start) / len(points)
+
+
+def main():
+    side = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    points = [(plotter_config.hpgl_to_x(x), plotter_config.hpgl_to_y(y))
+              for x in np.linspace(0, plotter_config.max_hpgl, side)
+              for y in np.linspace(0, plotter_config.max_hpgl, side)]
+
+    reference, _ = solve_all(ReferenceThetaGenerator(), points)
+    print('{:<18s}{:>14s}{:>16s}{:>16s}'.format('solver', 'us/point', 'max pos err in', 'max dtheta rad'))
+
+    for name, solver in (('newton (thresh 1e-4)', ThetaGenerator()),
+                         ('newton warm 1e-6', ThetaGenerator(warm_start=True, thresh=1e-6)),
+                         ('analytic', AnalyticThetaGenerator())):
+        thetas, per_point = solve_all(solver, points)
+        pos_err = max(math.hypot(fx - x, fy - y)
+                      for (x, y), (fx, fy) in zip(points, (forward(solver, *t) for t in thetas)))
+        theta_err = max(max(abs(t[0] - r[0]), abs(t[1] - r[1])) for t, r in zip(thetas, reference))
+        print('{:<18s}{:14.2f}{:16.2e}{:16.2e}'.format(name, per_point * 1e6, pos_err, theta_err))
+
+        # Same stepper targets as the reference everywhere except at rounding edges
+        mismatched = sum(1 for t, r in zip(thetas, reference)
+                         if plotter_config.theta1_to_steps(t[0]) != plotter_config.theta1_to_steps(r[0])
+                         or plotter_config.theta2_to_steps(t[1]) != plotter_config.theta2_to_steps(r[1]))
+        print('{:<18s}{:d}/{:d} points with stepper targets different from the reference'.format(
+            '', mismatched, len(points)))
+        if not isinstance(solver, AnalyticThetaGenerator):
+            print(solver.stats)
+
+    # Whole grid solved in one call with the batched solvers
+    x_coords = np.array([x for x, y in points])
+    y_coords = np.array([y for x, y in points])
+    for name, solver in (('newton batch 1e-6', ThetaGenerator(thresh=1e-6)),
+                         ('analytic batch', AnalyticThetaGenerator())):
+        start = time.perf_counter()
+        theta1, theta2 = solver.get_theta_arrays(x_coords, y_coords)
+        per_point = (time.perf_counter() - start) / len(points)
+        theta_err = max(max(abs(t1 - r[0]), abs(t2 - r[1])) for t1, t2, r in zip(theta1, theta2, reference))
+        print('{:<18s}{:14.2f}{:>16s}{:16.2e}'.format(name, per_point * 1e6, '-', theta_err))
+
+
+if __name__ == '__main__':
+    main()
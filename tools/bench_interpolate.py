@@ -0,0 +1,131 @@
+'''!@file                   bench_interpolate.py
+    @brief                  Benchmark of the fixed step interpolation
+    @details                Compares the streaming integer interpolator dda()
+                            in interpolation.py against the list based
+                            interpolate() that main.py used to run, on lines
+                            of increasing length. Reports points per second
+                            and the memory taken while interpolating one line.
+                            Runs on the PC with CPython and NumPy or on the
+                            board with MicroPython and ulab.
+                            Usage: python bench_interpolate.py [step_size]
+    @date                   10/18/26
+'''
+
+import sys
+import gc
+
+try:
+    import os
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+except (ImportError, AttributeError):
+    pass
+
+try:
+    from time import perf_counter
+    def now():
+        return perf_counter()
+except ImportError:
+    import utime
+    def now():
+        return utime.ticks_us() / 1000000
+
+try:
+    from ulab import numpy as np
+except ImportError:
+    import numpy as np
+
+import interpolation
+
+
+# Lengths in HPGL units of the lines interpolated, up to the diagonal of the drawing
+LENGTHS = (100, 500, 1000, 2000, 2880)
+
+
+# The function main.py used before dda(), building the whole line as lists
+def legacy_interpolate(STEP_SIZE, prev_coord, coord):
+    x_coords = []
+    y_coords = []
+    x_coords.append(prev_coord[0])
+    y_coords.append(prev_coord[1])
+    x = coord[0]
+    y = coord[1]
+    x_prev = prev_coord[0]
+    y_prev = prev_coord[1]
+    steps = max(abs(x - x_prev), abs(y - y_prev))//STEP_SIZE
+    if steps:
+        try:
+            x_vals = np.linspace(x_prev, x, steps)
+            x_new = [int(x) for x in x_vals]
+            for x_ in x_new:
+                x_coords.append(x_)
+            y_vals = np.linspace(y_prev, y, steps)
+            y_new = [int(x) for x in y_vals]
+            for y_ in y_new:
+                y_coords.append(y_)
+        except ValueError:
+            return x_coords, y_coords
+    return x_coords, y_coords
+
+
+# Function to use every point of the legacy interpolation, returning how many
+def legacy_points(step_size, prev_coord, coord):
+    x_coords, y_coords = legacy_interpolate(step_size, prev_coord, coord)
+    count = 0
+    for x, y in zip(x_coords, y_coords):
+        count += 1
+    return count
+
+
+# Function to use every point of the streaming interpolation, returning how many
+def dda_points(step_size, prev_coord, coord):
+    count = 0
+    for x, y in interpolation.dda(step_size, prev_coord, coord):
+        count += 1
+    return count
+
+
+# Function to time one interpolator on a line and measure the memory it takes
+def run(name, points, step_size, length, repeats):
+    prev_coord = (0, 0)
+    coord = (length * 707 // 1000, length * 707 // 1000)
+    gc.collect()
+
+    start = now()
+    for _ in range(repeats):
+        count = points(step_size, prev_coord, coord)
+    elapsed = now() - start
+
+    # MicroPython can count every byte allocated while the GC is held off
+    if hasattr(gc, 'mem_alloc'):
+        gc.collect()
+        gc.disable()
+        before = gc.mem_alloc()
+        points(step_size, prev_coord, coord)
+        memory = gc.mem_alloc() - before
+        gc.enable()
+        label = 'bytes allocated'
+
+    # CPython only exposes the peak of live allocations
+    else:
+        import tracemalloc
+        tracemalloc.start()
+        points(step_size, prev_coord, coord)
+        memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        label = 'peak traced bytes'
+
+    print('{:<8s} {:6d} units {:6d} points {:12.0f} points/s {:10d} {:s}'.format(
+        name, length, count, count * repeats / elapsed, memory, label))
+
+
+def main():
+    step_size = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+    for length in LENGTHS:
+        repeats = max(1, 20000 // length)
+        run('legacy', legacy_points, step_size, length, repeats)
+        run('dda', dda_points, step_size, length, repeats)
+
+
+if __name__ == '__main__':
+    main()
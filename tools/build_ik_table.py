@@ -0,0 +1,48 @@
+'''!@file                   build_ik_table.py
+    @brief                  Builds the inverse kinematics lookup table
+    @details                Solves a grid of points over the drawing area in
+                            plotter_config.py and writes it in the format read
+                            by TableThetaGenerator.load(). Upload the output
+                            next to main.py as ik_table.bin to have theta_gen
+                            use it. Also prints the error and size of a range
+                            of grid resolutions to help choose one.
+                            Usage: python build_ik_table.py [-n 33] [ik_table.bin]
+    @date                   10/18/26
+'''
+
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import plotter_config
+from ThetaGenerator import TableThetaGenerator
+
+
+# Function to build a table of n by n points over the drawing area
+def build(n):
+    table = TableThetaGenerator(plotter_config.draw_zero_x, plotter_config.draw_zero_y,
+                                plotter_config.draw_width, plotter_config.draw_height, n, n)
+    table.build()
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the inverse kinematics lookup table')
+    parser.add_argument('output', nargs='?', default='ik_table.bin', help='table file to write')
+    parser.add_argument('-n', type=int, default=33, help='grid points per side (default 33)')
+    args = parser.parse_args()
+
+    print('{:>6s}{:>10s}{:>16s}{:>16s}'.format('grid', 'bytes', 'max dtheta rad', 'max pos err in'))
+    for n in sorted({5, 9, 17, 33, 65, args.n}):
+        max_theta, max_pos = build(n).error_report()
+        print('{:>6s}{:10d}{:16.2e}{:16.2e}'.format('{:d}x{:d}'.format(n, n), 8 * n * n,
+                                                      max_theta, max_pos))
+
+    build(args.n).save(args.output)
+    print('Wrote {:s}'.format(args.output))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+'''!@file                   hpgl_compile.py
+    @brief                  Compiles an HPGL file into a motion plan
+    @details                Runs on the PC with CPython and NumPy. Does the
+                            same work as the theta_gen task (parsing,
+                            interpolation, inverse kinematics and conversion
+                            to stepper targets) ahead of time and writes the
+                            result in the binary format read by plan.py, so
+                            the board only has to stream the targets to the
+                            motors. Upload the output next to main.py as
+                            circle.plan to have it plotted instead of the
+                            HPGL file.
+                            Usage: python hpgl_compile.py input.hpgl output.plan
+    @date                   10/18/26
+'''
+
+import os
+import sys
+import argparse
+import struct
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import hpgl_reader
+import plan
+import plotter_config
+from ThetaGenerator import ThetaGenerator, AnalyticThetaGenerator
+from interpolation import AdaptiveInterpolator, dda
+
+
+# Events produced by each HPGL command
+EVENTS = {hpgl_reader.IN: plan.INIT,
+          hpgl_reader.PU: plan.PEN_UP,
+          hpgl_reader.PD: plan.PEN_DOWN}
+
+
+# Function to interpolate between two points, giving the same points as
+# fixed_thetas() in main.py
+def interpolate(step_size, prev_coord, coord):
+    points = np.array(list(dda(step_size, prev_coord, coord)))
+    return points[:, 0], points[:, 1]
+
+
+# Function to convert HPGL points into stepper targets, as an (N, 2) int32 array
+# Uses the same formulas as theta1_to_steps() and theta2_to_steps() in
+# plotter_config.py, on whole arrays
+def to_steps(solver, x_coords, y_coords):
+    theta1, theta2 = solver.get_theta_arrays(plotter_config.hpgl_to_x(x_coords),
+                                             plotter_config.hpgl_to_y(y_coords))
+    return thetas_to_steps(theta1, theta2)
+
+
+# Function to convert arrays of linkage angles into stepper targets
+def thetas_to_steps(theta1, theta2):
+    steps = np.empty((len(theta1), 2), dtype=np.int32)
+    steps[:, 0] = np.trunc((np.trunc(theta1 * plotter_config.FULL_ROTATION / (2 * np.pi)) + 52.5) / 1.5)
+    steps[:, 1] = np.trunc(np.trunc(theta2 * plotter_config.FULL_ROTATION / (2 * np.pi)) / -1.5)
+    return steps
+
+
+# Function to compile an HPGL file into a list of (N, 2) int32 record arrays
+# With a tolerance in inches (by default the board's interpolation_tolerance),
+# lines are split adaptively as by the theta_gen task. With None they are
+# split every step_size HPGL units instead
+def compile_hpgl(filename, step_size=10, solver=None,
+                 tolerance=plotter_config.interpolation_tolerance):
+    if solver is None:
+        solver = AnalyticThetaGenerator()
+    interpolator = AdaptiveInterpolator(solver, tolerance) if tolerance else None
+
+    records = []
+    prev_coord = None
+    with open(filename, 'rb') as file:
+        reader = hpgl_reader.HPGLReader(file)
+        for op, coords in reader.records():
+
+            # Pen commands become event records, other commands are skipped
+            # along with the rest of their coordinates
+            if op not in EVENTS:
+                continue
+            if not reader.continued:
+                records.append(np.array([[plan.EVENT, EVENTS[op]]], dtype=np.int32))
+
+            # Moves become records of stepper targets
+            for idx in range(0, len(coords) - 1, 2):
+                coord = (coords[idx], coords[idx + 1])
+                if interpolator:
+                    thetas = np.array(list(interpolator.points(plotter_config.hpgl_to_x(coord[0]),
+                                                               plotter_config.hpgl_to_y(coord[1]))))
+                    records.append(thetas_to_steps(thetas[:, 0], thetas[:, 1]))
+                    continue
+                if prev_coord is None:
+                    x_coords, y_coords = np.array([coord[0]]), np.array([coord[1]])
+                else:
+                    x_coords, y_coords = interpolate(step_size, prev_coord, coord)
+                records.append(to_steps(solver, x_coords, y_coords))
+                prev_coord = coord
+
+    return records
+
+
+# Function to write records to a plan file
+def write_plan(filename, records):
+    data = np.concatenate(records).astype('<i4')
+    with open(filename, 'wb') as file:
+        file.write(plan.MAGIC)
+        file.write(struct.pack('<i', len(data)))
+        file.write(data.tobytes())
+    return len(data)
+
+
+# Function to add the options choosing how lines are split to a parser
+def add_interpolation_args(parser):
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--tolerance', type=float, default=plotter_config.interpolation_tolerance,
+                       help='split lines adaptively, keeping the pen within this many inches '
+                            'of them (default {} as on the board)'.format(plotter_config.interpolation_tolerance))
+    group.add_argument('--fixed-step', action='store_true',
+                       help='split lines every step size instead, as the board does without a tolerance')
+
+
+# Function to get the tolerance chosen by those options, None for fixed steps
+def interpolation_tolerance(args):
+    return None if args.fixed_step else args.tolerance
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compile an HPGL file into a motion plan')
+    parser.add_argument('hpgl', help='HPGL file to compile')
+    parser.add_argument('plan', help='motion plan file to write')
+    parser.add_argument('--step-size', type=int, default=10,
+                        help='interpolation step in HPGL units with --fixed-step (default 10)')
+    add_interpolation_args(parser)
+    parser.add_argument('--solver', choices=('analytic', 'newton'), default='analytic',
+                        help='inverse kinematics solver (default analytic)')
+    args = parser.parse_args()
+
+    solver = AnalyticThetaGenerator() if args.solver == 'analytic' else ThetaGenerator()
+    records = compile_hpgl(args.hpgl, args.step_size, solver, interpolation_tolerance(args))
+    count = write_plan(args.plan, records)
+    events = sum(1 for rec in records if rec[0, 0] == plan.EVENT)
+    print('{:s}: {:d} records ({:d} moves, {:d} pen events), {:d} bytes'.format(
+        args.plan, count, count - events, events, 8 + 8 * count))
+
+
+if __name__ == '__main__':
+    main()
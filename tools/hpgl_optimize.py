@@ -0,0 +1,311 @@
+'''!@file                   hpgl_optimize.py
+    @brief                  Reorders an HPGL drawing to cut pen-up travel
+    @details                Runs on the PC with CPython and NumPy. The plotter
+                            draws an HPGL file in file order, lifting and
+                            lowering the pen for every PU and PD instruction
+                            (1.5 s each in theta_gen) and travelling with the
+                            pen up between them. This tool splits the drawing
+                            into pen-down polylines, joins polylines which
+                            end where another starts, then orders them (and
+                            turns them around where that helps) with a
+                            greedy nearest neighbour tour improved by 2-opt,
+                            so the pen travels as little as possible with the
+                            pen up. Polylines drawn with different pens keep
+                            their order. The result is written as HPGL, or as
+                            a motion plan if the output ends in .plan, and
+                            the estimated time saved is reported.
+                            Usage: python hpgl_optimize.py input.hpgl output.hpgl [--passes 10]
+    @date                   10/18/26
+'''
+
+import os
+import sys
+import math
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import hpgl_reader
+import hpgl_compile
+from ThetaGenerator import AnalyticThetaGenerator
+
+
+# Time the theta_gen task waits for each pen up or pen down in seconds
+PEN_EVENT_S = 1.5
+
+# Clock of the TMC4210 stepper controllers in Hz
+CLK_FREQ = 20000000
+
+
+class Drawing:
+    '''!@brief              The pen-down polylines of an HPGL file
+        @details            groups holds a (pen, polylines) pair for each run
+                            of polylines drawn with the same pen, each
+                            polyline a list of (x, y) points in HPGL units.
+                            A polyline of one point is a dot. start is the
+                            first point the pen goes to and end where it's
+                            left after the last polyline.
+    '''
+
+    def __init__(self):
+        self.groups = []
+        self.start = (0, 0)
+        self.end = (0, 0)
+        # Number of pen up and pen down instructions in the file
+        self.pen_events = 0
+
+    # Function to get every polyline of the drawing, in order
+    def polylines(self):
+        return [line for pen, lines in self.groups for line in lines]
+
+
+# Function to read the polylines of an HPGL file
+def read_drawing(filename):
+    drawing = Drawing()
+    pen = 1
+    position = None
+    line = None
+    # First point the pen goes to, where both tours start from
+    first = None
+
+    with open(filename, 'rb') as file:
+        reader = hpgl_reader.HPGLReader(file)
+        for op, coords in reader.records():
+            if not reader.continued:
+                # A pen up or another command ends the polyline being drawn
+                if op != hpgl_reader.PD and line:
+                    drawing.groups[-1][1].append(line)
+                    line = None
+                if op == hpgl_reader.PU or op == hpgl_reader.PD:
+                    drawing.pen_events += 1
+                if op == hpgl_reader.SP and len(coords):
+                    pen = coords[0]
+                if op == hpgl_reader.PD and line is None:
+                    if not drawing.groups or drawing.groups[-1][0] != pen:
+                        drawing.groups.append((pen, []))
+                    if position is None:
+                        position = drawing.start
+                    line = [position]
+
+            if op != hpgl_reader.PU and op != hpgl_reader.PD:
+                continue
+            for idx in range(0, len(coords) - 1, 2):
+                position = (coords[idx], coords[idx + 1])
+                if line is not None:
+                    line.append(position)
+                if first is None:
+                    first = drawing.start = position
+
+    if line:
+        drawing.groups[-1][1].append(line)
+    drawing.end = position if position is not None else drawing.start
+    return drawing
+
+
+# Function to get the distance between two points
+def distance(a, b):
+    return math.hypot(a[0] - b[0], a[1] - b[1])
+
+
+# Function to join polylines which end where another starts, turning them
+# around where needed, so they're drawn without lifting the pen. Dots are
+# left as they are
+def merge_polylines(lines):
+    merged = [list(line) for line in lines if len(line) == 1]
+    lines = [list(line) for line in lines if len(line) > 1]
+    while lines:
+        line = lines.pop()
+        joined = True
+        while joined:
+            joined = False
+            for idx, other in enumerate(lines):
+                if other[0] == line[-1]:
+                    line = line + other[1:]
+                elif other[-1] == line[-1]:
+                    line = line + other[-2::-1]
+                elif other[-1] == line[0]:
+                    line = other + line[1:]
+                elif other[0] == line[0]:
+                    line = other[::-1] + line[1:]
+                else:
+                    continue
+                del lines[idx]
+                joined = True
+                break
+        merged.append(line)
+    return merged
+
+
+# Function to order polylines with a greedy nearest neighbour tour from start,
+# drawing each from whichever end is nearer
+def nearest_neighbour(lines, start):
+    remaining = list(lines)
+    order = []
+    position = start
+    while remaining:
+        best = None
+        for idx, line in enumerate(remaining):
+            for reverse in (False, True):
+                point = line[-1] if reverse else line[0]
+                dist = distance(position, point)
+                if best is None or dist < best[0]:
+                    best = (dist, idx, reverse)
+        dist, idx, reverse = best
+        line = remaining.pop(idx)
+        if reverse:
+            line = line[::-1]
+        order.append(line)
+        position = line[-1]
+    return order
+
+
+# Function to improve an order of polylines with 2-opt: drawing a run of
+# polylines backwards (in reverse order, each turned around) changes only the
+# two pen-up moves at the ends of the run, so any run for which those get
+# shorter is turned around. Stops after passes passes or when nothing improves
+# With no end, the tour may finish anywhere
+def two_opt(order, start, end, passes=10):
+    order = list(order)
+    count = len(order)
+    for _ in range(passes):
+        improved = False
+        for i in range(count - 1):
+            before = order[i - 1][-1] if i else start
+            for j in range(i + 1, count):
+                after = order[j + 1][0] if j + 1 < count else end
+                old = distance(before, order[i][0])
+                new = distance(before, order[j][-1])
+                if after is not None:
+                    old += distance(order[j][-1], after)
+                    new += distance(order[i][0], after)
+                if new < old - 1e-9:
+                    order[i:j + 1] = [line[::-1] for line in reversed(order[i:j + 1])]
+                    improved = True
+        if not improved:
+            break
+    return order
+
+
+# Function to optimize a drawing, returning a new drawing
+def optimize(drawing, passes=10, merge=True):
+    result = Drawing()
+    result.start = drawing.start
+    result.end = drawing.end
+    position = drawing.start
+    for idx, (pen, lines) in enumerate(drawing.groups):
+        if merge:
+            lines = merge_polylines(lines)
+        lines = nearest_neighbour(lines, position)
+        # The tour of the last pen ends where the drawing ends, the others
+        # may end anywhere
+        goal = drawing.end if idx == len(drawing.groups) - 1 else None
+        lines = two_opt(lines, position, goal, passes)
+        result.groups.append((pen, lines))
+        result.pen_events += 2 * len(lines)
+        if lines:
+            position = lines[-1][-1]
+    result.pen_events += 1
+    return result
+
+
+# Function to get the set of line segments drawn, whichever way they're drawn
+def segments(drawing):
+    drawn = {}
+    for line in drawing.polylines():
+        if len(line) == 1:
+            key = (line[0], line[0])
+            drawn[key] = drawn.get(key, 0) + 1
+        for a, b in zip(line, line[1:]):
+            if a != b:
+                key = (min(a, b), max(a, b))
+                drawn[key] = drawn.get(key, 0) + 1
+    return drawn
+
+
+# Function to write a drawing as HPGL
+def write_hpgl(filename, drawing):
+    with open(filename, 'w') as file:
+        file.write('IN;')
+        for pen, lines in drawing.groups:
+            file.write('SP{:d};'.format(pen))
+            for line in lines:
+                file.write('PU{:d},{:d};'.format(*line[0]))
+                file.write('PD' + ','.join('{:d},{:d}'.format(*point) for point in line[1:]) + ';')
+        file.write('PU{:d},{:d};SP0;'.format(*drawing.end))
+
+
+# Function to get the speed of the steppers in steps per second at a V_MAX
+# value, with the pulse divider picked as the TMC4210 class does
+def step_rate(v_max):
+    pulse_div = int(math.log(CLK_FREQ / (v_max * 32)) / math.log(2))
+    return CLK_FREQ * v_max / ((1 << pulse_div) * 2048 * 32)
+
+
+# Function to estimate the pen-up time of a drawing in seconds, with the pen
+# lifted and lowered around every polyline and moved between them at the
+# speed of the slower stepper
+# Returns the distance travelled with the pen up and the time
+def pen_up_time(drawing, speed, solver):
+    moves = []
+    position = drawing.start
+    for line in drawing.polylines():
+        moves.append((position, line[0]))
+        position = line[-1]
+    moves.append((position, drawing.end))
+
+    travel = 0
+    seconds = drawing.pen_events * PEN_EVENT_S
+    for a, b in moves:
+        travel += distance(a, b)
+        steps = hpgl_compile.to_steps(solver, np.array([a[0], b[0]], dtype=float),
+                                      np.array([a[1], b[1]], dtype=float))
+        seconds += max(abs(steps[1, 0] - steps[0, 0]), abs(steps[1, 1] - steps[0, 1])) / speed
+    return travel, seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Reorder an HPGL drawing to cut pen-up travel')
+    parser.add_argument('hpgl', help='HPGL file to optimize')
+    parser.add_argument('output', help='HPGL file to write, or motion plan if it ends in .plan')
+    parser.add_argument('--passes', type=int, default=10,
+                        help='largest number of 2-opt passes (default 10)')
+    parser.add_argument('--no-merge', action='store_true',
+                        help='keep polylines which meet end to end apart')
+    parser.add_argument('--v-max', type=int, default=300,
+                        help='V_MAX of the steppers, for the time estimate (default 300)')
+    hpgl_compile.add_interpolation_args(parser)
+    args = parser.parse_args()
+
+    drawing = read_drawing(args.hpgl)
+    result = optimize(drawing, args.passes, not args.no_merge)
+    if segments(result) != segments(drawing):
+        raise RuntimeError('Optimized drawing differs from the original')
+
+    if args.output.endswith('.plan'):
+        handle, hpgl_file = tempfile.mkstemp(suffix='.hpgl')
+        os.close(handle)
+        write_hpgl(hpgl_file, result)
+        records = hpgl_compile.compile_hpgl(hpgl_file,
+                                            tolerance=hpgl_compile.interpolation_tolerance(args))
+        hpgl_compile.write_plan(args.output, records)
+        os.remove(hpgl_file)
+    else:
+        write_hpgl(args.output, result)
+
+    solver = AnalyticThetaGenerator()
+    speed = step_rate(args.v_max)
+    print('{:<12s}{:>10s}{:>12s}{:>16s}{:>14s}'.format(
+        '', 'polylines', 'pen events', 'pen-up travel', 'pen-up time'))
+    times = []
+    for name, item in (('original', drawing), ('optimized', result)):
+        travel, seconds = pen_up_time(item, speed, solver)
+        times.append(seconds)
+        print('{:<12s}{:10d}{:12d}{:16.0f}{:13.1f}s'.format(
+            name, len(item.polylines()), item.pen_events, travel, seconds))
+    print('Estimated time saved: {:.1f} s'.format(times[0] - times[1]))
+
+
+if __name__ == '__main__':
+    main()
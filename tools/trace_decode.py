@@ -0,0 +1,113 @@
+'''!@file                   trace_decode.py
+    @brief                  Decodes a cotask trace dump and shows a timeline
+    @details                Reads the binary dump written by
+                            cotask.TraceRing.dump(), either from a file or
+                            straight from the board's serial port, prints how
+                            long and how often each task ran and draws a
+                            Gantt chart of the runs with matplotlib. Runs on
+                            the PC with CPython.
+                            Usage: python trace_decode.py trace.bin [--plot]
+                                   python trace_decode.py --port COM10 [--plot]
+    @date                   10/18/26
+'''
+
+import argparse
+import struct
+
+
+# Bytes at the start of a dump, as in cotask.TraceRing.MAGIC
+MAGIC = b'CTRC'
+
+# The board's utime.ticks_us() wraps around at 2**30
+TICKS_PERIOD = 1 << 30
+
+
+# Function to read exactly count bytes from a file or serial port
+def read_exactly(stream, count):
+    data = stream.read(count)
+    if len(data) != count:
+        raise ValueError('Trace dump ended early')
+    return data
+
+
+# Function to decode a dump into the task names and a list of
+# (task ID, state, start, end) runs, with times in microseconds from the first run
+def decode(stream):
+    if read_exactly(stream, 4) != MAGIC:
+        raise ValueError('Not a cotask trace dump')
+    n_names, n_runs, n_lost = struct.unpack('<3i', read_exactly(stream, 12))
+
+    names = []
+    for _ in range(n_names):
+        length = read_exactly(stream, 1)[0]
+        names.append(read_exactly(stream, length).decode())
+
+    # Unwrap the tick counts, which wrap around on the board
+    runs = []
+    time = 0
+    prev_start = None
+    for _ in range(n_runs):
+        tag, start, end = struct.unpack('<3i', read_exactly(stream, 12))
+        if prev_start is not None:
+            time += (start - prev_start) % TICKS_PERIOD
+        prev_start = start
+        runs.append((tag >> 16, tag & 0xFFFF, time, time + (end - start) % TICKS_PERIOD))
+
+    return names, runs, n_lost
+
+
+# Function to print the number of runs, total and longest run time of each task
+def summarize(names, runs, n_lost):
+    span = runs[-1][3] - runs[0][2] if runs else 0
+    print('{:d} runs over {:.3f} ms, {:d} older runs overwritten'.format(len(runs), span / 1000, n_lost))
+    print('{:<16s}{:>8s}{:>12s}{:>12s}{:>8s}'.format('TASK', 'RUNS', 'TOTAL ms', 'MAX ms', 'CPU %'))
+    for task_id, name in enumerate(names):
+        durations = [end - start for tid, state, start, end in runs if tid == task_id]
+        total = sum(durations)
+        print('{:<16s}{:8d}{:12.3f}{:12.3f}{:8.1f}'.format(
+            name, len(durations), total / 1000, max(durations, default=0) / 1000,
+            100 * total / span if span else 0))
+
+
+# Function to draw each task's runs as bars on its own row
+def plot(names, runs):
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(12, 1 + 0.6 * len(names)))
+    for task_id in range(len(names)):
+        bars = [(start / 1000, max(end - start, 1) / 1000)
+                for tid, state, start, end in runs if tid == task_id]
+        ax.broken_barh(bars, (task_id - 0.4, 0.8))
+    ax.set_yticks(range(len(names)))
+    ax.set_yticklabels(names)
+    ax.set_xlabel('Time (ms)')
+    ax.set_title('Task timeline')
+    plt.tight_layout()
+    plt.show()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Decode a cotask trace dump and show a timeline')
+    parser.add_argument('dump', nargs='?', help='file holding the trace dump')
+    parser.add_argument('--port', help='serial port to read the dump from instead of a file')
+    parser.add_argument('--baud', type=int, default=115200, help='baud rate of the serial port')
+    parser.add_argument('--plot', action='store_true', help='draw a Gantt chart of the runs')
+    args = parser.parse_args()
+
+    if args.port:
+        import serial
+        with serial.Serial(args.port, args.baud) as ser:
+            names, runs, n_lost = decode(ser)
+    elif args.dump:
+        with open(args.dump, 'rb') as file:
+            names, runs, n_lost = decode(file)
+    else:
+        parser.error('give a dump file or --port')
+
+    summarize(names, runs, n_lost)
+    if args.plot:
+        plot(names, runs)
+
+
+if __name__ == '__main__':
+    main()